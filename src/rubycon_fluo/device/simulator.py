@@ -0,0 +1,259 @@
+from __future__ import annotations
+import bisect
+import logging
+import threading
+import time
+from typing import Sequence, Tuple
+
+import numpy as np
+
+# via calibration_core: importing the scale module first trips its circular import
+from rubycon_fluo.calibration.calibration_core import Ragan1992
+
+logger = logging.getLogger(__name__)
+
+# ambient ruby lines and the Mao et al. (1986) quasi-hydrostatic scale
+R1_AMBIENT_NM = 694.24
+R2_AMBIENT_NM = 692.86
+_MAO_A_GPA = 1904.0
+_MAO_B = 7.665
+
+
+def r1_wavelength_nm(pressure_gpa: float, temperature_k: float = 300.0) -> float:
+    """
+    R1 position for a pressure and temperature: inverse Mao 1986 scale
+    plus the Ragan 1992 thermal shift relative to 300 K.
+    """
+    lam = R1_AMBIENT_NM * (1.0 + pressure_gpa * _MAO_B / _MAO_A_GPA) ** (1.0 / _MAO_B)
+    return lam + Ragan1992().delta_lambda(300.0, temperature_k)
+
+
+class RubyTrajectory:
+    """
+    Scripted sample conditions: piecewise-linear keyframes of
+    (time_s, pressure_GPa, temperature_K).  Before the first and after the
+    last keyframe the end values are held, unless `loop` repeats the
+    script.
+    """
+
+    def __init__(self,
+                 keyframes: Sequence[Tuple[float, float, float]] = ((0.0, 0.0, 300.0),),
+                 loop: bool = False) -> None:
+        frames = sorted((float(t), float(p), float(T)) for t, p, T in keyframes)
+        if not frames:
+            raise ValueError("trajectory needs at least one keyframe")
+        self._t = [f[0] for f in frames]
+        self._p = [f[1] for f in frames]
+        self._T = [f[2] for f in frames]
+        self.loop = loop
+
+    @classmethod
+    def ramp(cls, p_start: float, p_end: float, duration_s: float,
+             temperature_k: float = 300.0) -> "RubyTrajectory":
+        """Linear compression from p_start to p_end GPa at constant T."""
+        return cls(((0.0, p_start, temperature_k),
+                    (duration_s, p_end, temperature_k)))
+
+    def at(self, t: float) -> Tuple[float, float]:
+        """(pressure_GPa, temperature_K) at time t seconds."""
+        if self.loop and self._t[-1] > self._t[0]:
+            t = self._t[0] + (t - self._t[0]) % (self._t[-1] - self._t[0])
+        k = bisect.bisect_right(self._t, t)
+        if k == 0:
+            return self._p[0], self._T[0]
+        if k == len(self._t):
+            return self._p[-1], self._T[-1]
+        f = (t - self._t[k - 1]) / (self._t[k] - self._t[k - 1])
+        return (self._p[k - 1] + f * (self._p[k] - self._p[k - 1]),
+                self._T[k - 1] + f * (self._T[k] - self._T[k - 1]))
+
+
+class _SimSpectrumProcessing:
+    """Stand-in for seabreeze's SpectrumProcessingFeature (on-device averaging)."""
+
+    def __init__(self) -> None:
+        self.scans_to_average = 1
+        self.boxcar_width = 0
+
+    def set_scans_to_average(self, scans: int) -> None:
+        self.scans_to_average = max(1, int(scans))
+
+    def get_scans_to_average(self) -> int:
+        return self.scans_to_average
+
+    def set_boxcar_width(self, width: int) -> None:
+        self.boxcar_width = max(0, int(width))
+
+    def get_boxcar_width(self) -> int:
+        return self.boxcar_width
+
+
+class SimulatedRubySpectrometer:
+    """
+    Software ruby spectrometer with the same surface as the patched
+    seabreeze device / _DummySpectrometer, for running the acquisition and
+    fitting paths without hardware.
+
+    Every spectrum() call is one exposure: R1/R2 pseudo-Voigt emission at
+    the positions given by `trajectory` (evaluated at the simulator clock),
+    scaled by the integration time, plus dark offset and dark current,
+    Poisson shot noise, Gaussian read noise, occasional cosmic-ray spikes
+    and clipping at the ADC full scale.  With `realtime=True` the call
+    blocks for the exposure time like the hardware; otherwise the clock
+    only advances virtually (fast load tests).  As on cseabreeze,
+    scans_to_average is stored but not applied – averaging is done by the
+    caller, unless `hardware_averaging=True` exposes a spectrum_processing
+    feature whose scans-to-average makes one call expose and average that
+    many scans.  Pass an instance to SpectrometerController to use it.
+    """
+    _MIN_US = 1_000
+    _MAX_US = 10_000_000
+
+    def __init__(self,
+                 trajectory: RubyTrajectory | None = None,
+                 n_pixels: int = 2048,
+                 wl_coeffs: Tuple[float, float, float] = (650.0, 0.0760, -1.0e-6),
+                 peak_rate: float = 2.0e5,        # R1 counts per second at peak
+                 r2_ratio: float = 0.55,
+                 fwhm_nm: float = 0.55,
+                 fwhm_per_gpa: float = 0.004,     # non-hydrostatic broadening
+                 lorentz_frac: float = 0.6,
+                 dark_offset: float = 1500.0,
+                 dark_rate: float = 50.0,          # counts per second per pixel
+                 read_noise: float = 8.0,
+                 saturation: float = 65535.0,
+                 cosmic_rate: float = 0.5,         # spikes per second of exposure
+                 realtime: bool = True,
+                 hardware_averaging: bool = False,
+                 seed: int | None = None,
+                 serial_number: str = "RUBY-SIM") -> None:
+        self.trajectory = trajectory or RubyTrajectory()
+        i = np.arange(n_pixels, dtype=float)
+        c0, c1, c2 = wl_coeffs
+        self._wl = c0 + c1 * i + c2 * i * i
+        self.peak_rate = peak_rate
+        self.r2_ratio = r2_ratio
+        self.fwhm_nm = fwhm_nm
+        self.fwhm_per_gpa = fwhm_per_gpa
+        self.lorentz_frac = lorentz_frac
+        self.dark_offset = dark_offset
+        self.dark_rate = dark_rate
+        self.read_noise = read_noise
+        self.saturation = saturation
+        self.cosmic_rate = cosmic_rate
+        self.realtime = realtime
+        self._processing = _SimSpectrumProcessing() if hardware_averaging else None
+        self._serial = serial_number
+
+        self._rng = np.random.default_rng(seed)
+        # fixed-pattern dark offset, as on a real CCD
+        self._dark_pattern = dark_offset + self._rng.normal(0.0, 0.02 * dark_offset + 1e-12, n_pixels)
+        self._lock = threading.Lock()
+        self._clock_s = 0.0
+        self._integration_time_us = 100_000
+        self.scans_to_average = 1
+
+    # ---- device surface --------------------------------------------------
+    def get_integration_time_limits_us(self) -> Tuple[int, int]:
+        return self._MIN_US, self._MAX_US
+
+    def set_integration_time_us(self, value_us: int) -> None:
+        self._integration_time_us = max(self._MIN_US,
+                                        min(int(value_us), self._MAX_US))
+        logger.debug("[Sim] Integration set to %d µs", self._integration_time_us)
+
+    def set_scans_to_average(self, scans: int) -> None:
+        self.scans_to_average = max(1, int(scans))
+
+    def wavelengths(self) -> np.ndarray:
+        return self._wl.copy()
+
+    def intensities(self, correct_dark_counts: bool = False, **kwargs) -> np.ndarray:
+        t_exp = self._integration_time_us / 1_000_000
+        n_avg = self._processing.scans_to_average if self._processing else 1
+        t_start = time.perf_counter()
+        with self._lock:
+            counts = np.zeros(self._wl.size)
+            for _ in range(n_avg):
+                t_mid = self._clock_s + 0.5 * t_exp
+                self._clock_s += t_exp
+                counts += self._expose(t_exp, t_mid, correct_dark_counts)
+            if n_avg > 1:
+                counts /= n_avg
+        if self.realtime:
+            remaining = n_avg * t_exp - (time.perf_counter() - t_start)
+            if remaining > 0:
+                time.sleep(remaining)
+        return counts
+
+    def spectrum(self, **kwargs) -> Tuple[np.ndarray, np.ndarray]:
+        return self.wavelengths(), self.intensities(**kwargs)
+
+    @property
+    def clock_s(self) -> float:
+        """Simulated time elapsed, i.e. the sum of all exposures so far."""
+        return self._clock_s
+
+    def true_state(self, t: float | None = None) -> dict:
+        """Ground truth at simulator time t (default: now) for checking fits."""
+        p, T = self.trajectory.at(self._clock_s if t is None else t)
+        r1 = r1_wavelength_nm(p, T)
+        return dict(pressure_gpa=p, temperature_k=T, r1_nm=r1,
+                    r2_nm=r1 - self._r1_r2_split(p),
+                    fwhm_nm=self.fwhm_nm + self.fwhm_per_gpa * p)
+
+    @property
+    def max_intensity(self) -> float:
+        return self.saturation
+
+    @property
+    def features(self) -> dict:
+        return {"spectrum_processing": [self._processing]} if self._processing else {}
+
+    @property
+    def serial_number(self) -> str:
+        return self._serial
+
+    @property
+    def model(self) -> str:
+        return "SIMULATOR"
+
+    def temperature(self) -> float:
+        raise AttributeError("No temperature feature")
+
+    # ---- physics ---------------------------------------------------------
+    @staticmethod
+    def _r1_r2_split(p: float) -> float:
+        # R1–R2 separation grows slightly with pressure
+        return (R1_AMBIENT_NM - R2_AMBIENT_NM) + 0.0022 * p
+
+    def _pseudo_voigt(self, center: float, fwhm: float) -> np.ndarray:
+        u = (self._wl - center) / fwhm
+        g = np.exp(-4.0 * np.log(2.0) * u * u)
+        l = 1.0 / (1.0 + 4.0 * u * u)
+        return (1.0 - self.lorentz_frac) * g + self.lorentz_frac * l
+
+    def _expose(self, t_exp: float, t_mid: float, dark_corrected: bool) -> np.ndarray:
+        st = self.true_state(t_mid)
+        w = st["fwhm_nm"]
+        # emission in mean counts for this exposure
+        signal = self.peak_rate * t_exp * (
+            self._pseudo_voigt(st["r1_nm"], w)
+            + self.r2_ratio * self._pseudo_voigt(st["r2_nm"], w)
+        )
+        signal += self.dark_rate * t_exp
+        counts = self._rng.poisson(signal).astype(float)
+        counts += self._dark_pattern
+        counts += self._rng.normal(0.0, self.read_noise, counts.size)
+
+        # cosmic rays: a few narrow, very bright spikes
+        n_spikes = self._rng.poisson(self.cosmic_rate * t_exp)
+        for _ in range(n_spikes):
+            k = self._rng.integers(0, counts.size)
+            width = self._rng.integers(1, 3)
+            counts[k:k + width] += self._rng.uniform(2_000.0, 20_000.0)
+
+        np.clip(counts, 0.0, self.saturation, out=counts)
+        if dark_corrected:
+            counts -= self.dark_offset
+        return counts
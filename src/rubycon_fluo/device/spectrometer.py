@@ -1,5 +1,7 @@
 from __future__ import annotations
 import logging
+import os
+import threading
 from contextlib import suppress
 from types import MethodType
 from typing import Tuple, Sequence
@@ -10,8 +12,13 @@ from seabreeze.spectrometers import Spectrometer, list_devices
 
 import numpy as np
 
+from rubycon_fluo.device.simulator import SimulatedRubySpectrometer
+from rubycon_fluo.processing.nonlinearity import NonlinearityLUT
+
 logger = logging.getLogger(__name__)
 
+NONLINEARITY_MODES = ("device", "software", "auto")
+
 
 class _DummySpectrometer:
     """Stand‑in when no hardware is present."""
@@ -34,10 +41,14 @@ class _DummySpectrometer:
         self.scans_to_average = max(1, int(scans))
         logger.debug("[Dummy] Scans-to-average: %d", self.scans_to_average)
 
+    def wavelengths(self) -> np.ndarray:
+        return np.linspace(400, 1000, 2048)
+
+    def intensities(self, **kwargs) -> np.ndarray:
+        return 1000*np.exp(-0.5*((self.wavelengths() - 620)/10)**2)
+
     def spectrum(self, **kwargs) -> Tuple[np.ndarray, np.ndarray]:
-        wl = np.linspace(400, 1000, 2048)
-        counts = 1000*np.exp(-0.5*((wl - 620)/10)**2)
-        return wl, counts
+        return self.wavelengths(), self.intensities(**kwargs)
 
     @property
     def features(self) -> dict:
@@ -55,29 +66,146 @@ class _DummySpectrometer:
         raise AttributeError("No temperature feature")
 
 
+# set RUBYCON_SIMULATOR=1 to list a simulated ruby spectrometer next to the hardware
+SIMULATOR_ENV = "RUBYCON_SIMULATOR"
+_simulator: SimulatedRubySpectrometer | None = None
+
+
+def simulator_enabled() -> bool:
+    return os.environ.get(SIMULATOR_ENV, "").strip().lower() not in ("", "0", "false", "no")
+
+
+def shared_simulator() -> SimulatedRubySpectrometer:
+    """Process-wide simulator instance, so re-selecting it keeps its clock."""
+    global _simulator
+    if _simulator is None:
+        _simulator = SimulatedRubySpectrometer()
+    return _simulator
+
+
 class SpectrometerController:
     """Single‐point façade over cseabreeze Spectrometer + dummy fallback.
     This is the only class that directly communicates with the spectrometer."""
 
     def __init__(self, device=None) -> None:
-        # if user passed in a raw SeaBreezeDevice, open it; else pick the first
-        self._spec = self._open_device(device) if device else self._open_first_available()
+        # a simulator instance is used as-is; a raw SeaBreezeDevice is opened;
+        # otherwise pick the first
+        if isinstance(device, SimulatedRubySpectrometer):
+            self._spec = device
+        else:
+            self._spec = self._open_device(device) if device else self._open_first_available()
         self._min_us, self._max_us = self._spec.get_integration_time_limits_us()
+        self._wl: np.ndarray | None = None     # cached axis, see `wavelengths`
+
+        # last value successfully sent per setting; repeats are not re-sent
+        self._state: dict[str, object] = {}
+        self._state_lock = threading.Lock()
+        self.sent_commands = 0
+        self.suppressed_commands = 0
+
+        # on-device averaging is probed on first use, not here: the device
+        # list builds a controller per listed device just to read its name
+        self._hw_avg = None
+        self._hw_avg_probed = False
+
+        # software nonlinearity correction, see set_nonlinearity_coefficients.
+        # intensities() reads _nl_active (the table in use, None = backend)
+        # once per call; the rest only changes under _nl_lock
+        self._nl_lut: NonlinearityLUT | None = None
+        self._nl_mode = "auto"
+        self._nl_active: NonlinearityLUT | None = None
+        self._nl_lock = threading.Lock()
+        self._nl_generation = 0
+        self._nl_thread: threading.Thread | None = None
+
+    def _hw_averaging(self):
+        """The probed SpectrumProcessingFeature (see _find_hw_averaging), or None."""
+        with self._state_lock:
+            if not self._hw_avg_probed:
+                self._hw_avg = self._find_hw_averaging()
+                self._hw_avg_probed = True
+                logger.info("%s: %s scan averaging", self.device_id,
+                            "hardware" if self._hw_avg is not None else "software")
+        return self._hw_avg
+
+    def _find_hw_averaging(self):
+        """SpectrumProcessingFeature if the device really averages on-board, else None."""
+        # called with the state lock held
+        feats = self.features.get("spectrum_processing", [])
+        if not feats or not hasattr(feats[0], "set_scans_to_average"):
+            return None
+        try:
+            # probe (some models list the feature but reject the command) and reset
+            feats[0].set_scans_to_average(1)
+        except Exception:
+            logger.debug("spectrum_processing present but scans-to-average unsupported")
+            return None
+        self._state["scans"] = 1
+        return feats[0]
+
+    def _send(self, key: str, value, command) -> bool:
+        """
+        Run `command(value)` unless `value` is what was last sent for `key`.
+        Returns False (and counts a suppressed command) when skipped.  A
+        failing command leaves the setting unknown, so it is re-sent next time.
+        """
+        with self._state_lock:
+            if key in self._state and self._state[key] == value:
+                self.suppressed_commands += 1
+                return False
+            self._state.pop(key, None)
+        command(value)
+        with self._state_lock:
+            self._state[key] = value
+            self.sent_commands += 1
+        return True
+
+    def invalidate_state(self) -> None:
+        """Forget the cached settings, e.g. after something else talked to the device."""
+        with self._state_lock:
+            self._state.clear()
+
+    def command_stats(self) -> dict:
+        """Setting commands sent vs. suppressed as redundant."""
+        with self._state_lock:
+            return dict(sent=self.sent_commands, suppressed=self.suppressed_commands)
+
+    @property
+    def hardware_averaging(self) -> bool:
+        """True if scans are averaged on the device, so one read returns the mean."""
+        return self._hw_averaging() is not None
+
+    @property
+    def averaging_mode(self) -> str:
+        """'hardware' or 'software' – which path set_scans_to_average() drives."""
+        return "hardware" if self._hw_averaging() is not None else "software"
 
     def set_binning_factor(self, factor: int) -> None:
         """Proxy to the underlying PixelBinningFeature."""
         feats = self._spec.features.get("pixel_binning", [])
         if not feats:
             raise RuntimeError("Device does not support pixel_binning")
-        feats[0].set_binning_factor(factor)
+        if self._send("binning", int(factor), feats[0].set_binning_factor):
+            self._wl = None         # pixel count changed – refetch the axis
+
+    def set_tec_setpoint_c(self, value: float) -> None:
+        """Proxy to the ThermoElectricFeature setpoint (°C)."""
+        feats = self._spec.features.get("thermo_electric", [])
+        if not feats:
+            raise RuntimeError("Device does not support thermo_electric")
+        self._send("tec_setpoint", float(value),
+                   feats[0].set_temperature_setpoint_degrees_celsius)
 
     @classmethod
     def list_devices(cls) -> Sequence:
         try:
-            return list_devices()
+            devs = list(list_devices())
         except Exception:
             logger.exception("listing spectrometers failed")
-            return []
+            devs = []
+        if simulator_enabled():
+            devs.append(shared_simulator())
+        return devs
 
     @classmethod
     def _open_device(cls, device) -> object:
@@ -94,6 +222,9 @@ class SpectrometerController:
         if not devs:
             logger.warning("no hardware found – using dummy")
             return _DummySpectrometer()
+        if isinstance(devs[0], SimulatedRubySpectrometer):
+            logger.warning("no hardware found – using simulator")
+            return devs[0]
         try:
             spec = Spectrometer.from_serial_number(devs[0].serial_number)
             return cls._patch_api(spec)
@@ -144,14 +275,113 @@ class SpectrometerController:
     def integration_limits_us(self) -> Tuple[int, int]:
         return self._spec.get_integration_time_limits_us()
 
+    @property
+    def saturation_counts(self) -> float:
+        """Detector full scale in counts (65535 if the device does not say)."""
+        with suppress(Exception):
+            return float(self._spec.f.spectrometer.get_maximum_intensity())
+        return float(getattr(self._spec, "max_intensity", 65535.0))
+
     def set_integration_time_us(self, v: int):
-        self._spec.set_integration_time_us(int(v))
+        self._send("integration_us", int(v), self._spec.set_integration_time_us)
 
     def set_scans_to_average(self, s: int):
-        self._spec.set_scans_to_average(int(s))
+        s = max(1, int(s))
+        self._spec.set_scans_to_average(s)      # host-side attribute only
+        hw_avg = self._hw_averaging()
+        if hw_avg is not None:
+            self._send("scans", s, hw_avg.set_scans_to_average)
+
+    @property
+    def wavelengths(self) -> np.ndarray:
+        """
+        Wavelength axis (nm) for the current device and binning.  Read from
+        the device once and returned as the same read-only array until the
+        binning changes, so consumers can share it (and compare by identity).
+        """
+        if self._wl is None:
+            wl = np.array(self._spec.wavelengths(), dtype=float)
+            wl.setflags(write=False)
+            self._wl = wl
+        return self._wl
+
+    def set_nonlinearity_coefficients(self, coefficients) -> None:
+        """
+        Nonlinearity polynomial (lowest order first) for the software
+        correction; an identity polynomial (e.g. np.ones(1)) disables it.
+        """
+        lut = (None if NonlinearityLUT.is_identity(coefficients)
+               else NonlinearityLUT(coefficients, self.saturation_counts))
+        with self._nl_lock:
+            self._nl_lut = lut
+        self._resolve_nonlinearity()
+
+    def set_nonlinearity_mode(self, mode: str) -> None:
+        """
+        Where correct_nonlinearity=True is handled: "device" (the backend),
+        "software" (lookup table from the coefficients) or "auto" (the
+        table when it is faster than evaluating the polynomial on the
+        host, which is how cseabreeze corrects; the device read itself is
+        not timed).  The "auto" timing runs on a background thread and
+        the backend corrects until it is done.
+        """
+        if mode not in NONLINEARITY_MODES:
+            raise ValueError(f"nonlinearity mode must be one of {NONLINEARITY_MODES}")
+        with self._nl_lock:
+            self._nl_mode = mode
+        self._resolve_nonlinearity()
+
+    def _resolve_nonlinearity(self) -> None:
+        with self._nl_lock:
+            self._nl_generation += 1
+            lut, mode = self._nl_lut, self._nl_mode
+            if lut is not None and mode == "auto":
+                self._nl_active = None
+                n_pixels = self.wavelengths.size
+                self._nl_thread = threading.Thread(
+                    target=self._time_nonlinearity, args=(lut, n_pixels, self._nl_generation),
+                    name="nonlinearity-timing", daemon=True)
+                self._nl_thread.start()
+                return
+            self._nl_active = lut if mode == "software" else None
+        logger.info("%s: %s nonlinearity correction", self.device_id, self.nonlinearity_mode)
+
+    def _time_nonlinearity(self, lut: NonlinearityLUT, n_pixels: int, generation: int) -> None:
+        # "auto": table vs host polynomial, off the GUI thread (compiles the table kernel)
+        cost = lut.compare(n_pixels)
+        with self._nl_lock:
+            if generation != self._nl_generation:
+                return                  # coefficients or mode changed meanwhile
+            faster = cost["software"] < cost["polynomial"]
+            self._nl_active = lut if faster else None
+        logger.info("%s: nonlinearity table %.1f µs vs polynomial %.1f µs per frame → %s",
+                    self.device_id, cost["software"] * 1e6, cost["polynomial"] * 1e6,
+                    "software" if faster else "device")
+
+    @property
+    def nonlinearity_mode(self) -> str:
+        """The path in use: "software" or "device"."""
+        return "software" if self._nl_active is not None else "device"
+
+    def intensities(self, **kwargs) -> np.ndarray:
+        """One read of the counts only; pair it with `wavelengths`."""
+        # read once: the table may be swapped from another thread meanwhile
+        lut = self._nl_active if kwargs.get("correct_nonlinearity", False) else None
+        if lut is not None:
+            kwargs = dict(kwargs, correct_nonlinearity=False)
+        read = getattr(self._spec, "intensities", None)
+        counts = read(**kwargs) if read is not None else self._spec.spectrum(**kwargs)[1]
+        if self._wl is not None and self._wl.shape != counts.shape:
+            self._wl = None         # binning changed behind our back
+        if lut is not None:
+            # each read is a fresh array: correct it in place when it is float64
+            inplace = counts.dtype == np.float64 and counts.flags.writeable
+            counts = lut.apply(counts, out=counts if inplace else None)
+        return counts
 
     def spectrum_raw(self, **kwargs) -> Tuple[np.ndarray, np.ndarray]:
-        return self._spec.spectrum(**kwargs)
+        counts = self.intensities(**kwargs)
+        return self.wavelengths, counts
 
     def get_detector_temperature(self) -> float:
         with suppress(AttributeError):
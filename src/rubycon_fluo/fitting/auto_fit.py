@@ -1,6 +1,10 @@
 import numpy as np
 from scipy.optimize import least_squares
-from numba import njit
+from numba import njit, prange
+
+from rubycon_fluo.fitting.fit_budget import FitInterrupted
+from rubycon_fluo.fitting.lm_solver import make_lm_solver, lm_fit_budgeted, FusedResidual
+from rubycon_fluo.fitting.peak_estimate import estimate_two_peak_nb
 
 # JIT-compiled Voigt functions and derivatives
 @njit(cache=True, fastmath=True)
@@ -77,12 +81,229 @@ def jac_nb(p, x, y):
     J[:,6] = (1 - f2) * dG2_dw + f2 * dL2_dw
     return J
 
+@njit(cache=True, fastmath=True, nogil=True)
+def residual_jac_nb(p, x, y, r, J):
+    """
+    Fused residual + analytic Jacobian of two_peak_model_nb.
+
+    One pass over x: the Gaussian exponentials and Lorentzian denominators
+    are evaluated once per point and shared between r and every column of
+    J.  Writes into the caller-owned buffers r (m,) and J (m, 9); nothing
+    is allocated.
+    """
+    c1, A1, w1, f1, delta, A2, w2, f2, b = (p[0], p[1], p[2], p[3], p[4],
+                                            p[5], p[6], p[7], p[8])
+    c2 = c1 - delta
+    k = 1.0 / (2.0 * np.sqrt(2.0 * np.log(2.0)))    # σ = k · fwhm
+    s1, s2 = w1 * k, w2 * k
+    h1, h2 = w1 / 2.0, w2 / 2.0
+    for i in range(x.shape[0]):
+        # peak 1
+        t1 = (x[i] - c1) / s1
+        e1 = np.exp(-0.5 * t1 * t1)
+        u1 = (x[i] - c1) / h1
+        l1 = 1.0 / (1.0 + u1 * u1)
+        # peak 2 (center2 = c1 - delta)
+        t2 = (x[i] - c2) / s2
+        e2 = np.exp(-0.5 * t2 * t2)
+        u2 = (x[i] - c2) / h2
+        l2 = 1.0 / (1.0 + u2 * u2)
+
+        v1 = (1.0 - f1) * e1 + f1 * l1
+        v2 = (1.0 - f2) * e2 + f2 * l2
+        r[i] = A1 * v1 + A2 * v2 + b - y[i]
+
+        # ∂/∂center of each peak and ∂/∂fwhm
+        dc1 = A1 * ((1.0 - f1) * e1 * t1 / s1 + f1 * 2.0 * u1 * l1 * l1 / h1)
+        dc2 = A2 * ((1.0 - f2) * e2 * t2 / s2 + f2 * 2.0 * u2 * l2 * l2 / h2)
+        J[i, 0] = dc1 + dc2
+        J[i, 1] = v1
+        J[i, 2] = A1 * ((1.0 - f1) * e1 * t1 * t1 + f1 * 2.0 * u1 * u1 * l1 * l1) / w1
+        J[i, 3] = A1 * (l1 - e1)
+        J[i, 4] = -dc2
+        J[i, 5] = v2
+        J[i, 6] = A2 * ((1.0 - f2) * e2 * t2 * t2 + f2 * 2.0 * u2 * u2 * l2 * l2) / w2
+        J[i, 7] = A2 * (l2 - e2)
+        J[i, 8] = 1.0
+
+lm_solve_nb, lm_fit_nb = make_lm_solver(residual_jac_nb)
+
+@njit(cache=True, fastmath=True, nogil=True)
+def weighted_residual_jac_nb(p, x, yw, r, J):
+    """
+    residual_jac_nb for a weighted fit: `yw` stacks the counts (row 0)
+    and the weights 1/σ (row 1), and every residual and Jacobian row is
+    multiplied by its weight in the same call.
+    """
+    residual_jac_nb(p, x, yw[0], r, J)
+    w = yw[1]
+    for i in range(x.shape[0]):
+        r[i] *= w[i]
+        for k in range(J.shape[1]):
+            J[i, k] *= w[i]
+
+weighted_lm_solve_nb, weighted_lm_fit_nb = make_lm_solver(weighted_residual_jac_nb)
+
+@njit(cache=True)
+def initial_guess_nb(x, y):
+    # legacy argmax starting point (AutoFit(guess="argmax"))
+    i0 = np.argmax(y)
+    c1_0, A1_0 = x[i0], y[i0]
+    w1_0, f1_0 = 1.0, 0.5
+    delta0 = 1.39
+    A2_0, w2_0, f2_0 = A1_0 * 0.5, w1_0, f1_0
+    b0 = np.min(y)
+    return np.array([c1_0, A1_0, w1_0, f1_0,
+                     delta0, A2_0, w2_0, f2_0, b0])
+
+@njit(cache=True)
+def bounds_nb(lo, hi):
+    lower = np.array([lo, 0, 0, 0, 0.5, 0, 0, 0, -np.inf])
+    upper = np.array([hi, np.inf, np.inf, 1, 2.5, np.inf, np.inf, 1, np.inf])
+    return lower, upper
+
+@njit(cache=True, nogil=True)
+def _fit_window_nb(x, y, lo, hi, max_nfev, xtol, ftol):
+    # one cold-started LM fit from the O(n) pre-estimate
+    lower, upper = bounds_nb(lo, hi)
+    p0 = estimate_two_peak_nb(x, y, lower[4], upper[4])
+    return lm_fit_nb(p0, lower, upper, x, y, max_nfev, xtol, ftol)
+
+@njit(cache=True, nogil=True, parallel=True)
+def _fit_many_nb(wl, counts, lo, hi, max_nfev, xtol, ftol):
+    # wl has either one row (shared axis) or one row per spectrum
+    n_spec = counts.shape[0]
+    stride = 0 if wl.shape[0] == 1 else 1
+    popt = np.full((n_spec, 9), np.nan)
+    pcov = np.full((n_spec, 9, 9), np.nan)
+    status = np.full(n_spec, -1, dtype=np.int64)
+    nfev = np.zeros(n_spec, dtype=np.int64)
+    for i in prange(n_spec):
+        row = i * stride
+        mask = (wl[row] >= lo[i]) & (wl[row] <= hi[i]) & np.isfinite(counts[i])
+        x = wl[row][mask]
+        y = counts[i][mask]
+        m = x.size
+        if m <= 9:
+            continue
+
+        p, cov, nf, st = _fit_window_nb(x, y, lo[i], hi[i],
+                                        max_nfev, xtol, ftol)
+        popt[i] = p
+        pcov[i] = cov
+        status[i] = st
+        nfev[i] = nf
+    return popt, pcov, status, nfev
+
+# Variable projection: A1, A2 and the baseline enter the model linearly,
+# so they are solved for exactly at every step and the optimiser only sees
+# the six nonlinear parameters (c1, w1, f1, delta, w2, f2).
+VARPRO_NONLINEAR = np.array([0, 2, 3, 4, 6, 7])
+
+@njit(cache=True)
+def _varpro_basis_nb(q, x):
+    c1, w1, f1, delta, w2, f2 = q[0], q[1], q[2], q[3], q[4], q[5]
+    Phi = np.ones((x.shape[0], 3))
+    Phi[:, 0] = pseudo_voigt_nb(x, c1, 1.0, w1, f1)
+    Phi[:, 1] = pseudo_voigt_nb(x, c1 - delta, 1.0, w2, f2)
+    return Phi
+
+@njit(cache=True)
+def _varpro_linear_nb(Phi, y):
+    # Least-squares (A1, A2, b) with non-negative amplitudes
+    coef = np.linalg.lstsq(Phi, y)[0]
+    if coef[0] >= 0.0 and coef[1] >= 0.0:
+        return coef
+    # enumerate the remaining active sets of the two amplitudes
+    best = np.zeros(3)
+    best[2] = np.mean(y)
+    best_ssr = np.sum((y - best[2]) ** 2)
+    for keep in range(2):                    # A1 only, A2 only
+        cols = np.array([keep, 2])
+        c = np.linalg.lstsq(np.ascontiguousarray(Phi[:, cols]), y)[0]
+        if np.any(c[:-1] < 0.0):
+            continue
+        trial = np.zeros(3)
+        for k in range(cols.size):
+            trial[cols[k]] = c[k]
+        ssr = np.sum((y - Phi.dot(trial)) ** 2)
+        if ssr < best_ssr:
+            best, best_ssr = trial, ssr
+    return best
+
+@njit(cache=True)
+def varpro_expand_nb(q, x, y):
+    # full 9-parameter vector for the nonlinear parameters q
+    A1, A2, b = _varpro_linear_nb(_varpro_basis_nb(q, x), y)
+    return np.array([q[0], A1, q[1], q[2], q[3], A2, q[4], q[5], b])
+
+@njit(cache=True)
+def varpro_residual_nb(q, x, y):
+    return residual_nb(varpro_expand_nb(q, x, y), x, y)
+
+@njit(cache=True)
+def varpro_jac_nb(q, x, y):
+    # Kaufman's approximation: project the nonlinear columns of the full
+    # Jacobian onto the orthogonal complement of the linear basis
+    Phi = _varpro_basis_nb(q, x)
+    A1, A2, b = _varpro_linear_nb(Phi, y)
+    p = np.array([q[0], A1, q[1], q[2], q[3], A2, q[4], q[5], b])
+    Jq = np.ascontiguousarray(jac_nb(p, x, y)[:, VARPRO_NONLINEAR])
+    # a collapsed peak (zero width) leaves 0·inf entries in its columns
+    for i in range(Jq.shape[0]):
+        for k in range(Jq.shape[1]):
+            if not np.isfinite(Jq[i, k]):
+                Jq[i, k] = 0.0
+    return Jq - Phi.dot(np.linalg.lstsq(Phi, Jq)[0])
+
+@njit(cache=True)
+def varpro_residual_jac_nb(q, x, y, r, J):
+    # residual_jac-style wrapper so the LM backend can drive varpro too
+    r[:] = varpro_residual_nb(q, x, y)
+    if not np.all(np.isfinite(r)):
+        # degenerate trial point (e.g. zero width): LM rejects it anyway
+        J[:, :] = 0.0
+        return
+    J[:, :] = varpro_jac_nb(q, x, y)
+
+varpro_lm_solve_nb, varpro_lm_fit_nb = make_lm_solver(varpro_residual_jac_nb)
+
 class AutoFit:
     """
     Two-peak Voigt auto-fitter for R1 & R2 peaks in ruby fluorescence.
     Uses JIT-accelerated least_squares under the hood for speed and precision.
+
+    solver='trf' (default) runs scipy's least_squares; solver='lm' runs the
+    in-house bounded Levenberg–Marquardt compiled end-to-end with numba.
+
+    mode='full' (default) optimises all nine parameters; mode='varpro'
+    solves A1, A2 and the baseline linearly at every step (variable
+    projection) so the solver only searches the six nonlinear ones.
+    Both modes return the full 9-parameter popt/pcov.
+
+    guess='estimate' (default) starts from the single-pass pre-estimator
+    in peak_estimate (half-maximum widths, R2 from the residual, edge
+    baseline); guess='argmax' keeps the old fixed-shape argmax guess.
+
+    fit() accepts an optional FitBudget; when it runs out (or is
+    cancelled) the best solution so far is returned and last_partial is
+    set.
+
+    fit(sigma=...) weights each pixel by 1/σ (σ = per-pixel standard
+    deviation of the counts, e.g. from the scan-to-scan variance); pixels
+    with σ ≤ 0 or non-finite σ are left out.  Only the relative size of
+    σ matters, since pcov is still scaled by the reduced χ².  In varpro
+    mode a weighted fit is solved over all nine parameters.
+
+    With a FitCache, fit() first looks up the same counts, axis, window
+    and options and returns the stored result on a hit (last_cache_hit,
+    last_nfev = 0).  Partial results are never stored.
     """
 
+    SOLVERS = ("trf", "lm")
+    MODES = ("full", "varpro")
+    GUESSES = ("estimate", "argmax")
+
     @staticmethod
     def pseudo_voigt(x, center, amplitude, fwhm, frac):
         """
@@ -100,51 +321,223 @@ class AutoFit:
         v2 = AutoFit.pseudo_voigt(x, c1 - delta, A2, w2, f2)
         return v1 + v2 + baseline
 
-    def fit(self, wl: np.ndarray, counts: np.ndarray, lo: float, hi: float):
+    def __init__(self, solver: str = "trf", mode: str = "full",
+                 guess: str = "estimate", cache=None) -> None:
+        if solver not in self.SOLVERS:
+            raise ValueError(f"Unknown solver {solver!r}; expected one of {self.SOLVERS}")
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown mode {mode!r}; expected one of {self.MODES}")
+        if guess not in self.GUESSES:
+            raise ValueError(f"Unknown guess {guess!r}; expected one of {self.GUESSES}")
+        self.solver = solver
+        self.mode = mode
+        self.guess = guess
+        self.cache = cache
+        # bookkeeping of the most recent fit() call
+        self.last_nfev = 0
+        self.last_seeded = False
+        self.last_partial = False
+        self.last_cache_hit = False
+
+    @staticmethod
+    def _seeded_guess(seed, x, y, lower, upper, p_cold):
+        """
+        Return a usable starting point from `seed` (e.g. the previous
+        frame's popt), or None if it fails the sanity checks.  The seed
+        only wins if it already explains the data better than the cold
+        guess.
+        """
+        try:
+            p = np.asarray(seed, dtype=float).reshape(9)
+        except (TypeError, ValueError):
+            return None
+        if not np.all(np.isfinite(p)):
+            return None
+        span = x[-1] - x[0]
+        if not (lower[0] <= p[0] <= upper[0]):   # R1 left the window
+            return None
+        if p[1] <= 0 or p[5] <= 0:               # vanished peaks
+            return None
+        if not (0 < p[2] < span and 0 < p[6] < span):
+            return None
+
+        p = np.minimum(np.maximum(p, lower), upper)
+        cost_seed = np.sum(residual_nb(p, x, y) ** 2)
+        cost_cold = np.sum(residual_nb(p_cold, x, y) ** 2)
+        return p if cost_seed <= cost_cold else None
+
+    def fit(self, wl: np.ndarray, counts: np.ndarray, lo: float, hi: float,
+            seed=None, budget=None, sigma=None):
         """
         Fit two Voigt peaks between wl in [lo, hi] using a JIT-accelerated
         least_squares solver. Returns (popt, pcov) with the same shape as
         the old curve_fit interface.
+
+        `seed` is an optional 9-element starting point, typically the popt
+        of the previous frame.  It is used only if it passes basic sanity
+        checks; otherwise the cold guess is used.
+
+        `budget` is an optional FitBudget checked between solver
+        iterations.  If it expires the best point so far is returned and
+        `last_partial` is True.
+
+        `sigma` is an optional per-pixel standard deviation (same shape as
+        `counts`); the residuals are divided by it (weighted least squares).
         """
-        mask = (wl >= lo) & (wl <= hi)
+        key = None
+        self.last_cache_hit = False
+        if self.cache is not None:
+            key = self.cache.key(wl, counts, lo, hi,
+                                 ("auto", self.solver, self.mode, self.guess),
+                                 sigma=sigma)
+            hit = self.cache.get(key)
+            if hit is not None:
+                self.last_nfev, self.last_seeded, self.last_partial = 0, False, False
+                self.last_cache_hit = True
+                return hit
+
+        popt, pcov = self._fit(wl, counts, lo, hi, seed, budget, sigma)
+        if key is not None and not self.last_partial:
+            self.cache.put(key, popt, pcov)
+        return popt, pcov
+
+    def _fit(self, wl, counts, lo, hi, seed, budget, sigma=None):
+        # uncached body of fit(); non-finite pixels are left out of the window
+        mask = (wl >= lo) & (wl <= hi) & np.isfinite(counts)
+        if sigma is not None:
+            sigma = np.asarray(sigma, dtype=float)
+            if sigma.shape != counts.shape:
+                raise ValueError("sigma must have the same shape as counts")
+            with np.errstate(invalid="ignore"):
+                mask &= np.isfinite(sigma) & (sigma > 0)
         x = wl[mask]
         y = counts[mask]
         if x.size == 0:
             raise ValueError("No data in fitting range")
 
-        # Initial guesses (same strategy as before)
-        i0 = np.argmax(y)
-        c1_0, A1_0 = x[i0], y[i0]
-        w1_0, f1_0 = 1.0, 0.5
-        delta0 = 1.39
-        A2_0, w2_0, f2_0 = A1_0 * 0.5, w1_0, f1_0
-        b0 = np.min(y)
-
-        p0 = np.array([c1_0, A1_0, w1_0, f1_0,
-                       delta0, A2_0, w2_0, f2_0, b0])
-        lower = np.array([lo, 0, 0, 0, 0.5, 0, 0, 0, -np.inf])
-        upper = np.array([hi, np.inf, np.inf, 1, 2.5, np.inf, np.inf, 1, np.inf])
-
-        # Run JIT-accelerated least_squares
-        res = least_squares(
-            residual_nb,
-            p0,
-            jac=jac_nb,
-            bounds=(lower, upper),
-            args=(x, y),
-            method='trf',
-            xtol=1e-12,
-            ftol=1e-12,
-            max_nfev=5000
-        )
-        popt = res.x
+        # Cold initial guess
+        lower, upper = bounds_nb(float(lo), float(hi))
+        if self.guess == "estimate":
+            p0 = estimate_two_peak_nb(x, y, lower[4], upper[4])
+        else:
+            p0 = initial_guess_nb(x, y)
+
+        # Warm start from the previous solution when it is still valid
+        p_seed = None
+        if seed is not None:
+            p_seed = self._seeded_guess(seed, x, y, lower, upper, p0)
+        self.last_seeded = p_seed is not None
+        if p_seed is not None:
+            p0 = p_seed
+
+        if sigma is not None:
+            yw = np.vstack((y, 1.0 / sigma[mask]))
+            popt, pcov, self.last_nfev, self.last_partial = self._solve(
+                weighted_residual_jac_nb, weighted_lm_solve_nb, weighted_lm_fit_nb,
+                p0, lower, upper, x, yw, budget)
+            return popt, pcov
+
+        if self.mode == "varpro":
+            return self._fit_varpro(p0, lower, upper, x, y, budget)
+
+        popt, pcov, self.last_nfev, self.last_partial = self._solve(
+            residual_jac_nb, lm_solve_nb, lm_fit_nb,
+            p0, lower, upper, x, y, budget)
+        return popt, pcov
+
+    def _solve(self, residual_jac, lm_solve, lm_fit,
+               p0, lower, upper, x, y, budget):
+        """
+        Minimise the fused residual with the configured backend.
+        Returns (p, pcov, nfev, partial).
+        """
+        if self.solver == "lm":
+            if budget is None:
+                p, pcov, nfev, _ = lm_fit(p0, lower, upper,
+                                          x, y, 5000, 1e-12, 1e-12)
+                return p, pcov, nfev, False
+            p, pcov, nfev, _, partial = lm_fit_budgeted(
+                lm_solve, p0, lower, upper, x, y, 5000, 1e-12, 1e-12, budget)
+            return p, pcov, nfev, partial
+
+        # Run JIT-accelerated least_squares on the fused kernel
+        problem = FusedResidual(residual_jac, x, y, p0.size, budget)
+        try:
+            res = least_squares(
+                problem.fun,
+                p0,
+                jac=problem.jac,
+                bounds=(lower, upper),
+                method='trf',
+                xtol=1e-12,
+                ftol=1e-12,
+                max_nfev=5000
+            )
+            p, fun, jac, nfev, partial = res.x, res.fun, res.jac, res.nfev, False
+        except FitInterrupted:
+            (p, fun, jac), nfev, partial = problem.best(), problem.nfev, True
 
         # Estimate covariance matrix: cov ≈ inv(J^T J) * σ²
         m, n = x.size, p0.size
-        ssr = np.sum(res.fun**2)
+        ssr = np.sum(fun**2)
         sigma2 = ssr / (m - n)
         # pinv in case J^T J is ill-conditioned
-        JTJ = res.jac.T.dot(res.jac)
+        JTJ = jac.T.dot(jac)
         pcov = np.linalg.pinv(JTJ) * sigma2
 
+        return p, pcov, nfev, partial
+
+    def _fit_varpro(self, p0, lower, upper, x, y, budget=None):
+        """
+        Variable-projection solve over the nonlinear parameters, then
+        expand back to the full 9-parameter popt and its covariance.
+        """
+        nl = VARPRO_NONLINEAR
+        q, _, self.last_nfev, self.last_partial = self._solve(
+            varpro_residual_jac_nb, varpro_lm_solve_nb, varpro_lm_fit_nb,
+            p0[nl], lower[nl], upper[nl], x, y, budget)
+
+        # covariance of all nine parameters from the full Jacobian
+        popt = varpro_expand_nb(q, x, y)
+        fun = residual_nb(popt, x, y)
+        J = jac_nb(popt, x, y)
+        sigma2 = np.sum(fun**2) / (x.size - popt.size)
+        pcov = np.linalg.pinv(J.T.dot(J)) * sigma2
         return popt, pcov
+
+    def fit_many(self, wl: np.ndarray, counts: np.ndarray, lo, hi):
+        """
+        Fit a stack of spectra at once.
+
+        `counts` is (n_spectra, n_pixels); `wl` is either one shared axis
+        (n_pixels,) or one axis per row.  `lo`/`hi` may be scalars or
+        per-row arrays.  Every row is cold-started from the pre-estimate
+        and solved by lm_solve_nb, the nopython Levenberg–Marquardt loop on
+        the fused residual_jac_nb kernel; rows are spread across cores with
+        the GIL released.  That is the only batch path, so the instance
+        must be AutoFit(solver="lm") with mode="full", guess="estimate" and
+        no cache; other options raise ValueError.
+
+        Returns (popt, pcov, status, nfev) with shapes (n, 9), (n, 9, 9),
+        (n,) and (n,).  status follows least_squares: 1/2/3 = converged
+        (gradient, ftol, xtol), 0 = max_nfev reached, -1 = fewer than 10
+        finite points in the window (popt/pcov left as NaN, nfev 0).
+        """
+        if (self.solver, self.mode, self.guess) != ("lm", "full", "estimate"):
+            raise ValueError("fit_many runs the LM batch kernel only: use "
+                             "AutoFit(solver='lm', mode='full', guess='estimate')")
+        if self.cache is not None:
+            raise ValueError("fit_many does not use a FitCache")
+        counts = np.atleast_2d(np.asarray(counts, dtype=np.float64))
+        wl = np.atleast_2d(np.asarray(wl, dtype=np.float64))
+        n = counts.shape[0]
+        if wl.shape[1] != counts.shape[1] or wl.shape[0] not in (1, n):
+            raise ValueError("wl must be one shared axis or one axis per spectrum")
+
+        lo = np.broadcast_to(np.asarray(lo, dtype=np.float64), (n,)).copy()
+        hi = np.broadcast_to(np.asarray(hi, dtype=np.float64), (n,)).copy()
+
+        return _fit_many_nb(
+            np.ascontiguousarray(wl), np.ascontiguousarray(counts),
+            lo, hi, 5000, 1e-12, 1e-12
+        )
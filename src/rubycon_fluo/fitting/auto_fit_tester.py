@@ -56,12 +56,16 @@ class SyntheticSpectrumTester:
         self.fit_params = None
         self.fit_cov = None
 
-    def generate_spectrum(self, seed=None):
+    def generate_spectrum(self, seed=None, rng=None):
         """
         Build a two-peak Voigt spectrum, add shot + read noise.
+
+        Noise is drawn from `rng` (a np.random.Generator) if given,
+        otherwise from a fresh generator seeded with `seed`; the global
+        numpy random state is never touched.
         """
-        if seed is not None:
-            np.random.seed(seed)
+        if rng is None:
+            rng = np.random.default_rng(seed)
 
         # wavelength axis
         self.x = np.arange(self.lo,
@@ -80,10 +84,10 @@ class SyntheticSpectrumTester:
 
         # Poisson shot noise + Gaussian read noise
         lam = np.clip(spectrum, 0, None)
-        shot = np.random.poisson(lam)
-        read = np.random.normal(0,
-                                self.read_noise_std,
-                                size=self.x.shape)
+        shot = rng.poisson(lam)
+        read = rng.normal(0,
+                          self.read_noise_std,
+                          size=self.x.shape)
         self.y = shot + read
 
     def run_fit(self):
@@ -170,14 +174,23 @@ class SyntheticSpectrumTester:
     def run_batch_diagnostics(self,
                               delta_range=(1.0, 2.0),
                               noise_range=(0.5, 5.0),
-                              n_points=50):
+                              n_points=50,
+                              seed=None):
         """
         Perform batch fitting on a linear grid of delta and noise, but:
           - Record reduced χ² in chi2s
           - Record fit duration in times
-          - At the end, make two separate plots:
+          - Record solver evaluations from the pre-estimated start and,
+            for comparison, from the old argmax guess, then print how
+            many evaluations the pre-estimator saves
+          - At the end, make three separate plots:
               1) Δ vs noise colored by reduced χ²
               2) Δ vs noise colored by fit time
+              3) Δ vs noise colored by evaluations saved
+
+        Each grid point draws its noise from its own generator spawned
+        from `seed`, so a seeded run is reproducible.  For a headless,
+        parallel version that writes a results file see fit_benchmark.
         """
         deltas = np.linspace(delta_range[0], delta_range[1], n_points)
         noises = np.linspace(noise_range[0], noise_range[1], n_points)
@@ -185,7 +198,11 @@ class SyntheticSpectrumTester:
 
         chi2s = np.full_like(D, np.nan)
         times = np.full_like(D, np.nan)
+        nfev_est = np.full_like(D, np.nan)
+        nfev_argmax = np.full_like(D, np.nan)
         af = AutoFit()
+        af_argmax = AutoFit(guess="argmax")
+        seqs = np.random.SeedSequence(seed).spawn(n_points * n_points)
 
         total = n_points * n_points
         with tqdm(total=total, desc='Batch fitting (diag)') as pbar:
@@ -197,7 +214,8 @@ class SyntheticSpectrumTester:
                     # update params and regenerate spectrum
                     self.true_params['delta'] = d
                     self.read_noise_std = noise
-                    self.generate_spectrum()
+                    self.generate_spectrum(
+                        rng=np.random.default_rng(seqs[i * n_points + j]))
 
                     # time & fit once
                     t0 = time.perf_counter()
@@ -206,6 +224,13 @@ class SyntheticSpectrumTester:
                             warnings.simplefilter('ignore', OptimizeWarning)
                             popt, _ = af.fit(self.x, self.y, self.lo, self.hi)
                         dt = time.perf_counter() - t0
+                        nfev_est[i, j] = af.last_nfev
+
+                        # same spectrum from the old argmax guess
+                        with warnings.catch_warnings():
+                            warnings.simplefilter('ignore', OptimizeWarning)
+                            af_argmax.fit(self.x, self.y, self.lo, self.hi)
+                        nfev_argmax[i, j] = af_argmax.last_nfev
 
                         # compute reduced chi2
                         model_y = AutoFit.two_peak_model(self.x, *popt)
@@ -222,6 +247,19 @@ class SyntheticSpectrumTester:
 
                     pbar.update(1)
 
+        # Evaluations saved by the pre-estimator
+        saved = nfev_argmax - nfev_est
+        ok = ~np.isnan(saved)
+        if ok.any():
+            print(f"nfev (pre-estimate): mean {np.mean(nfev_est[ok]):.1f}, "
+                  f"median {np.median(nfev_est[ok]):.0f}")
+            print(f"nfev (argmax guess): mean {np.mean(nfev_argmax[ok]):.1f}, "
+                  f"median {np.median(nfev_argmax[ok]):.0f}")
+            print(f"saved per fit: mean {np.mean(saved[ok]):.1f} "
+                  f"({100 * np.sum(saved[ok]) / np.sum(nfev_argmax[ok]):.0f} %), "
+                  f"fewer on {np.mean(saved[ok] > 0) * 100:.0f} % of the grid, "
+                  f"more on {np.mean(saved[ok] < 0) * 100:.0f} %")
+
         # Plot 1: reduced χ²
         plt.figure(figsize=(8, 6))
         valid = ~np.isnan(chi2s)
@@ -249,8 +287,115 @@ class SyntheticSpectrumTester:
         cbar2.set_label('Time per fit (s)')
         plt.legend()
         plt.tight_layout()
+
+        # Plot 3: evaluations saved by the pre-estimator
+        plt.figure(figsize=(8, 6))
+        valid = ~np.isnan(saved)
+        failed = np.isnan(saved)
+        sc3 = plt.scatter(D[valid], N[valid], c=saved[valid])
+        plt.scatter(D[failed], N[failed], marker='x', label='no fit')
+        plt.xlabel('Delta (nm)')
+        plt.ylabel('Read noise std')
+        plt.title('Evaluations saved by the pre-estimator')
+        cbar3 = plt.colorbar(sc3)
+        cbar3.set_label('nfev(argmax) − nfev(pre-estimate)')
+        plt.legend()
+        plt.tight_layout()
         plt.show()
 
+    def benchmark_solvers(self, n_spectra=200, solvers=("trf", "lm"), seed=0):
+        """
+        Time AutoFit with each solver backend on the same set of noisy
+        synthetic spectra and print per-fit time, evaluations and the
+        R1 center agreement with the first backend.
+        """
+        spectra = []
+        for k in range(n_spectra):
+            self.generate_spectrum(seed=seed + k)
+            spectra.append(self.y.copy())
+
+        centers = {}
+        for solver in solvers:
+            af = AutoFit(solver=solver)
+            af.fit(self.x, spectra[0], self.lo, self.hi)     # JIT warm-up
+
+            times = np.empty(n_spectra)
+            nfevs = np.empty(n_spectra)
+            c1 = np.empty(n_spectra)
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', OptimizeWarning)
+                for k, y in enumerate(spectra):
+                    t0 = time.perf_counter()
+                    popt, _ = af.fit(self.x, y, self.lo, self.hi)
+                    times[k] = time.perf_counter() - t0
+                    nfevs[k] = af.last_nfev
+                    c1[k] = popt[0]
+            centers[solver] = c1
+
+            print(f"{solver:>4}: median {np.median(times) * 1e6:8.1f} µs/fit, "
+                  f"p95 {np.percentile(times, 95) * 1e6:8.1f} µs, "
+                  f"mean nfev {nfevs.mean():6.1f}")
+
+        ref = solvers[0]
+        for solver in solvers[1:]:
+            dc = np.abs(centers[solver] - centers[ref])
+            print(f"max |c1({solver}) - c1({ref})| = {dc.max():.2e} nm")
+
+    def benchmark_kernels(self, n_calls=20000, seed=0):
+        """
+        Microbenchmark the model evaluation on its own: separate
+        residual_nb + jac_nb calls versus the fused residual_jac_nb kernel
+        writing into preallocated buffers.  Prints the time per evaluation
+        and the number of numba (NRT) array allocations per evaluation.
+        Calls from Python count one allocation per array argument for
+        unboxing; beyond that the fused kernel allocates nothing.  The
+        allocation counts rely on numba's private NRT module and are left
+        out when this numba version does not provide it.
+        """
+        from rubycon_fluo.fitting.auto_fit import (
+            residual_nb, jac_nb, residual_jac_nb, initial_guess_nb)
+
+        self.generate_spectrum(seed=seed)
+        mask = (self.x >= self.lo) & (self.x <= self.hi)
+        x, y = self.x[mask], self.y[mask]
+        p = initial_guess_nb(x, y)
+        r = np.empty(x.size)
+        J = np.empty((x.size, p.size))
+
+        def separate():
+            residual_nb(p, x, y)
+            jac_nb(p, x, y)
+
+        def fused():
+            residual_jac_nb(p, x, y, r, J)
+
+        try:
+            from numba.core.runtime import rtsys, _nrt_python
+            stats_were_on = _nrt_python.memsys_stats_enabled()
+            _nrt_python.memsys_enable_stats()
+        except (ImportError, AttributeError):
+            _nrt_python = None
+            print("numba allocation statistics unavailable – timing only")
+
+        def allocations():
+            return rtsys.get_allocation_stats().alloc if _nrt_python else 0
+
+        try:
+            for name, call in (("separate", separate), ("fused", fused)):
+                call()                                      # JIT warm-up
+                a0 = allocations()
+                t0 = time.perf_counter()
+                for _ in range(n_calls):
+                    call()
+                dt = time.perf_counter() - t0
+                allocs = allocations() - a0
+                print(f"{name:>8}: {dt / n_calls * 1e6:7.2f} µs/eval"
+                      + (f", {allocs / n_calls:5.1f} allocations/eval" if _nrt_python else "")
+                      + f" ({x.size} points)")
+        finally:
+            if _nrt_python is not None and not stats_were_on:
+                _nrt_python.memsys_disable_stats()
+
     def test(self, seed=None):
         """
         One-shot: generate synthetic spectrum, fit it, and plot everything.
@@ -274,4 +419,8 @@ if __name__ == "__main__":
     )
     # example: run batch to explore fitting limits on a 50x50 grid
     #tester.run_batch_diagnostics(delta_range=(0.5, 2.0), noise_range=(1.0, 10.0), n_points=50)
+    # example: compare scipy TRF against the numba LM backend
+    #tester.benchmark_solvers(n_spectra=200)
+    # example: per-evaluation cost of the fused residual+Jacobian kernel
+    #tester.benchmark_kernels()
     tester.test(seed=42)
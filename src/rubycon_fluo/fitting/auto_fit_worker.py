@@ -1,37 +1,153 @@
-from PySide6.QtCore import QObject, Signal, Slot
+from __future__ import annotations
+
+import threading
+from typing import Optional
+
+from PySide6.QtCore import QObject, QThread, Signal, Slot
 import numpy as np
 from rubycon_fluo.fitting.auto_fit import AutoFit
+from rubycon_fluo.fitting.fit_budget import FitBudget
 
 class AutoFitWorker(QObject):
-    """Runs a two-peak AutoFit in a background thread."""
+    """
+    Long-lived two-peak AutoFit worker.
+
+    Lives on its own QThread and fits whatever spectrum was submitted
+    last.  Frames submitted while a fit is running overwrite each other
+    in a single slot ("latest frame wins"), so a slow fit never builds a
+    queue behind it.
+
+    Each fit gets a FitBudget of `time_budget_s` seconds (None = no
+    limit); stop() also cancels the fit in progress between solver
+    iterations.  A fit cut short by its budget reports its best point so
+    far through fit_partial instead of fit_finished.  An optional
+    FitCache short-circuits frames that were already fitted.  A frame may
+    carry per-pixel `sigma` for a weighted fit (see AutoFit.fit).
+    """
     fit_finished = Signal(object, object)   # (popt, pcov)
+    fit_partial  = Signal(object, object)   # (popt, pcov) – budget ran out
     fit_failed   = Signal()
+    _wake        = Signal()
 
-    def __init__(self,
-                 wl: np.ndarray,
-                 cnt: np.ndarray,
-                 lo: float,
-                 hi: float):
+    def __init__(self, time_budget_s: float | None = None, cache=None):
         super().__init__()
-        self.wl = wl
-        self.cnt = cnt
-        self.lo = lo
-        self.hi = hi
-        self._stop = False
+        self._lock = threading.Lock()
+        self._job = None            # (generation, wl, cnt, lo, hi, seed, sigma)
+        self._generation = 0        # bumped by stop() to drop stale results
+        self._budget: FitBudget | None = None   # budget of the running fit
+        self.time_budget_s = time_budget_s
+        self._fitter = AutoFit(cache=cache)
+        # emitted from the GUI thread, delivered (queued) on the worker thread
+        self._wake.connect(self.run)
+
+    def submit(self,
+               wl: np.ndarray,
+               cnt: np.ndarray,
+               lo: float,
+               hi: float,
+               seed: np.ndarray | None = None,
+               sigma: np.ndarray | None = None) -> None:
+        """Queue a fit, replacing any frame that has not started yet."""
+        with self._lock:
+            self._job = (self._generation, wl, cnt, lo, hi, seed, sigma)
+        self._wake.emit()
 
     def stop(self) -> None:
-        """Request cancellation."""
-        self._stop = True
+        """Drop the queued frame and cancel (and silence) a running fit."""
+        with self._lock:
+            self._job = None
+            self._generation += 1
+            if self._budget is not None:
+                self._budget.cancel()
+
+    def _is_current(self, generation: int) -> bool:
+        with self._lock:
+            return generation == self._generation
 
     @Slot()
     def run(self) -> None:
-        """Perform the fit; emit fit_finished or fit_failed."""
-        if self._stop:
-            return
+        """Fit the latest queued frame (if any); emit fit_finished, fit_partial or fit_failed."""
+        with self._lock:
+            job, self._job = self._job, None
+            if job is None:
+                return          # already handled by an earlier wake-up
+            budget = FitBudget(self.time_budget_s)
+            self._budget = budget
+
+        generation, wl, cnt, lo, hi, seed, sigma = job
         try:
-            popt, pcov = AutoFit().fit(self.wl, self.cnt, self.lo, self.hi)
-            if not self._stop:
-                self.fit_finished.emit(popt, pcov)
+            popt, pcov = self._fitter.fit(wl, cnt, lo, hi, seed=seed,
+                                          budget=budget, sigma=sigma)
         except Exception:
-            if not self._stop:
+            if self._is_current(generation):
                 self.fit_failed.emit()
+            return
+        finally:
+            with self._lock:
+                self._budget = None
+        if not self._is_current(generation):
+            return
+        if self._fitter.last_partial:
+            self.fit_partial.emit(popt, pcov)
+        else:
+            self.fit_finished.emit(popt, pcov)
+
+
+class AutoFitService(QObject):
+    """
+    Owns one persistent AutoFitWorker and its QThread for the lifetime
+    of the GUI, instead of a thread per fit.  Re-exports the worker's
+    fit_finished / fit_partial / fit_failed signals unchanged.
+    """
+    fit_finished = Signal(object, object)   # (popt, pcov)
+    fit_partial  = Signal(object, object)   # (popt, pcov) – budget ran out
+    fit_failed   = Signal()
+
+    def __init__(self,
+                 time_budget_s: float | None = None,
+                 cache=None,
+                 parent: Optional[QObject] = None) -> None:
+        super().__init__(parent)
+        self.cache = cache
+        self._thread: Optional[QThread] = QThread(self)
+        self._worker: Optional[AutoFitWorker] = AutoFitWorker(time_budget_s, cache)
+        self._worker.moveToThread(self._thread)
+
+        self._worker.fit_finished.connect(self.fit_finished)
+        self._worker.fit_partial.connect(self.fit_partial)
+        self._worker.fit_failed.connect(self.fit_failed)
+        self._thread.finished.connect(self._worker.deleteLater)
+
+        self._thread.start()
+
+    def submit(self,
+               wl: np.ndarray,
+               cnt: np.ndarray,
+               lo: float,
+               hi: float,
+               seed: np.ndarray | None = None,
+               sigma: np.ndarray | None = None) -> None:
+        """Hand a frame to the worker; a newer frame replaces a queued one."""
+        if self._worker is not None:
+            self._worker.submit(wl, cnt, lo, hi, seed, sigma)
+
+    def set_time_budget(self, seconds: float | None) -> None:
+        """Per-fit wall-clock limit applied from the next fit on (None = off)."""
+        if self._worker is not None:
+            self._worker.time_budget_s = seconds
+
+    def cancel(self) -> None:
+        """Forget the queued frame and ignore the fit currently running."""
+        if self._worker is not None:
+            self._worker.stop()
+
+    def shutdown(self) -> None:
+        """Stop the worker thread and release the Qt objects."""
+        if self._thread is None:
+            return
+        self.cancel()
+        self._thread.quit()
+        self._thread.wait()
+        self._thread.deleteLater()
+        self._thread = None
+        self._worker = None
@@ -0,0 +1,336 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+from scipy.optimize import OptimizeWarning
+
+from rubycon_fluo.fitting.auto_fit import AutoFit
+from rubycon_fluo.fitting.auto_fit_tester import SyntheticSpectrumTester
+
+# fixed part of every synthetic spectrum; the grid varies the rest
+SPECTRUM_DEFAULTS = dict(center=694.2, frac1=0.3, baseline=10.0, lo=685.0, hi=700.0)
+
+# default regression thresholds for compare_results (relative changes)
+TIME_TOL = 0.10
+NFEV_TOL = 0.05
+BIAS_TOL = 0.10
+BIAS_FLOOR_NM = 1e-4      # ignore bias changes smaller than this
+CHI2_TOL = 0.05
+
+# per-pixel variance behind rchi2, recorded in the results meta
+RCHI2_SIGMA = "shot+read"
+
+
+def _num(v):
+    # JSON-safe float: NaN/inf → None
+    v = float(v)
+    return v if np.isfinite(v) else None
+
+
+def build_tasks(delta_range=(1.0, 2.0),
+                noise_range=(0.5, 5.0),
+                n_points=20,
+                amplitudes=(100.0,),
+                fwhms=(0.8,),
+                repeats=1,
+                seed=0):
+    """
+    Expand the synthetic grid into a list of task dicts.  Every task gets
+    its own child SeedSequence spawned from `seed`, so results do not
+    depend on how tasks are split across worker processes.
+    """
+    deltas = np.linspace(delta_range[0], delta_range[1], n_points)
+    noises = np.linspace(noise_range[0], noise_range[1], n_points)
+    grid = [(a, w, d, s)
+            for a in amplitudes for w in fwhms
+            for d in deltas for s in noises
+            for _ in range(repeats)]
+    seqs = np.random.SeedSequence(seed).spawn(len(grid))
+    return [dict(id=k, amplitude=float(a), fwhm=float(w),
+                 delta=float(d), noise=float(s), seed_seq=seqs[k])
+            for k, (a, w, d, s) in enumerate(grid)]
+
+
+def _run_chunk(tasks, fit_kwargs):
+    """Worker-process body: fit every task in `tasks`, return records."""
+    af = AutoFit(**fit_kwargs)
+    records = []
+    warm_up = True
+    for task in tasks:
+        tester = SyntheticSpectrumTester(amplitude1=task["amplitude"],
+                                         fwhm1=task["fwhm"],
+                                         delta=task["delta"],
+                                         read_noise_std=task["noise"],
+                                         **SPECTRUM_DEFAULTS)
+        tester.generate_spectrum(rng=np.random.default_rng(task["seed_seq"]))
+        x, y = tester.x, tester.y
+        tp = tester.true_params
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', OptimizeWarning)
+            if warm_up:
+                # JIT/cache load once per process, outside the timings
+                try:
+                    af.fit(x, y, tester.lo, tester.hi)
+                except Exception:
+                    pass
+                warm_up = False
+
+            rec = dict(id=task["id"], amplitude=task["amplitude"],
+                       fwhm=task["fwhm"], delta=task["delta"],
+                       noise=task["noise"], ok=False)
+            t0 = time.perf_counter()
+            try:
+                popt, pcov = af.fit(x, y, tester.lo, tester.hi)
+            except Exception as e:
+                rec.update(time_s=_num(time.perf_counter() - t0), error=str(e))
+                records.append(rec)
+                continue
+            dt = time.perf_counter() - t0
+
+        model = AutoFit.two_peak_model(x, *popt)
+        resid = y - model
+        # shot noise of the fitted signal + read noise, so a good fit scores ≈ 1
+        var = np.maximum(model, 0.0) + task["noise"] ** 2
+        dof = max(1, x.size - popt.size)
+        sigma_c1 = np.sqrt(pcov[0, 0]) if pcov[0, 0] >= 0 else np.nan
+        c1_bias = popt[0] - tp['c1']
+        rec.update(
+            ok=True,
+            time_s=_num(dt),
+            nfev=int(af.last_nfev),
+            partial=bool(af.last_partial),
+            c1_bias=_num(c1_bias),
+            delta_bias=_num(popt[4] - tp['delta']),
+            sigma_c1=_num(sigma_c1),
+            pull_c1=_num(c1_bias / sigma_c1) if sigma_c1 > 0 else None,
+            rchi2=_num(np.sum(resid ** 2 / var) / dof),
+        )
+        records.append(rec)
+    return records
+
+
+def summarize(results):
+    """Aggregate statistics of a list of result records."""
+    ok = [r for r in results if r["ok"]]
+
+    def col(key):
+        return np.array([r[key] for r in ok if r.get(key) is not None], float)
+
+    t, nfev, bias, chi2, pull = (col("time_s"), col("nfev"), col("c1_bias"),
+                                 col("rchi2"), col("pull_c1"))
+    nan = float("nan")
+    return dict(
+        n=len(results),
+        failures=len(results) - len(ok),
+        partial=sum(1 for r in ok if r.get("partial")),
+        time_median_s=float(np.median(t)) if t.size else nan,
+        time_p95_s=float(np.percentile(t, 95)) if t.size else nan,
+        nfev_mean=float(nfev.mean()) if nfev.size else nan,
+        c1_bias_mean_nm=float(bias.mean()) if bias.size else nan,
+        c1_bias_rms_nm=float(np.sqrt(np.mean(bias ** 2))) if bias.size else nan,
+        pull_c1_rms=float(np.sqrt(np.mean(pull ** 2))) if pull.size else nan,
+        rchi2_median=float(np.median(chi2)) if chi2.size else nan,
+    )
+
+
+def print_summary(summary, label=""):
+    """One-line human-readable rendering of summarize() output."""
+    s = summary
+    print(f"{label}{s['n']} fits, {s['failures']} failed, {s['partial']} partial | "
+          f"time median {s['time_median_s'] * 1e3:.2f} ms, p95 {s['time_p95_s'] * 1e3:.2f} ms | "
+          f"nfev {s['nfev_mean']:.1f} | c1 bias mean {s['c1_bias_mean_nm']:+.2e} nm, "
+          f"rms {s['c1_bias_rms_nm']:.2e} nm | pull rms {s['pull_c1_rms']:.2f} | "
+          f"χ²ᵣ median {s['rchi2_median']:.3f}")
+
+
+def run_benchmark(out_path,
+                  workers=None,
+                  solver="trf",
+                  mode="full",
+                  guess="estimate",
+                  seed=0,
+                  **grid):
+    """
+    Fit the synthetic grid (see build_tasks for `grid` keywords) across
+    `workers` processes (default: all cores) and write the per-fit
+    records plus a summary to `out_path` as JSON.  Returns the written
+    document.
+
+    Timings come from inside the workers, so they include contention
+    between processes; compare files produced with the same worker count.
+    """
+    grid.setdefault("n_points", 20)
+    tasks = build_tasks(seed=seed, **grid)
+    workers = workers or os.cpu_count() or 1
+    fit_kwargs = dict(solver=solver, mode=mode, guess=guess)
+
+    # interleaved chunks: each process sees the whole range of the grid
+    n_chunks = min(len(tasks), workers * 4)
+    chunks = [tasks[i::n_chunks] for i in range(n_chunks)]
+
+    t0 = time.perf_counter()
+    if workers == 1:
+        parts = [_run_chunk(c, fit_kwargs) for c in chunks]
+    else:
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            parts = list(pool.map(_run_chunk, chunks, [fit_kwargs] * n_chunks))
+    wall = time.perf_counter() - t0
+
+    results = sorted((r for part in parts for r in part), key=lambda r: r["id"])
+    grid_meta = {k: list(v) if isinstance(v, (tuple, list)) else v
+                 for k, v in grid.items()}
+    doc = dict(
+        meta=dict(
+            created=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            fit=fit_kwargs,
+            grid=grid_meta,
+            spectrum=SPECTRUM_DEFAULTS,
+            seed=seed,
+            rchi2_sigma=RCHI2_SIGMA,
+            workers=workers,
+            wall_time_s=wall,
+            platform=platform.platform(),
+            python=platform.python_version(),
+            numpy=np.__version__,
+        ),
+        summary=summarize(results),
+        results=results,
+    )
+    with open(out_path, "w") as f:
+        json.dump(doc, f, indent=1)
+    return doc
+
+
+def load_results(path):
+    """Read a results file written by run_benchmark."""
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def compare_results(base, new,
+                    time_tol=TIME_TOL,
+                    nfev_tol=NFEV_TOL,
+                    bias_tol=BIAS_TOL,
+                    chi2_tol=CHI2_TOL):
+    """
+    Compare two result documents (dicts or file paths), print both
+    summaries and return a list of regression messages (empty = pass).
+
+    Flags: more failures or partial fits, median time or mean nfev up by
+    more than time_tol / nfev_tol, c1 bias RMS up by more than bias_tol
+    (and BIAS_FLOOR_NM), median reduced χ² up by more than chi2_tol.
+    """
+    if not isinstance(base, dict):
+        base = load_results(base)
+    if not isinstance(new, dict):
+        new = load_results(new)
+
+    for key in ("grid", "seed", "spectrum", "rchi2_sigma"):
+        if base["meta"].get(key) != new["meta"].get(key):
+            print(f"warning: '{key}' differs between the runs; "
+                  f"results are not like-for-like")
+    if base["meta"].get("workers") != new["meta"].get("workers"):
+        print("warning: different worker counts; timings are not comparable")
+
+    a = summarize(base["results"])
+    b = summarize(new["results"])
+    print_summary(a, "base: ")
+    print_summary(b, "new:  ")
+
+    def rel(key):
+        return (b[key] - a[key]) / a[key] if a[key] else float("inf")
+
+    problems = []
+    if b["failures"] > a["failures"]:
+        problems.append(f"failures {a['failures']} → {b['failures']}")
+    if b["partial"] > a["partial"]:
+        problems.append(f"partial fits {a['partial']} → {b['partial']}")
+    if rel("time_median_s") > time_tol:
+        problems.append(f"median fit time +{rel('time_median_s'):.0%}")
+    if rel("nfev_mean") > nfev_tol:
+        problems.append(f"mean nfev +{rel('nfev_mean'):.0%}")
+    if (rel("c1_bias_rms_nm") > bias_tol
+            and b["c1_bias_rms_nm"] - a["c1_bias_rms_nm"] > BIAS_FLOOR_NM):
+        problems.append(f"c1 bias rms {a['c1_bias_rms_nm']:.2e} → "
+                        f"{b['c1_bias_rms_nm']:.2e} nm")
+    if rel("rchi2_median") > chi2_tol:
+        problems.append(f"median reduced χ² +{rel('rchi2_median'):.0%}")
+
+    for p in problems:
+        print(f"REGRESSION: {p}")
+    if not problems:
+        print("no regressions")
+    return problems
+
+
+def main(argv=None):
+    """
+    Command line:
+        python -m rubycon_fluo.fitting.fit_benchmark run OUT.json [options]
+        python -m rubycon_fluo.fitting.fit_benchmark compare BASE.json NEW.json
+    `compare` exits with status 1 when a regression is flagged.
+    """
+    ap = argparse.ArgumentParser(prog="fit_benchmark",
+                                 description="Headless AutoFit benchmark on synthetic spectra")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    run = sub.add_parser("run", help="fit the synthetic grid and write a results file")
+    run.add_argument("out")
+    run.add_argument("--workers", type=int, default=None)
+    run.add_argument("--solver", choices=AutoFit.SOLVERS, default="trf")
+    run.add_argument("--mode", choices=AutoFit.MODES, default="full")
+    run.add_argument("--guess", choices=AutoFit.GUESSES, default="estimate")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--n-points", type=int, default=20)
+    run.add_argument("--repeats", type=int, default=1)
+    run.add_argument("--delta-range", type=float, nargs=2, default=(1.0, 2.0))
+    run.add_argument("--noise-range", type=float, nargs=2, default=(0.5, 5.0))
+    run.add_argument("--amplitudes", type=float, nargs="+", default=[100.0])
+    run.add_argument("--fwhms", type=float, nargs="+", default=[0.8])
+
+    cmp_ = sub.add_parser("compare", help="flag regressions between two results files")
+    cmp_.add_argument("base")
+    cmp_.add_argument("new")
+    cmp_.add_argument("--time-tol", type=float, default=TIME_TOL)
+    cmp_.add_argument("--nfev-tol", type=float, default=NFEV_TOL)
+    cmp_.add_argument("--bias-tol", type=float, default=BIAS_TOL)
+    cmp_.add_argument("--chi2-tol", type=float, default=CHI2_TOL)
+
+    args = ap.parse_args(argv)
+    if args.cmd == "run":
+        doc = run_benchmark(args.out,
+                            workers=args.workers,
+                            solver=args.solver,
+                            mode=args.mode,
+                            guess=args.guess,
+                            seed=args.seed,
+                            n_points=args.n_points,
+                            repeats=args.repeats,
+                            delta_range=tuple(args.delta_range),
+                            noise_range=tuple(args.noise_range),
+                            amplitudes=tuple(args.amplitudes),
+                            fwhms=tuple(args.fwhms))
+        print_summary(doc["summary"])
+        print(f"wrote {args.out} ({doc['meta']['wall_time_s']:.1f} s wall)")
+        return 0
+
+    problems = compare_results(args.base, args.new,
+                               time_tol=args.time_tol,
+                               nfev_tol=args.nfev_tol,
+                               bias_tol=args.bias_tol,
+                               chi2_tol=args.chi2_tol)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+import threading
+import time
+
+class FitInterrupted(Exception):
+    """Raised inside a residual evaluation once the fit budget is spent."""
+
+
+class FitBudget:
+    """
+    Wall-clock budget plus a cancellation token for one fit.
+
+    The solvers poll expired() between iterations; once it returns True
+    they stop and hand back the best parameters found so far, which the
+    caller reports as a partial result.  seconds=None means no deadline
+    (cancellation still works).  cancel() may be called from any thread.
+    """
+
+    def __init__(self, seconds: float | None = None) -> None:
+        self.seconds = seconds
+        self._deadline = (None if seconds is None
+                          else time.perf_counter() + seconds)
+        self._cancelled = threading.Event()
+
+    def cancel(self) -> None:
+        """Ask the running fit to stop at its next check."""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def expired(self) -> bool:
+        """True once cancelled or past the deadline."""
+        if self._cancelled.is_set():
+            return True
+        return self._deadline is not None and time.perf_counter() >= self._deadline
@@ -0,0 +1,82 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+class FitCache:
+    """
+    Small thread-safe LRU cache of (popt, pcov) fit results.
+
+    Keys combine a digest of the counts buffer, a digest of the
+    wavelength axis (reused while the same axis object is passed in
+    again), the fit window, a tuple of fit options and, for weighted
+    fits, a digest of sigma.  Results are
+    stored and returned as copies, so callers may modify them freely.
+    Axis arrays are assumed not to be modified in place.
+    `hits` / `misses` count lookups for diagnostics.
+    """
+
+    def __init__(self, maxsize: int = 32) -> None:
+        self.maxsize = max(1, int(maxsize))
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._axis = None           # last axis object seen, and its digest
+        self._axis_digest = b""
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _digest(a: np.ndarray) -> bytes:
+        a = np.ascontiguousarray(a)
+        h = hashlib.blake2b(a.view(np.uint8), digest_size=16)
+        h.update(str((a.dtype.str, a.shape)).encode())
+        return h.digest()
+
+    def key(self, wl: np.ndarray, counts: np.ndarray, lo, hi, options,
+            sigma=None) -> tuple:
+        """Build the lookup key for one fit call (`sigma`: optional fit weights)."""
+        with self._lock:
+            axis, axis_digest = self._axis, self._axis_digest
+        if wl is not axis:
+            axis_digest = self._digest(wl)
+            with self._lock:
+                self._axis, self._axis_digest = wl, axis_digest
+        return (self._digest(counts), axis_digest,
+                float(lo), float(hi), tuple(options),
+                None if sigma is None else self._digest(np.asarray(sigma, dtype=float)))
+
+    def get(self, key):
+        """Return a copy of the cached (popt, pcov), or None on a miss."""
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+        return hit[0].copy(), hit[1].copy()
+
+    def put(self, key, popt, pcov) -> None:
+        """Store a result, evicting the least recently used entry if full."""
+        with self._lock:
+            self._data[key] = (np.array(popt, dtype=float),
+                               np.array(pcov, dtype=float))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop all entries (counters are kept)."""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        """Hit/miss counters, hit rate and current size."""
+        with self._lock:
+            total = self.hits + self.misses
+            return dict(hits=self.hits,
+                        misses=self.misses,
+                        hit_rate=self.hits / total if total else 0.0,
+                        size=len(self._data),
+                        maxsize=self.maxsize)
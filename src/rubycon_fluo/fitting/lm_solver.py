@@ -0,0 +1,244 @@
+import numpy as np
+from numba import njit
+
+from rubycon_fluo.fitting.fit_budget import FitInterrupted
+
+@njit(cache=True, nogil=True)
+def _cholesky_solve_nb(A, b, L, out):
+    # Solve A·out = b for a small SPD matrix using the scratch factor L.
+    # Returns False (leaving `out` undefined) if A is not positive definite.
+    n = A.shape[0]
+    for j in range(n):
+        s = A[j, j]
+        for k in range(j):
+            s -= L[j, k] * L[j, k]
+        if not s > 0.0:
+            return False
+        L[j, j] = np.sqrt(s)
+        for i in range(j + 1, n):
+            s = A[i, j]
+            for k in range(j):
+                s -= L[i, k] * L[j, k]
+            L[i, j] = s / L[j, j]
+    # forward then backward substitution
+    for i in range(n):
+        s = b[i]
+        for k in range(i):
+            s -= L[i, k] * out[k]
+        out[i] = s / L[i, i]
+    for i in range(n - 1, -1, -1):
+        s = out[i]
+        for k in range(i + 1, n):
+            s -= L[k, i] * out[k]
+        out[i] = s / L[i, i]
+    return True
+
+
+def make_lm_solver(residual_jac):
+    """
+    Build nopython Levenberg–Marquardt routines specialised to one fused
+    kernel.  `residual_jac(p, x, y, r, J)` must be an njit function that
+    writes the residual and Jacobian at p into the caller-owned buffers r
+    and J (e.g. residual_jac_nb).  The kernel is bound as a closure
+    variable rather than passed as an argument so the compiled solvers
+    stay cacheable and can be called from other (parallel) njit code.
+
+    Returns (lm_solve, lm_fit).
+    """
+    @njit(cache=True, nogil=True)
+    def lm_solve(p0, lower, upper, x, y, max_nfev, xtol, ftol, lam0):
+        """
+        Bounded (projected) Levenberg–Marquardt for small dense problems.
+        All work arrays are allocated once up front, so the iterations
+        themselves do not allocate.  lam0 is the starting damping; pass
+        the returned lam back in to resume a solve (see lm_fit_budgeted).
+
+        Returns (p, r, J, nfev, status, lam) where r and J are evaluated
+        at p and status follows least_squares: 0 = max_nfev reached,
+        1 = gradient vanished, 2 = ftol, 3 = xtol.
+        """
+        m, n = x.shape[0], p0.shape[0]
+        p = np.empty(n)
+        p_new = np.empty(n)
+        g = np.empty(n)
+        dp = np.empty(n)
+        JTJ = np.empty((n, n))
+        A = np.empty((n, n))
+        L = np.empty((n, n))
+        r = np.empty(m)
+        r_new = np.empty(m)
+        J = np.empty((m, n))
+        J_new = np.empty((m, n))
+
+        for k in range(n):
+            p[k] = min(max(p0[k], lower[k]), upper[k])
+        residual_jac(p, x, y, r, J)
+        nfev = 1
+        cost = np.dot(r, r)
+        lam = lam0
+        status = 0
+        while nfev < max_nfev:
+            # normal equations JᵀJ and gradient Jᵀr
+            for a in range(n):
+                s = 0.0
+                for i in range(m):
+                    s += J[i, a] * r[i]
+                g[a] = s
+                for b in range(a + 1):
+                    s = 0.0
+                    for i in range(m):
+                        s += J[i, a] * J[i, b]
+                    JTJ[a, b] = s
+                    JTJ[b, a] = s
+            # parameters pinned at a bound with the descent pointing outward
+            # are frozen for this step (simple active-set projection)
+            gmax = 0.0
+            for k in range(n):
+                if ((p[k] <= lower[k] and g[k] > 0.0)
+                        or (p[k] >= upper[k] and g[k] < 0.0)):
+                    JTJ[k, :] = 0.0
+                    JTJ[:, k] = 0.0
+                    JTJ[k, k] = 1.0
+                    g[k] = 0.0
+                gmax = max(gmax, abs(g[k]))
+            if gmax == 0.0:
+                status = 1
+                break
+
+            accepted = False
+            cost_new = cost
+            while nfev < max_nfev and lam < 1e16:
+                A[:, :] = JTJ
+                for k in range(n):
+                    A[k, k] += lam * max(JTJ[k, k], 1e-12)
+                if _cholesky_solve_nb(A, g, L, dp):
+                    for k in range(n):
+                        p_new[k] = min(max(p[k] - dp[k], lower[k]), upper[k])
+                    residual_jac(p_new, x, y, r_new, J_new)
+                    nfev += 1
+                    cost_new = np.dot(r_new, r_new)
+                    if cost_new < cost:
+                        accepted = True
+                        break
+                lam *= 10.0
+            if not accepted:
+                # no downhill step left → as good as it gets
+                if nfev < max_nfev:
+                    status = 2
+                break
+            lam = max(lam * 0.1, 1e-12)
+
+            step = 0.0
+            scale = 0.0
+            for k in range(n):
+                step += (p_new[k] - p[k]) ** 2
+                scale += p_new[k] ** 2
+            step = np.sqrt(step)
+            scale = np.sqrt(scale)
+            d_cost = cost - cost_new
+
+            # accepted trial becomes the current point (buffer swap, no copy)
+            p, p_new = p_new, p
+            r, r_new = r_new, r
+            J, J_new = J_new, J
+            cost = cost_new
+            if d_cost <= ftol * cost:
+                status = 2
+                break
+            if step <= xtol * (xtol + scale):
+                status = 3
+                break
+        return p, r, J, nfev, status, lam
+
+    @njit(cache=True, nogil=True)
+    def lm_fit(p0, lower, upper, x, y, max_nfev, xtol, ftol):
+        """
+        lm_solve plus the usual covariance estimate, all in nopython mode.
+        Returns (popt, pcov, nfev, status); pcov = pinv(JᵀJ) · SSR / (m − n).
+        """
+        p, r, J, nfev, status, _ = lm_solve(p0, lower, upper,
+                                            x, y, max_nfev, xtol, ftol, 1e-3)
+        sigma2 = np.dot(r, r) / max(1, x.size - p.size)
+        pcov = np.linalg.pinv(J.T.dot(J)) * sigma2
+        return p, pcov, nfev, status
+
+    return lm_solve, lm_fit
+
+
+def lm_fit_budgeted(lm_solve, p0, lower, upper, x, y, max_nfev, xtol, ftol,
+                    budget, chunk_nfev=20):
+    """
+    Run a make_lm_solver() `lm_solve` in slices of `chunk_nfev`
+    evaluations, checking the FitBudget between slices.  LM only accepts
+    downhill steps, so the current point is always the best so far.
+
+    Returns (popt, pcov, nfev, status, partial); partial is True when the
+    budget ran out before the solver converged.
+    """
+    p, lam, nfev = p0, 1e-3, 0
+    partial = False
+    while True:
+        p, r, J, k, status, lam = lm_solve(p, lower, upper, x, y,
+                                           min(chunk_nfev, max_nfev - nfev),
+                                           xtol, ftol, lam)
+        nfev += k
+        if status != 0 or nfev >= max_nfev:
+            break
+        if budget.expired():
+            partial = True
+            break
+    sigma2 = np.dot(r, r) / max(1, x.size - p.size)
+    pcov = np.linalg.pinv(J.T.dot(J)) * sigma2
+    return p, pcov, nfev, status, partial
+
+
+class FusedResidual:
+    """
+    Exposes a fused residual_jac kernel as the separate fun/jac callables
+    that scipy's least_squares expects.  Each new point is evaluated once,
+    residual and Jacobian together, into preallocated buffers; jac() at
+    the point fun() just visited reuses that pass.  Copies are handed to
+    scipy because TRF keeps earlier residuals alive across trial steps.
+
+    With a FitBudget, every new evaluation first checks the budget and
+    raises FitInterrupted once it is spent; best() then returns the
+    lowest-cost point visited so far.
+    """
+
+    def __init__(self, residual_jac, x, y, n_params: int, budget=None) -> None:
+        self._kernel = residual_jac
+        self._x = x
+        self._y = y
+        self._budget = budget
+        self._p = np.full(n_params, np.nan)
+        self._r = np.empty(x.shape[0])
+        self._J = np.empty((x.shape[0], n_params))
+        self.nfev = 0
+        self._best_cost = np.inf
+        self._best = None
+
+    def _evaluate(self, p) -> None:
+        if not np.array_equal(p, self._p):
+            if (self._budget is not None and self._best is not None
+                    and self._budget.expired()):
+                raise FitInterrupted()
+            self._kernel(p, self._x, self._y, self._r, self._J)
+            self._p[:] = p
+            self.nfev += 1
+            if self._budget is not None:
+                cost = np.dot(self._r, self._r)
+                if cost < self._best_cost:
+                    self._best_cost = cost
+                    self._best = (self._p.copy(), self._r.copy(), self._J.copy())
+
+    def best(self):
+        """(p, r, J) at the lowest-cost point evaluated (budgeted runs only)."""
+        return self._best
+
+    def fun(self, p):
+        self._evaluate(p)
+        return self._r.copy()
+
+    def jac(self, p):
+        self._evaluate(p)
+        return self._J.copy()
@@ -0,0 +1,170 @@
+import numpy as np
+from numba import njit
+
+# pseudo-Voigt height one FWHM away from the centre, relative to the peak:
+# Gaussian exp(-4 ln 2) = 1/16, Lorentzian 1 / (1 + 2²) = 1/5
+_G_AT_FWHM = 0.0625
+_L_AT_FWHM = 0.2
+
+@njit(cache=True)
+def _interp_nb(x, y, xq):
+    # linear interpolation on an ascending axis; NaN outside it
+    n = x.shape[0]
+    if xq < x[0] or xq > x[n - 1]:
+        return np.nan
+    k = np.searchsorted(x, xq)
+    if k == 0:
+        return y[0]
+    t = (xq - x[k - 1]) / (x[k] - x[k - 1])
+    return y[k - 1] + t * (y[k] - y[k - 1])
+
+@njit(cache=True)
+def _finite_nb(x, y):
+    # the samples with finite x and y (e.g. NaN pixels after an irradiance division)
+    keep = np.isfinite(x) & np.isfinite(y)
+    return x[keep], y[keep]
+
+@njit(cache=True)
+def _smooth3_nb(y):
+    # 3-point running mean; knocks single-pixel noise off argmax/crossings
+    n = y.shape[0]
+    out = y.copy()
+    for i in range(1, n - 1):
+        out[i] = (y[i - 1] + y[i] + y[i + 1]) / 3.0
+    return out
+
+@njit(cache=True)
+def _pv_nb(u, amp, fwhm, frac):
+    # pseudo-Voigt at offset u from the centre
+    sigma = fwhm / (2.0 * np.sqrt(2.0 * np.log(2.0)))
+    return amp * ((1.0 - frac) * np.exp(-0.5 * (u / sigma) ** 2)
+                  + frac / (1.0 + (2.0 * u / fwhm) ** 2))
+
+@njit(cache=True)
+def edge_baseline_nb(y):
+    """
+    Baseline from the window edges: the lower of the median of the first
+    and last ~10 % of the points (the other edge may sit on a peak tail).
+    """
+    n = y.shape[0]
+    k = max(2, n // 10)
+    if 2 * k > n:
+        return np.min(y)
+    return min(np.median(y[:k]), np.median(y[n - k:]))
+
+@njit(cache=True)
+def estimate_peak_nb(x, y, baseline, right_only=False):
+    """
+    Single pseudo-Voigt starting values from one pass over the data
+    (after a 3-point running mean).
+
+    - centre: argmax refined by a three-point parabola
+    - amplitude: peak height above `baseline`
+    - FWHM: half-maximum crossings walked out from the peak (linearly
+      interpolated); the narrower half is doubled, since the other side
+      may be widened by a neighbouring peak.  right_only=True always
+      uses the long-wavelength half (R1's clean side).
+    - fraction: height one FWHM from the centre on that clean side,
+      placed between the Gaussian (1/16) and Lorentzian (1/5) values
+
+    Non-finite samples are skipped.  Returns (center, amplitude, fwhm,
+    frac); NaN centre and width if no sample is finite.
+    """
+    x, y = _finite_nb(x, y)
+    n = x.shape[0]
+    if n == 0:
+        return np.nan, 0.0, np.nan, 0.5
+    y = _smooth3_nb(y)
+    i0 = np.argmax(y)
+    center = x[i0]
+    if 0 < i0 < n - 1:
+        ym, y0, yp = y[i0 - 1], y[i0], y[i0 + 1]
+        den = ym - 2.0 * y0 + yp
+        if den < 0.0:
+            shift = 0.5 * (ym - yp) / den
+            center = x[i0] + shift * 0.5 * (x[i0 + 1] - x[i0 - 1])
+    amp = y[i0] - baseline
+    span = x[n - 1] - x[0]
+    if not amp > 0.0:
+        return center, max(y[i0], 0.0), span / 10.0, 0.5
+
+    half = baseline + 0.5 * amp
+    hw_left = np.inf
+    for i in range(i0 - 1, -1, -1):
+        if y[i] < half:
+            t = (half - y[i]) / (y[i + 1] - y[i])
+            hw_left = center - (x[i] + t * (x[i + 1] - x[i]))
+            break
+    hw_right = np.inf
+    for i in range(i0 + 1, n):
+        if y[i] < half:
+            t = (y[i - 1] - half) / (y[i - 1] - y[i])
+            hw_right = (x[i - 1] + t * (x[i] - x[i - 1])) - center
+            break
+
+    use_right = right_only or hw_right <= hw_left
+    hw = hw_right if use_right else hw_left
+    if not (np.isfinite(hw) and hw > 0.0):
+        hw = min(hw_left, hw_right)
+        use_right = hw == hw_right
+    if not (np.isfinite(hw) and hw > 0.0):
+        return center, amp, span / 10.0, 0.5
+    fwhm = 2.0 * hw
+
+    # shape from the tail one FWHM out on the clean side
+    xq = center + fwhm if use_right else center - fwhm
+    rel = (_interp_nb(x, y, xq) - baseline) / amp
+    if np.isfinite(rel):
+        frac = (rel - _G_AT_FWHM) / (_L_AT_FWHM - _G_AT_FWHM)
+        frac = min(max(frac, 0.0), 1.0)
+    else:
+        frac = 0.5
+    return center, amp, fwhm, frac
+
+@njit(cache=True)
+def estimate_two_peak_nb(x, y, delta_min, delta_max):
+    """
+    Nine-parameter R1/R2 starting point in the AutoFit layout
+    (c1, A1, w1, f1, delta, A2, w2, f2, baseline), all in O(n):
+
+    baseline from the window edges, R1 from estimate_peak_nb on its
+    long-wavelength side, then R2 as the largest residual after
+    subtracting the R1 estimate, searched delta_min…delta_max below c1.
+    R1 is then re-estimated once with that R2 removed (overlapping
+    peaks pull the raw maximum towards R2) and R2 searched again.
+    R2 inherits R1's width and shape; if nothing usable is found the
+    usual ruby defaults are kept (delta 1.39 nm, A2 = A1 / 2).
+    Non-finite samples are skipped (all NaN if none is left).
+    """
+    x, y = _finite_nb(x, y)
+    n = x.shape[0]
+    if n == 0:
+        return np.full(9, np.nan)
+    b0 = edge_baseline_nb(y)
+    ys = _smooth3_nb(y)
+    resid = np.empty(n)
+
+    c1, A1, w1, f1 = estimate_peak_nb(x, y, b0, True)
+    delta = min(max(1.39, delta_min), delta_max)
+    A2 = 0.5 * A1
+    for rnd in range(2):
+        if rnd == 1:
+            # R1 alone: data minus baseline-free R2 estimate
+            for i in range(n):
+                resid[i] = y[i] - _pv_nb(x[i] - (c1 - delta), A2, w1, f1)
+            c1, A1, w1, f1 = estimate_peak_nb(x, resid, b0, True)
+
+        best = 0.0
+        c2 = np.nan
+        for i in range(n):
+            d = c1 - x[i]
+            if d < delta_min or d > delta_max:
+                continue
+            res = ys[i] - b0 - _pv_nb(x[i] - c1, A1, w1, f1)
+            if res > best:
+                best = res
+                c2 = x[i]
+        if best > 0.0:
+            delta = c1 - c2
+            A2 = best
+    return np.array([c1, A1, w1, f1, delta, A2, w1, f1, b0])
@@ -2,6 +2,9 @@ import numpy as np
 from scipy.optimize import least_squares
 from numba import njit
 
+from rubycon_fluo.fitting.lm_solver import make_lm_solver, FusedResidual
+from rubycon_fluo.fitting.peak_estimate import estimate_peak_nb
+
 @njit(cache=True, fastmath=True)
 def _pseudo_voigt_nb(x, c, A, w, f):
     sigma = w / (2 * np.sqrt(2 * np.log(2)))
@@ -47,7 +50,46 @@ def _jac_nb(p, x, y):
 
     return J
 
+@njit(cache=True, fastmath=True, nogil=True)
+def _residual_jac_nb(p, x, y, r, J):
+    # fused single-pass residual + Jacobian into caller-owned r (m,), J (m, 4)
+    c, A, w, f = p[0], p[1], p[2], p[3]
+    sigma = w / (2 * np.sqrt(2 * np.log(2)))
+    h = w / 2.0
+    for i in range(x.shape[0]):
+        t = (x[i] - c) / sigma
+        e = np.exp(-0.5 * t * t)
+        u = (x[i] - c) / h
+        l = 1.0 / (1.0 + u * u)
+        v = (1.0 - f) * e + f * l
+        r[i] = A * v - y[i]
+        J[i, 0] = A * ((1.0 - f) * e * t / sigma + f * 2.0 * u * l * l / h)
+        J[i, 1] = v
+        J[i, 2] = A * ((1.0 - f) * e * t * t + f * 2.0 * u * u * l * l) / w
+        J[i, 3] = A * (l - e)
+
+_, _lm_fit_nb = make_lm_solver(_residual_jac_nb)
+
 class VoigtFitter:
+    """
+    Single pseudo-Voigt fitter used for the manual fit modes.
+
+    solver='trf' (default) runs scipy's least_squares; solver='lm' runs the
+    numba Levenberg–Marquardt from lm_solver.
+
+    An optional FitCache returns the stored result when the same x/y
+    data is fitted again (last_cache_hit).
+    """
+
+    SOLVERS = ("trf", "lm")
+
+    def __init__(self, solver: str = "trf", cache=None) -> None:
+        if solver not in self.SOLVERS:
+            raise ValueError(f"Unknown solver {solver!r}; expected one of {self.SOLVERS}")
+        self.solver = solver
+        self.cache = cache
+        self.last_cache_hit = False
+
     @staticmethod
     def pseudo_voigt(x, center, amplitude, fwhm, frac):
         """
@@ -64,24 +106,51 @@ class VoigtFitter:
         JIT‑accelerated least‑squares Voigt fit.
         Returns (popt, pcov) like curve_fit did.
         """
-        # -------- initial guesses (same as before) --------
-        p0 = [
-            float(x[np.nanargmax(y)]),  # center
-            float(np.nanmax(y)),  # amplitude
-            float((x.max() - x.min()) / 10),  # fwhm
-            0.5  # fraction
-        ]
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+
+        key = None
+        self.last_cache_hit = False
+        if self.cache is not None and x.size:
+            key = self.cache.key(x, y, x[0], x[-1], ("voigt", self.solver))
+            hit = self.cache.get(key)
+            if hit is not None:
+                self.last_cache_hit = True
+                return hit
+
+        popt, pcov = self._fit(x, y)
+        if key is not None:
+            self.cache.put(key, popt, pcov)
+        return popt, pcov
+
+    def _fit(self, x, y):
+        # NaN pixels (e.g. from the irradiance division) carry no information
+        finite = np.isfinite(x) & np.isfinite(y)
+        if not finite.all():
+            x, y = x[finite], y[finite]
+
+        # -------- initial guesses (single-pass pre-estimate) --------
+        # the model has no baseline term, so widths are measured from zero
+        p0 = list(estimate_peak_nb(x, y, 0.0))
 
         lower = [-np.inf, 0, 0, 0]
         upper = [np.inf, np.inf, np.inf, 1]
 
+        if self.solver == "lm":
+            popt, pcov, _, _ = _lm_fit_nb(
+                np.array(p0), np.array(lower, dtype=float), np.array(upper, dtype=float),
+                x, y,
+                2000, 1e-8, 1e-8
+            )
+            return popt, pcov
+
         # -------- least‑squares with analytic Jacobian ----
+        problem = FusedResidual(_residual_jac_nb, x, y, len(p0))
         res = least_squares(
-            _residual_nb,
+            problem.fun,
             p0,
-            jac=_jac_nb,
+            jac=problem.jac,
             bounds=(lower, upper),
-            args=(x, y),
             method='trf',
             xtol=1e-8,
             ftol=1e-8,
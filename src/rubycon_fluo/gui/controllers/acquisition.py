@@ -1,17 +1,489 @@
 from __future__ import annotations
 
+import logging
 import threading
 import time
+from collections import deque
 
 import numpy as np
 from PySide6.QtCore import QObject, Signal, Slot
 
+from rubycon_fluo.processing.spikes import despike
+
+logger = logging.getLogger(__name__)
+
+_TICK_S = 0.10      # progress refresh while an exposure is running
+FAST_PATH_US = 20_000   # default: below this exposure progress is not polled
+_UI_PERIOD_S = 0.05     # fast path: at most 20 progress updates per second
+_FPS_PERIOD_S = 1.0     # averaging interval of the frame_rate report
+_MAD_TO_SIGMA = 1.4826
+_DRIFT_REL = 0.03       # scan-to-scan source drift tolerated by sigma clipping
+
+
+class ReadTicket:
+    """
+    One client's stream of scans from a SpectrumReader.
+
+    The reader fills the ticket's ring of preallocated buffers; the
+    consumer takes frames with wait_frame() and hands each slot back with
+    release().  When the ring is full the reader moves on to other
+    tickets (or waits), so frames are never overwritten before they were
+    read.  n_scans=None streams until cancel().  The integration time can
+    be changed while streaming; every slot records the one it was read
+    with (frame_int_us()).
+    """
+
+    def __init__(self, reader: "SpectrumReader", n_scans: int | None,
+                 int_time_us: int, scans_to_avg: int, kwargs: dict) -> None:
+        self._reader = reader
+        self.remaining = n_scans
+        self.settings = (int(int_time_us), int(scans_to_avg))
+        self.kwargs = kwargs
+        self.ring: np.ndarray | None = None
+        self.slot_us = [0] * reader._ring_size     # integration time per slot
+        self.head = 0               # frames written by the reader
+        self.tail = 0               # frames released by the consumer
+        self.cancelled = False
+        self.error: BaseException | None = None
+        self.wavelengths: np.ndarray | None = None
+        self.exposure_started: float | None = None   # perf_counter() of the read in flight
+
+    @property
+    def done(self) -> bool:
+        """No more frames will arrive (all read, cancelled or failed)."""
+        return self.cancelled or self.error is not None or self.remaining == 0
+
+    def wait_frame(self, timeout: float) -> np.ndarray | None:
+        """
+        Next unread frame (a view into the ring, valid until release()),
+        or None if nothing arrived within `timeout` seconds or the ticket
+        is done.
+        """
+        with self._reader._cond:
+            if self.head == self.tail and not self.done:
+                self._reader._cond.wait(timeout)
+            if self.head == self.tail or self.cancelled:
+                return None
+            return self.ring[self.tail % self.ring.shape[0]]
+
+    def frame_int_us(self) -> int:
+        """Integration time (µs) of the frame returned by wait_frame()."""
+        with self._reader._cond:
+            return self.slot_us[self.tail % len(self.slot_us)]
+
+    def set_integration_time_us(self, int_time_us: int) -> None:
+        """Use a new integration time from the next read on."""
+        with self._reader._cond:
+            self.settings = (int(int_time_us), self.settings[1])
+
+    def release(self) -> None:
+        """Give the slot returned by wait_frame() back to the reader."""
+        with self._reader._cond:
+            self.tail += 1
+            self._reader._cond.notify_all()
+
+    def cancel(self) -> None:
+        """Stop reading for this ticket; the read in flight is discarded."""
+        with self._reader._cond:
+            self.cancelled = True
+            self._reader._cond.notify_all()
+
+    def close(self) -> None:
+        """Cancel and hand the ring back to the reader's pool."""
+        with self._reader._cond:
+            self.cancelled = True
+            self._reader._retire(self)
+            self._reader._cond.notify_all()
+
+
+class SpectrumReader:
+    """
+    Persistent reader thread for one spectrometer.
+
+    All blocking intensities() reads for the device run on this single
+    thread, back to back, instead of on a new thread per scan.  Clients
+    open a ReadTicket; with several tickets open (e.g. a background
+    collection during continuous acquisition) the reader alternates
+    between them.  Each ticket's integration time and scans-to-average
+    are applied before every read; SpectrometerController drops the
+    commands that would not change anything.  Ring buffers are pooled and
+    reused, so steady-state acquisition does not allocate per scan on
+    this side.
+    """
+
+    def __init__(self, spec, ring_size: int = 4) -> None:
+        self._spec = spec
+        self._ring_size = max(2, int(ring_size))
+        self._cond = threading.Condition()
+        self._tickets: deque[ReadTicket] = deque()
+        self._pool: list[np.ndarray] = []
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="spectrum-reader",
+                                        daemon=True)
+        self._thread.start()
+
+    def open(self, n_scans: int | None, int_time_us: int, scans_to_avg: int,
+             **kwargs) -> ReadTicket:
+        """Start streaming `n_scans` frames (None = until cancelled)."""
+        ticket = ReadTicket(self, n_scans, int_time_us, scans_to_avg, kwargs)
+        with self._cond:
+            if self._closed:
+                ticket.cancelled = True
+            else:
+                self._tickets.append(ticket)
+                self._cond.notify_all()
+        return ticket
+
+    def close(self, timeout: float | None = None) -> None:
+        """Cancel all tickets and stop the thread (waits for a read in flight)."""
+        with self._cond:
+            self._closed = True
+            for t in self._tickets:
+                t.cancelled = True
+            self._tickets.clear()
+            self._cond.notify_all()
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout)
+
+    # ---- reader thread ---------------------------------------------------
+    def _retire(self, ticket: ReadTicket) -> None:
+        # called with the lock held
+        if ticket in self._tickets:
+            self._tickets.remove(ticket)
+        if ticket.ring is not None:
+            self._pool.append(ticket.ring)
+            ticket.ring = None
+
+    def _next_ticket(self) -> ReadTicket | None:
+        # round-robin over tickets that want a frame and have a free slot
+        for _ in range(len(self._tickets)):
+            t = self._tickets[0]
+            self._tickets.rotate(-1)
+            if t.done:
+                continue
+            if t.head - t.tail < self._ring_size:
+                return t
+        return None
+
+    def _ring(self, n: int) -> np.ndarray:
+        for k, ring in enumerate(self._pool):
+            if ring.shape[1] == n:
+                return self._pool.pop(k)
+        return np.empty((self._ring_size, n), dtype=float)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        return
+                    ticket = self._next_ticket()
+                    if ticket is not None:
+                        break
+                    self._cond.wait()
+                int_us, scans = ticket.settings
+
+            try:
+                self._spec.set_integration_time_us(int_us)
+                self._spec.set_scans_to_average(scans)
+                ticket.exposure_started = time.perf_counter()
+                counts = self._spec.intensities(**ticket.kwargs)
+                wl = self._spec.wavelengths     # cached, shared axis
+            except Exception as exc:            # surfaced to the consumer
+                with self._cond:
+                    ticket.exposure_started = None
+                    ticket.error = exc
+                    self._cond.notify_all()
+                continue
+
+            with self._cond:
+                ticket.exposure_started = None
+                if ticket.cancelled:            # stopped while reading: drop it
+                    self._cond.notify_all()
+                    continue
+                if ticket.ring is None or ticket.ring.shape[1] != counts.size:
+                    ticket.ring = self._ring(counts.size)
+                ticket.ring[ticket.head % self._ring_size] = counts
+                ticket.slot_us[ticket.head % self._ring_size] = int_us
+                ticket.wavelengths = wl
+                ticket.head += 1
+                if ticket.remaining is not None:
+                    ticket.remaining -= 1
+                self._cond.notify_all()
+
+
+class ScanAccumulator:
+    """
+    Running per-pixel mean and variance over scans (Welford), updated in
+    place in buffers allocated once per pixel count, so adding a scan does
+    not allocate.  mean / variance_of_mean() return new arrays.
+    """
+
+    def __init__(self) -> None:
+        self.n = 0
+        self._mean: np.ndarray | None = None
+        self._m2: np.ndarray | None = None
+        self._d1: np.ndarray | None = None
+        self._d2: np.ndarray | None = None
+
+    def reset(self) -> None:
+        self.n = 0
+
+    def add(self, frame: np.ndarray) -> None:
+        if self._mean is None or self._mean.shape != frame.shape:
+            self._mean, self._m2, self._d1, self._d2 = (
+                np.empty(frame.shape) for _ in range(4)
+            )
+            self.n = 0
+        self.n += 1
+        if self.n == 1:
+            self._mean[:] = frame
+            self._m2.fill(0.0)
+            return
+        np.subtract(frame, self._mean, out=self._d1)        # x − mean_old
+        np.multiply(self._d1, 1.0 / self.n, out=self._d2)
+        self._mean += self._d2                              # mean_new
+        np.subtract(frame, self._mean, out=self._d2)        # x − mean_new
+        self._d1 *= self._d2
+        self._m2 += self._d1
+
+    @property
+    def mean(self) -> np.ndarray:
+        return self._mean.copy()
+
+    def variance_of_mean(self) -> np.ndarray | None:
+        """Per-pixel variance of the averaged spectrum (s² / n); None for n < 2."""
+        if self.n < 2:
+            return None
+        return self._m2 * (1.0 / ((self.n - 1) * self.n))
+
+
+class RollingAccumulator:
+    """
+    Mean and variance over the last `window` scans (sliding window).  Keeps
+    the frames in a preallocated ring plus running sums of x and x², so an
+    update is O(pixels) whatever the window.  Same interface as
+    ScanAccumulator.
+    """
+
+    def __init__(self, window: int) -> None:
+        self.window = max(1, int(window))
+        self.n = 0                   # frames currently in the window
+        self._k = 0                  # frames seen since reset (ring index)
+        self._ring: np.ndarray | None = None
+        self._sum: np.ndarray | None = None
+        self._sumsq: np.ndarray | None = None
+        self._tmp: np.ndarray | None = None
+
+    def reset(self) -> None:
+        self.n = 0
+        self._k = 0
+        if self._sum is not None:
+            self._sum.fill(0.0)
+            self._sumsq.fill(0.0)
+
+    def add(self, frame: np.ndarray) -> None:
+        if self._ring is None or self._ring.shape[1:] != frame.shape:
+            self._ring = np.empty((self.window,) + frame.shape)
+            self._sum, self._sumsq, self._tmp = (np.zeros(frame.shape) for _ in range(3))
+            self.n = self._k = 0
+        slot = self._ring[self._k % self.window]
+        if self.n == self.window:                   # drop the oldest frame
+            self._sum -= slot
+            np.multiply(slot, slot, out=self._tmp)
+            self._sumsq -= self._tmp
+        else:
+            self.n += 1
+        slot[:] = frame
+        self._sum += slot
+        np.multiply(slot, slot, out=self._tmp)
+        self._sumsq += self._tmp
+        self._k += 1
+
+    @property
+    def mean(self) -> np.ndarray:
+        return self._sum * (1.0 / self.n)
+
+    def variance_of_mean(self) -> np.ndarray | None:
+        if self.n < 2:
+            return None
+        var = (self._sumsq - self._sum * self._sum * (1.0 / self.n)) * (1.0 / (self.n - 1))
+        np.maximum(var, 0.0, out=var)               # round-off in the subtraction
+        var *= 1.0 / self.n
+        return var
+
+
+class EmaAccumulator:
+    """
+    Exponentially weighted mean and variance with α = 2 / (window + 1), so
+    the noise matches a block average of about `window` scans.  O(pixels)
+    in place per scan; same interface as ScanAccumulator.
+    """
+
+    def __init__(self, window: int) -> None:
+        self.window = max(1, int(window))
+        self.alpha = 2.0 / (self.window + 1)
+        self.n = 0
+        self._mean: np.ndarray | None = None
+        self._var: np.ndarray | None = None
+        self._d: np.ndarray | None = None
+        self._incr: np.ndarray | None = None
+
+    def reset(self) -> None:
+        self.n = 0
+
+    def add(self, frame: np.ndarray) -> None:
+        if self._mean is None or self._mean.shape != frame.shape:
+            self._mean, self._var, self._d, self._incr = (
+                np.empty(frame.shape) for _ in range(4)
+            )
+            self.n = 0
+        self.n += 1
+        if self.n == 1:
+            self._mean[:] = frame
+            self._var.fill(0.0)
+            return
+        # start as a plain running mean until the EMA weight takes over
+        a = max(self.alpha, 1.0 / self.n)
+        np.subtract(frame, self._mean, out=self._d)
+        np.multiply(self._d, a, out=self._incr)
+        self._mean += self._incr
+        self._d *= self._incr
+        self._var += self._d
+        self._var *= 1.0 - a
+
+    @property
+    def mean(self) -> np.ndarray:
+        return self._mean.copy()
+
+    def variance_of_mean(self) -> np.ndarray | None:
+        """Single-scan variance scaled by the EMA's effective number of scans."""
+        if self.n < 2:
+            return None
+        n_eff = min(self.n, (2.0 - self.alpha) / self.alpha)
+        return self._var * (1.0 / n_eff)
+
+
+class RobustAccumulator:
+    """
+    Block average that rejects cosmic-ray hits: the scans are kept in a
+    preallocated (capacity × pixels) buffer and combined per pixel when
+    the result is read (cached until the next add).
+
+    "sigma_clip" averages the values within kappa·σ of the per-pixel
+    (lower) median; "median" returns the median.  σ is the largest of the
+    pixel's own MAD, the frame-wide scan-to-scan noise, the shot noise of
+    the signal above the baseline and a small fraction of it (source
+    drift), so with only two scans the lower one is kept where the other
+    carries a spike.  Same interface as ScanAccumulator; `rejected`
+    counts the values left out of the last result.
+    """
+
+    def __init__(self, capacity: int, method: str = "sigma_clip", kappa: float = 4.0) -> None:
+        if method not in REJECTION_MODES[1:]:
+            raise ValueError(f"method must be one of {REJECTION_MODES[1:]}")
+        self.capacity = max(1, int(capacity))
+        self.method = method
+        self.kappa = float(kappa)
+        self.n = 0
+        self._k = 0                  # scans added since reset (ring index)
+        self.rejected = 0
+        self._buf: np.ndarray | None = None
+        self._work: np.ndarray | None = None
+        self._keep: np.ndarray | None = None
+        self._result: tuple | None = None
+
+    def reset(self) -> None:
+        self.n = self._k = 0
+        self._result = None
+
+    def add(self, frame: np.ndarray) -> None:
+        if self._buf is None or self._buf.shape[1:] != frame.shape:
+            self._buf = np.empty((self.capacity,) + frame.shape)
+            self._work = np.empty_like(self._buf)
+            self._keep = np.empty(self._buf.shape, dtype=bool)
+            self.n = self._k = 0
+        # beyond capacity the oldest scan is overwritten
+        self._buf[self._k % self.capacity] = frame
+        self._k += 1
+        self.n = min(self._k, self.capacity)
+        self._result = None
+
+    def _combine(self) -> tuple:
+        if self._result is not None:
+            return self._result
+        n = self.n
+        x = self._buf[:n]
+        if n == 1:
+            self.rejected = 0
+            self._result = (x[0].copy(), None)
+            return self._result
+        work = self._work[:n]
+        keep = self._keep[:n]
+        k = (n - 1) // 2
+        work[:] = x
+        work.sort(axis=0)                   # faster than partition for so few rows
+        center = work[k].copy()
+        upper = work[n // 2].copy()
+
+        # per-pixel scale: own MAD, floored as described above
+        np.subtract(x, center, out=work)
+        np.abs(work, out=work)
+        work.sort(axis=0)
+        sigma = work[k] * _MAD_TO_SIGMA
+        noise = _MAD_TO_SIGMA / np.sqrt(2.0) * float(np.median(np.abs(x[1] - x[0])))
+        np.maximum(sigma, noise, out=sigma)
+        signal = center - float(np.median(center))
+        np.maximum(signal, 0.0, out=signal)
+        np.maximum(sigma, np.sqrt(signal), out=sigma)
+        np.maximum(sigma, _DRIFT_REL * signal, out=sigma)
+        if n == 2:
+            sigma *= np.sqrt(2.0)           # deviation from the other scan
+
+        np.subtract(x, center, out=work)
+        np.abs(work, out=work)
+        np.less_equal(work, self.kappa * sigma, out=keep)
+        cnt = keep.sum(axis=0)
+        self.rejected = int(keep.size - cnt.sum())
+        total = np.add.reduce(x, axis=0, where=keep, initial=0.0)
+        np.multiply(x, x, out=work)
+        total_sq = np.add.reduce(work, axis=0, where=keep, initial=0.0)
+        mean = total / cnt
+        # spread of the kept values; σ where only one is left
+        var = np.where(cnt > 1,
+                       (total_sq - total * mean) / np.maximum(cnt - 1, 1),
+                       sigma * sigma)
+        np.maximum(var, 0.0, out=var)
+        if self.method == "median":
+            # even n: the upper middle value only if it is not rejected itself
+            upper -= center
+            upper[upper > self.kappa * sigma] = 0.0
+            self._result = (center + 0.5 * upper, var * (0.5 * np.pi / n))
+        else:
+            self._result = (mean, var / cnt)
+        return self._result
+
+    @property
+    def mean(self) -> np.ndarray:
+        return self._combine()[0].copy()
+
+    def variance_of_mean(self) -> np.ndarray | None:
+        return self._combine()[1]
+
+
+AVERAGING_MODES = ("block", "rolling", "ema")
+REJECTION_MODES = ("none", "sigma_clip", "median")
+
 
 class AcquisitionWorker(QObject):
     spectrum_ready = Signal(np.ndarray, np.ndarray)        # wl, intensity
+    block_int_us = Signal(int)                             # exposure of the next spectrum_ready
+    spectrum_variance = Signal(object)                     # var. of the next spectrum_ready, or None
     integration_tick = Signal(float)                       # 0‑100 %
     scan_tick = Signal(int, int)                           # done, total
     remaining_time = Signal(float)                         # seconds left
+    frame_rate = Signal(float)                             # scans read per second
+    failed = Signal(str)                                   # a device read raised (message)
     finished = Signal()                                    # done
 
     def __init__(
@@ -22,6 +494,10 @@ class AcquisitionWorker(QObject):
         continuous: bool,
         dark_counts: bool,
         correct_nonlinearity: bool,
+        reader: SpectrumReader | None = None,
+        averaging: str = "block",
+        fast_threshold_us: int = FAST_PATH_US,
+        rejection: str = "none",
     ):
         super().__init__()
         self._spec = spec
@@ -32,78 +508,147 @@ class AcquisitionWorker(QObject):
         self._stop_flag = False
         self._dark_counts = dark_counts
         self._correct_nonlinearity = correct_nonlinearity
+        # shared per-device reader; a private one is made (and closed) if None
+        self._reader = reader
+        self._ticket: ReadTicket | None = None
+        # continuous only: "rolling"/"ema" emit a fresh average after every scan
+        if averaging not in AVERAGING_MODES:
+            raise ValueError(f"averaging must be one of {AVERAGING_MODES}")
+        self._averaging = averaging
+        # shorter exposures: no per-tick progress, UI updates throttled
+        self._fast_us = int(fast_threshold_us)
+        # cosmic-ray rejection: robust block average, or per-scan despike
+        if rejection not in REJECTION_MODES:
+            raise ValueError(f"rejection must be one of {REJECTION_MODES}")
+        self._rejection = rejection
 
     # ------------------------------------------------------------------#
     # public control slot                                                #
     # ------------------------------------------------------------------
     @Slot()
-    def start(self) -> None:                       # ← rewritten
+    def start(self) -> None:
         total_scans      = self._scans_total
-        single_scan_sec  = self._int_us / 1_000_000
+        # rolling/EMA: read single scans and emit after each one
+        streaming = (self._continuous and total_scans > 1
+                     and self._averaging != "block")
+        robust = (self._rejection != "none" and not streaming and total_scans > 1)
+        # on-device averaging: one read returns the mean of all scans
+        # (not with rejection, which needs the individual scans)
+        hw_avg = (not streaming and total_scans > 1 and not robust
+                  and getattr(self._spec, "hardware_averaging", False))
+        # single scans with no robust average: filter spikes frame by frame
+        despike_frames = self._rejection != "none" and not robust
+        reads = 1 if hw_avg or streaming else total_scans
+        scans_per_read = 1 if streaming else total_scans // reads
+
+        self.integration_tick.emit(0)  # integration bar → 0 %
+        self.scan_tick.emit(0, total_scans)  # scans bar       → 0 %
+
+        own_reader = self._reader is None
+        reader = SpectrumReader(self._spec) if own_reader else self._reader
+        # continuous mode streams without a gap between averaging blocks
+        ticket = reader.open(
+            None if self._continuous else reads,
+            self._int_us,
+            1 if streaming or robust else total_scans,
+            correct_dark_counts=self._dark_counts,
+            correct_nonlinearity=self._correct_nonlinearity,
+        )
+        self._ticket = ticket
+        if self._stop_flag:
+            ticket.cancel()
 
-        self.integration_tick.emit(0)  # integration bar → 0 %
-        self.scan_tick.emit(0, total_scans)  # scans bar       → 0 %
+        if robust:
+            acc = RobustAccumulator(total_scans, self._rejection)
+        elif not streaming:
+            acc = ScanAccumulator()
+        elif self._averaging == "rolling":
+            acc = RollingAccumulator(total_scans)
+        else:
+            acc = EmaAccumulator(total_scans)
+        ui_due = 0.0                                  # fast path: next progress update
+        fps_t0, fps_scans = time.perf_counter(), 0
+        try:
+            while not self._stop_flag:
+                n = 0
+                block_us = self._int_us
+                fast = self._int_us < self._fast_us
+                while n < reads and not self._stop_flag:
+                    single_scan_sec = self._int_us / 1_000_000
+                    fast = self._int_us < self._fast_us
+                    frame = ticket.wait_frame(_TICK_S)
+                    if frame is None:
+                        if ticket.done:
+                            break
+                        if fast:
+                            continue        # the frame is due within milliseconds
+                        # progress from the reader's exposure timestamp
+                        t0 = ticket.exposure_started
+                        elapsed = time.perf_counter() - t0 if t0 is not None else 0.0
+                        in_read = max(0, min(scans_per_read - 1, int(elapsed / single_scan_sec)))
+                        in_scan = elapsed - in_read * single_scan_sec
+                        self.integration_tick.emit(min(99, int(in_scan /
+                                                                 single_scan_sec * 100)))
+                        if hw_avg:
+                            self.scan_tick.emit(in_read, total_scans)
+                        self.remaining_time.emit(
+                            round(max(0.0,
+                                      (reads - n) * scans_per_read * single_scan_sec
+                                      - elapsed), 1)
+                        )
+                        continue
 
-        while not self._stop_flag:
-            self._spec.set_integration_time_us(self._int_us)
-            self._spec.set_scans_to_average(total_scans)
+                    frame_us = ticket.frame_int_us()
+                    if frame_us != block_us:
+                        # integration time changed: never mix exposures in one average
+                        block_us, n = frame_us, 0
+                        acc.reset()
+                    if n == 0 and not streaming:
+                        acc.reset()
+                    if despike_frames:
+                        despike(frame)          # in place, the slot is ours until release
+                    acc.add(frame)
+                    ticket.release()
+                    n += 1
 
-            wl_accum: np.ndarray | None = None
-            acc:      np.ndarray | None = None
+                    now = time.perf_counter()
+                    fps_scans += scans_per_read
+                    if now - fps_t0 >= _FPS_PERIOD_S:
+                        self.frame_rate.emit(fps_scans / (now - fps_t0))
+                        fps_t0, fps_scans = now, 0
+                    if fast and now < ui_due:
+                        continue            # keep the GUI queue short
+                    ui_due = now + _UI_PERIOD_S
 
-            for n in range(total_scans):
-                if self._stop_flag:
+                    self.integration_tick.emit(100)          # exposure done
+                    self.remaining_time.emit(0.0)
+                    # update scan bar (20 %, 40 %, …); streaming: window fill
+                    done = min(acc.n, total_scans) if streaming else n * scans_per_read
+                    self.scan_tick.emit(done, total_scans)
+
+                if not streaming and not fast:
+                    self.scan_tick.emit(total_scans, total_scans)
+                if self._stop_flag or n < reads:
                     break
 
-                # ---------------------------------------------------------
-                # 1. kick off the blocking spectrum read in a helper thread
-                # ---------------------------------------------------------
-                buf: dict[str, np.ndarray] = {}
-
-                def _capture():
-                    buf["wl"], buf["cnt"] = self._spec.spectrum_raw(
-                        correct_dark_counts=self._dark_counts,
-                        correct_nonlinearity=self._correct_nonlinearity,
-                    )
-
-                t = threading.Thread(target=_capture, daemon=True)
-                t.start()
-
-                # ---------------------------------------------------------
-                # 2. while that thread runs, emit progress every 0.1 s
-                # ---------------------------------------------------------
-                start = time.perf_counter()
-                while t.is_alive() and not self._stop_flag:
-                    elapsed = time.perf_counter() - start
-                    self.integration_tick.emit(min(99, int(elapsed /
-                                                             single_scan_sec * 100)))
-                    self.remaining_time.emit(
-                        round(max(0.0,
-                                  (total_scans - n - 1) * single_scan_sec
-                                  + single_scan_sec - elapsed), 1)
-                    )
-                    time.sleep(0.10)      # ≈100 ms refresh
-
-                t.join()                  # make sure we actually have data
-                self.integration_tick.emit(100)          # exposure done
-                self.remaining_time.emit(0.0)
-
-                wl, counts = buf["wl"], buf["cnt"]
-                wl_accum = wl if wl_accum is None else wl_accum
-                acc      = counts.astype(float) if acc is None else acc + counts
-
-                # update scan bar (20 %, 40 %, …)
-                self.scan_tick.emit(n + 1, total_scans)
-
-            self.scan_tick.emit(total_scans, total_scans)
-            if self._stop_flag or acc is None:
-                break
-
-            acc /= total_scans
-            self.spectrum_ready.emit(wl_accum, acc)      # averaged spectrum
-
-            if not self._continuous:                     # single‑shot mode
-                break
+                self.block_int_us.emit(block_us)
+                self.spectrum_variance.emit(acc.variance_of_mean())
+                self.spectrum_ready.emit(ticket.wavelengths,
+                                         acc.mean)             # averaged spectrum
+
+                if not self._continuous:                     # single‑shot mode
+                    break
+        finally:
+            ticket.close()
+            if own_reader:
+                reader.close()
+        if ticket.error is not None and not self._stop_flag:
+            exc = ticket.error
+            logger.error("spectrum read failed: %s", exc, exc_info=exc)
+            self.failed.emit(str(exc) or type(exc).__name__)
+        elapsed = time.perf_counter() - fps_t0
+        if fps_scans and elapsed > 0:
+            self.frame_rate.emit(fps_scans / elapsed)
 
         self.integration_tick.emit(100)
         self.scan_tick.emit(total_scans, total_scans)
@@ -112,6 +657,14 @@ class AcquisitionWorker(QObject):
     # ------------------------------------------------------------------#
     # public API                                                         #
     # ------------------------------------------------------------------
+    def set_integration_time_us(self, int_time_us: int) -> None:
+        """Change the integration time of a running (continuous) acquisition."""
+        self._int_us = int(int_time_us)
+        if self._ticket is not None:
+            self._ticket.set_integration_time_us(self._int_us)
+
     def stop(self) -> None:
         self._stop_flag = True
+        if self._ticket is not None:
+            self._ticket.cancel()
         self.scan_tick.emit(self._scans_total, self._scans_total)
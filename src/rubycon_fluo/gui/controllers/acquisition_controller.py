@@ -1,13 +1,68 @@
 from __future__ import annotations
 
+import logging
 from typing import Optional, Tuple
 
 import numpy as np
 from PySide6.QtCore import QObject, Signal, Slot, QThread
 from PySide6.QtWidgets import QDialog
 
-from rubycon_fluo.gui.controllers.acquisition import AcquisitionWorker
+from rubycon_fluo.gui.controllers.acquisition import (
+    AVERAGING_MODES,
+    FAST_PATH_US,
+    REJECTION_MODES,
+    AcquisitionWorker,
+    SpectrumReader,
+)
 from rubycon_fluo.gui.dialogs.optimize_integration import OptimizeDialog
+from rubycon_fluo.processing.pipeline import SpectrumPipeline
+from rubycon_fluo.processing.spikes import peak_counts
+
+logger = logging.getLogger(__name__)
+
+
+class AutoExposure:
+    """
+    Between-frame integration-time controller for continuous acquisition.
+
+    Keeps the peak in the fitting window between `low` and `high` × full
+    scale (hysteresis: inside the band nothing changes) and, when it
+    leaves the band, rescales the integration time towards `target`
+    assuming counts ∝ exposure above the dark level.  One step changes the
+    time by at most `max_step` (either way); a clipped peak always steps
+    down by the full factor, as its true height is unknown.
+    """
+
+    def __init__(self,
+                 target: float = 0.6,
+                 low: float = 0.35,
+                 high: float = 0.85,
+                 max_step: float = 2.0,
+                 saturated: float = 0.98) -> None:
+        self.target = target
+        self.low = low
+        self.high = high
+        self.max_step = max_step
+        self.saturated = saturated
+
+    def next_time_us(self, t_us: int, counts: np.ndarray, full_scale: float,
+                     limits: Tuple[int, int], window: slice = slice(None)) -> int:
+        """Integration time for the next frame given the frame just taken at t_us."""
+        seg = counts[window]
+        if seg.size == 0:
+            return t_us
+        peak = peak_counts(seg) / full_scale
+        if self.low <= peak <= self.high:
+            return t_us
+        if peak >= self.saturated:
+            ratio = 1.0 / self.max_step
+        else:
+            dark = float(np.median(counts)) / full_scale    # most pixels are baseline
+            signal = peak - dark
+            ratio = (self.target - dark) / signal if signal > 0 else self.max_step
+            ratio = min(max(ratio, 1.0 / self.max_step), self.max_step)
+        mn, mx = limits
+        return int(min(max(round(t_us * ratio), mn), mx))
 
 
 class AcquisitionController(QObject):
@@ -23,7 +78,12 @@ class AcquisitionController(QObject):
     integration_tick: Signal = Signal(float)           # percent 0–100
     scan_tick: Signal = Signal(int, int)               # scans done, total scans
     remaining_time: Signal = Signal(float)             # seconds left
+    frame_rate: Signal = Signal(float)                 # achieved scans per second
     finished: Signal = Signal()                        # acquisition complete
+    failed: Signal = Signal(str)                       # a device read failed (message)
+    integration_time_changed: Signal = Signal(int)     # µs, set by auto-exposure
+    spectrum_variance: Signal = Signal(object)         # per-pixel variance of the next
+                                                       # spectrum_ready, None if unknown
 
     background_ready: Signal = Signal(np.ndarray, np.ndarray)
     background_finished: Signal = Signal()
@@ -41,10 +101,14 @@ class AcquisitionController(QObject):
         self._scans_to_avg: int = 1
         self._dark_counts: bool = False
         self._correct_nonlinearity: bool = False
+        self._averaging: str = "block"      # continuous mode, see set_averaging_mode
+        self._fast_threshold_us: int = FAST_PATH_US
+        self._rejection: str = "none"       # cosmic rays, see set_rejection
 
         # Internal storage for last results
         self._last_spectrum: Optional[Tuple[np.ndarray, np.ndarray]] = None
         self._last_background: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._last_variance: Optional[np.ndarray] = None
 
         # Threads and workers for main and background acquisition
         self._thread: Optional[QThread] = None
@@ -52,6 +116,40 @@ class AcquisitionController(QObject):
         self._bg_thread: Optional[QThread] = None
         self._bg_worker: Optional[AcquisitionWorker] = None
 
+        # one persistent reader thread per device, shared by both workers
+        self._reader: Optional[SpectrumReader] = None
+
+        # closed-loop exposure in continuous mode (off by default)
+        self._auto_exposure: Optional[AutoExposure] = None
+        self._ae_window_nm: Optional[Tuple[float, float]] = None
+        self._continuous = False
+        self._frame_int_us: Optional[int] = None     # exposure of the spectrum being handled
+        self._ae_requested_us: Optional[int] = None  # last change made by auto-exposure
+
+    def _device_reader(self) -> SpectrumReader:
+        """The reader thread for the current device, started on first use."""
+        if self._reader is None:
+            self._reader = SpectrumReader(self._spec_ctrl)
+        return self._reader
+
+    def shutdown(self) -> None:
+        """Stop any acquisition and the device reader thread."""
+        self.stop()
+        if self._bg_worker:
+            self._bg_worker.stop()
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        self._log_command_stats()
+
+    def _log_command_stats(self) -> None:
+        stats = getattr(self._spec_ctrl, "command_stats", None)
+        if stats is not None:
+            s = stats()
+            logger.info("%s: %d setting commands sent, %d suppressed as unchanged",
+                        getattr(self._spec_ctrl, "device_id", "device"),
+                        s["sent"], s["suppressed"])
+
     def clear_background(self) -> None:
         """
         Forget the most‑recent background so that spectra are displayed
@@ -63,11 +161,7 @@ class AcquisitionController(QObject):
             self,
             *,
             flags: dict,
-            boxcar_width: int,
-            bin_size: int,
-            odark_ranges,
-            sl_coef,
-            irrad_coef,
+            pipeline: Optional[SpectrumPipeline] = None,
             parent=None,
     ) -> int | None:
         """
@@ -77,16 +171,12 @@ class AcquisitionController(QObject):
 
         Parameters
         ----------
-        flags           dict of booleans with keys:
-                            electric_dark, optical_dark, stray_light,
-                            non_linearity, irradiance, boxcar, pixel_binning
-        boxcar_width    current integer boxcar width
-        bin_size        current pixel‑binning factor
-        odark_ranges    list[(lo, hi)]   optical‑dark pixel ranges
-        sl_coef         ndarray          stray‑light coefficients
-        irrad_coef      ndarray          irradiance calibration array
+        flags           dict of booleans; electric_dark and non_linearity
+                        select the backend corrections
+        pipeline        SpectrumPipeline the GUI applies to spectra (the
+                        stored background is subtracted as well), used to
+                        locate the peak; None = raw counts
         parent          QWidget or None  (dialog owner)
-        :param bin_size:
         """
         backend_kwargs = {
             "correct_dark_counts": flags.get("electric_dark", False),
@@ -94,26 +184,12 @@ class AcquisitionController(QObject):
         }
 
         # Pull any stored background from the manager
-        bg_wl, bg_cnt = (None, None)
+        bg_cnt = None
         if self.last_background is not None:
-            bg_wl, bg_cnt = self.last_background
-
-        pipeline = {
-            "optical_dark": flags.get("optical_dark", False),
-            "stray_light": flags.get("stray_light", False),
-            "irradiance": flags.get("irradiance", False),
-            "boxcar": flags.get("boxcar", False),
-            "boxcar_width": boxcar_width,
-            "pixel_binning": flags.get("pixel_binning", False),
-            "bin_size": bin_size,
-            "odark_ranges": odark_ranges,
-            "sl_coef": sl_coef,
-            "irrad_coef": irrad_coef,
-            "background_wl": bg_wl,
-            "background_counts": bg_cnt,
-        }
+            bg_cnt = self.last_background[1]
 
-        dlg = OptimizeDialog(self._spec_ctrl, backend_kwargs, pipeline, parent=parent)
+        dlg = OptimizeDialog(self._spec_ctrl, backend_kwargs, pipeline,
+                             background=bg_cnt, parent=parent)
         if dlg.exec() == QDialog.DialogCode.Accepted:
             return dlg.optimal_ms()
         return None
@@ -141,9 +217,107 @@ class AcquisitionController(QObject):
             self._bg_thread.quit()
             self._bg_thread.wait()
 
+        # the reader thread belongs to the old device
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        self._log_command_stats()
+
         # finally swap the reference
         self._spec_ctrl = spec_ctrl
 
+    def set_averaging_mode(self, mode: str) -> None:
+        """
+        How continuous acquisition averages scans_to_avg scans:
+        "block" – one spectrum per scans_to_avg fresh scans (default);
+        "rolling" – sliding window over the last scans_to_avg scans;
+        "ema" – exponential moving average of similar noise.
+        The latter two emit after every scan.  Applies from the next start.
+        """
+        if mode not in AVERAGING_MODES:
+            raise ValueError(f"averaging mode must be one of {AVERAGING_MODES}")
+        self._averaging = mode
+
+    @property
+    def averaging_mode(self) -> str:
+        return self._averaging
+
+    def set_fast_path_threshold_us(self, threshold_us: int) -> None:
+        """
+        Exposures shorter than this run on the fast path: no progress
+        polling while a scan is exposed and progress signals throttled to
+        a fixed UI rate (0 = never).  Applies from the next start.
+        """
+        self._fast_threshold_us = max(0, int(threshold_us))
+
+    @property
+    def fast_path_threshold_us(self) -> int:
+        return self._fast_threshold_us
+
+    def set_rejection(self, mode: str) -> None:
+        """
+        Cosmic-ray rejection for acquisitions and backgrounds:
+        "none" – plain mean (default);
+        "sigma_clip" – mean of the scans after clipping outliers per pixel;
+        "median" – per-pixel median of the scans.
+        Both turn off on-device averaging for scans_to_avg > 1; single
+        scans and rolling/EMA frames get a spike filter instead.
+        Applies from the next start.
+        """
+        if mode not in REJECTION_MODES:
+            raise ValueError(f"rejection must be one of {REJECTION_MODES}")
+        self._rejection = mode
+
+    @property
+    def rejection_mode(self) -> str:
+        return self._rejection
+
+    def set_auto_exposure(self, enabled: bool,
+                          controller: Optional[AutoExposure] = None) -> None:
+        """
+        Turn closed-loop auto-exposure on or off.  While on, every averaged
+        spectrum of a continuous acquisition may retune the integration time
+        for the following frames (see AutoExposure); changes are announced
+        through integration_time_changed.  It is paused while a background
+        is stored: that was taken at one exposure and would no longer
+        match the spectra it is subtracted from.
+        """
+        self._auto_exposure = (controller or AutoExposure()) if enabled else None
+
+    @property
+    def auto_exposure_enabled(self) -> bool:
+        return self._auto_exposure is not None
+
+    def set_auto_exposure_window(self, lo_nm: float, hi_nm: float) -> None:
+        """Wavelength window (normally the fitting range) whose peak is regulated."""
+        self._ae_window_nm = (min(lo_nm, hi_nm), max(lo_nm, hi_nm))
+
+    def _apply_auto_exposure(self, wl: np.ndarray, counts: np.ndarray) -> None:
+        if self._auto_exposure is None or not self._continuous or self._worker is None:
+            return
+        if self._last_background is not None:
+            return      # the background only matches the exposure it was taken at
+        frame_us = self._frame_int_us
+        if frame_us is None or (self._ae_requested_us is not None
+                                and frame_us != self._ae_requested_us):
+            return      # taken before the last change – its effect is not visible yet
+        window = slice(None)
+        if self._ae_window_nm is not None:
+            i0, i1 = np.searchsorted(wl, self._ae_window_nm)
+            window = slice(int(i0), int(i1))
+        new_us = self._auto_exposure.next_time_us(
+            frame_us,
+            counts,
+            getattr(self._spec_ctrl, "saturation_counts", 65535.0),
+            self._spec_ctrl.integration_limits_us,
+            window,
+        )
+        if new_us != frame_us:
+            self._ae_requested_us = new_us
+            self._int_time_us = new_us
+            self._worker.set_integration_time_us(new_us)
+            self.integration_time_changed.emit(new_us)
+
     def set_parameters(
         self,
         integration_time_us: int,
@@ -182,6 +356,9 @@ class AcquisitionController(QObject):
             self._thread.wait()
 
         # Create new worker + thread
+        self._continuous = continuous
+        self._ae_requested_us = None
+        self._frame_int_us = None
         self._thread = QThread(self)
         self._worker = AcquisitionWorker(
             spec=self._spec_ctrl,
@@ -190,6 +367,10 @@ class AcquisitionController(QObject):
             continuous=continuous,
             dark_counts=self._dark_counts,
             correct_nonlinearity=self._correct_nonlinearity,
+            reader=self._device_reader(),
+            averaging=self._averaging,
+            fast_threshold_us=self._fast_threshold_us,
+            rejection=self._rejection,
         )
         self._worker.moveToThread(self._thread)
 
@@ -198,7 +379,11 @@ class AcquisitionController(QObject):
         self._worker.integration_tick.connect(self.integration_tick)
         self._worker.scan_tick.connect(self.scan_tick)
         self._worker.remaining_time.connect(self.remaining_time)
+        self._worker.frame_rate.connect(self.frame_rate)
+        self._worker.block_int_us.connect(self._on_block_int_us)
+        self._worker.spectrum_variance.connect(self._on_spectrum_variance)
         self._worker.spectrum_ready.connect(self._handle_spectrum)
+        self._worker.failed.connect(self.failed)
         self._worker.finished.connect(self._on_finished)
 
         self._thread.start()
@@ -207,6 +392,17 @@ class AcquisitionController(QObject):
         if self._worker:
             self._worker.stop()
 
+    @Slot(int)
+    def _on_block_int_us(self, int_us: int) -> None:
+        # emitted right before spectrum_ready (same queue, so same order)
+        self._frame_int_us = int_us
+
+    @Slot(object)
+    def _on_spectrum_variance(self, var) -> None:
+        # emitted right before spectrum_ready, like block_int_us
+        self._last_variance = var
+        self.spectrum_variance.emit(var)
+
     @Slot(np.ndarray, np.ndarray)
     def _handle_spectrum(self, wl: np.ndarray, counts: np.ndarray) -> None:
         """
@@ -214,6 +410,7 @@ class AcquisitionController(QObject):
         """
         self._last_spectrum = (wl, counts)
         self.spectrum_ready.emit(wl, counts)
+        self._apply_auto_exposure(wl, counts)
 
     @Slot()
     def _on_finished(self) -> None:
@@ -243,6 +440,9 @@ class AcquisitionController(QObject):
             continuous=False,
             dark_counts=self._dark_counts,
             correct_nonlinearity=self._correct_nonlinearity,
+            reader=self._device_reader(),
+            fast_threshold_us=self._fast_threshold_us,
+            rejection=self._rejection,
         )
         self._bg_worker.moveToThread(self._bg_thread)
 
@@ -252,6 +452,7 @@ class AcquisitionController(QObject):
         self._bg_worker.scan_tick.connect(self.scan_tick)
         self._bg_worker.remaining_time.connect(self.remaining_time)
         self._bg_worker.spectrum_ready.connect(self._handle_background)
+        self._bg_worker.failed.connect(self.failed)
         self._bg_worker.finished.connect(self._on_background_finished)
 
         self._bg_thread.start()
@@ -262,6 +463,8 @@ class AcquisitionController(QObject):
         Internal slot: store latest background then emit.
         """
         self._last_background = (wl, counts)
+        if self._auto_exposure is not None:
+            logger.info("auto-exposure paused while a background is subtracted")
         self.background_ready.emit(wl, counts)
 
     @Slot()
@@ -281,6 +484,15 @@ class AcquisitionController(QObject):
         """Get the last acquired spectrum (wl, counts)."""
         return self._last_spectrum
 
+    @property
+    def last_variance(self) -> Optional[np.ndarray]:
+        """
+        Per-pixel variance of the last averaged spectrum (scan-to-scan
+        scatter / number of scans), for weighting fits; None when it could
+        not be estimated (a single read, e.g. one scan or on-device averaging).
+        """
+        return self._last_variance
+
     @property
     def last_background(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
         """Get the last acquired background (wl, counts)."""
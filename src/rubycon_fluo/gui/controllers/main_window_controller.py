@@ -13,10 +13,10 @@ from pathlib import Path
 import numpy as np
 import pyqtgraph as pg
 
-from PySide6.QtCore import Qt, QEvent, QSettings, QTimer, Slot, QThread, QUrl
-from PySide6.QtGui import QStandardItemModel, QStandardItem, QDoubleValidator, QAction
+from PySide6.QtCore import Qt, QEvent, QSettings, QTimer, Slot, QUrl
+from PySide6.QtGui import QStandardItemModel, QStandardItem, QDoubleValidator, QAction, QActionGroup
 from PySide6.QtWidgets import QMainWindow, QApplication, QDialog, QVBoxLayout, QTextEdit, QHBoxLayout, \
-    QPushButton, QAbstractItemView, QFileDialog, QTextBrowser
+    QPushButton, QAbstractItemView, QFileDialog, QTextBrowser, QInputDialog
 from seabreeze.cseabreeze import SeaBreezeError
 
 from rubycon_fluo.gui.ui.main_window import Ui_MainWindow
@@ -31,12 +31,18 @@ from rubycon_fluo.gui.dialogs.about_dialog import AboutDialog
 from rubycon_fluo.fitting.voigt_fitter import VoigtFitter
 from rubycon_fluo.measurement.record import MeasurementRecord
 from rubycon_fluo.fitting.auto_fit import AutoFit
-from rubycon_fluo.fitting.auto_fit_worker import AutoFitWorker
+from rubycon_fluo.fitting.auto_fit_worker import AutoFitService
+from rubycon_fluo.fitting.fit_cache import FitCache
 from rubycon_fluo.measurement.calculator import MeasurementCalculator
 from rubycon_fluo.measurement.manager import MeasurementManager
 from rubycon_fluo.gui.controllers.acquisition_controller import AcquisitionController
-from rubycon_fluo.fitting.auto_fit import residual_nb, jac_nb
-from rubycon_fluo.fitting.voigt_fitter import _residual_nb as res1, _jac_nb as jac1
+from rubycon_fluo.processing.pipeline import CorrectionCache, SpectrumPipeline
+from rubycon_fluo.processing.smoothing import SMOOTHERS
+from rubycon_fluo.processing.spikes import despike
+from rubycon_fluo.fitting.auto_fit import (bounds_nb, lm_fit_nb, residual_jac_nb, residual_nb,
+                                           weighted_residual_jac_nb)
+from rubycon_fluo.fitting.peak_estimate import estimate_two_peak_nb
+from rubycon_fluo.fitting.voigt_fitter import _residual_jac_nb as voigt_residual_jac_nb
 from rubycon_fluo.calibration.calibration_core import (
     PRESSURE_CALIBRATIONS,          # Dict[str, PressureCalibration]
     TEMPERATURE_CALIBRATIONS,       # Dict[str, TemperatureCalibration]
@@ -45,6 +51,8 @@ from rubycon_fluo.calibration.calibration_core import (
 )
 
 DEFAULT_REF_WL = 694.22      # 1 bar ruby R1 peak (nm)
+DEFAULT_AUTO_FIT_BUDGET_MS = 200   # per-frame auto-fit time limit (0 = none)
+DEFAULT_FAST_PATH_MS = 20          # exposures below this skip progress polling (0 = never)
 _INVALID_CHARS_RE = re.compile(r'[<>:"/\\|?*\0]')   # Windows & POSIX
 
 class MainWindowController(QMainWindow):
@@ -197,6 +205,87 @@ class MainWindowController(QMainWindow):
         self.ui.progressBar.setValue(100)
         self.ui.progressBar_scans_progress.setValue(100)
 
+        settings_menu = self.menuBar().addMenu("Settings")
+
+        self._act_auto_fit_budget = QAction("Auto-fit Time Budget…", self)
+        self._act_auto_fit_budget.triggered.connect(self._on_auto_fit_budget_action)
+        settings_menu.addAction(self._act_auto_fit_budget)
+
+        self._act_fast_path = QAction("Fast Acquisition Threshold…", self)
+        self._act_fast_path.triggered.connect(self._on_fast_path_action)
+        settings_menu.addAction(self._act_fast_path)
+
+        self._act_auto_exposure = QAction("Auto-exposure in Continuous Mode", self)
+        self._act_auto_exposure.setCheckable(True)
+        self._act_auto_exposure.setChecked(self._qt.value("auto_exposure", False, type=bool))
+        self._act_auto_exposure.toggled.connect(self._on_auto_exposure_toggled)
+        settings_menu.addAction(self._act_auto_exposure)
+
+        avg_menu = settings_menu.addMenu("Continuous Averaging")
+        avg_group = QActionGroup(self)
+        avg_group.setExclusive(True)
+        current = self._qt.value("averaging_mode", "block")
+        self._averaging_actions: dict[str, QAction] = {}
+        for mode, label in (("block", "Block (new scans each frame)"),
+                            ("rolling", "Rolling window (update every scan)"),
+                            ("ema", "Exponential (update every scan)")):
+            act = QAction(label, self)
+            act.setCheckable(True)
+            act.setChecked(mode == current)
+            act.triggered.connect(lambda _c=False, m=mode: self._on_averaging_mode_selected(m))
+            avg_group.addAction(act)
+            avg_menu.addAction(act)
+            self._averaging_actions[mode] = act
+
+        smooth_menu = settings_menu.addMenu("Smoothing")
+        smooth_group = QActionGroup(self)
+        smooth_group.setExclusive(True)
+        self._smoother = self._qt.value("smoother", "boxcar")
+        if self._smoother not in SMOOTHERS:
+            self._smoother = "boxcar"
+        for name, label in (("boxcar", "Boxcar (moving average)"),
+                            ("savgol", "Savitzky–Golay (2nd order)")):
+            act = QAction(label, self)
+            act.setCheckable(True)
+            act.setChecked(name == self._smoother)
+            act.triggered.connect(lambda _c=False, n=name: self._on_smoother_selected(n))
+            smooth_group.addAction(act)
+            smooth_menu.addAction(act)
+
+        reject_menu = settings_menu.addMenu("Cosmic-ray Rejection")
+        reject_group = QActionGroup(self)
+        reject_group.setExclusive(True)
+        current = self._qt.value("rejection", "none")
+        self._rejection_actions: dict[str, QAction] = {}
+        for mode, label in (("none", "Off (plain mean)"),
+                            ("sigma_clip", "Sigma-clipped mean"),
+                            ("median", "Median")):
+            act = QAction(label, self)
+            act.setCheckable(True)
+            act.setChecked(mode == current)
+            act.triggered.connect(lambda _c=False, m=mode: self._on_rejection_selected(m))
+            reject_group.addAction(act)
+            reject_menu.addAction(act)
+            self._rejection_actions[mode] = act
+
+        nl_menu = settings_menu.addMenu("Nonlinearity Correction")
+        nl_group = QActionGroup(self)
+        nl_group.setExclusive(True)
+        current = self._qt.value("nonlinearity_mode", "auto")
+        self._nonlinearity_actions: dict[str, QAction] = {}
+        for mode, label in (("auto", "Automatic (faster path)"),
+                            ("device", "Spectrometer driver"),
+                            ("software", "Software lookup table")):
+            act = QAction(label, self)
+            act.setCheckable(True)
+            act.setChecked(mode == current)
+            act.triggered.connect(lambda _c=False, m=mode: self._on_nonlinearity_mode_selected(m))
+            nl_group.addAction(act)
+            nl_menu.addAction(act)
+            self._nonlinearity_actions[mode] = act
+        if not any(a.isChecked() for a in self._nonlinearity_actions.values()):
+            self._nonlinearity_actions["auto"].setChecked(True)
+
         help_menu = self.menuBar().addMenu("Help")
 
         self._act_user_guide = QAction("User Guide", self)
@@ -244,15 +333,28 @@ class MainWindowController(QMainWindow):
         q_app = cast(QApplication, QApplication.instance())
         q_app.aboutToQuit.connect(self._disable_tec_on_exit)
 
-        # worker threads
-        self._auto_thread = None  # type: QThread | None
-        self._auto_worker = None  # type: AutoFitWorker | None
+        # recent fit results, shared by Auto-fit and the manual Voigt fits;
+        # hit/miss counters via self._fit_cache.stats()
+        self._fit_cache = FitCache(maxsize=32)
+
+        # persistent background fitter (one thread for the whole session)
+        self._auto_fit_budget_ms = int(
+            self._qt.value("auto_fit_budget_ms", DEFAULT_AUTO_FIT_BUDGET_MS)
+        )
+        self._auto_fit_service = AutoFitService(
+            self._auto_fit_budget_ms / 1000 or None, cache=self._fit_cache, parent=self
+        )
+        self._auto_fit_service.fit_finished.connect(self._on_auto_fit_finished)
+        self._auto_fit_service.fit_partial.connect(self._on_auto_fit_partial)
+        self._auto_fit_service.fit_failed.connect(self._on_auto_fit_failed)
+        q_app.aboutToQuit.connect(self._auto_fit_service.shutdown)
 
         # generic flags / holders
         self._fitting_range_initialized = False
 
         self._bg_collecting = False
-        self._pending_spectrum = None  # (wl, counts) queued for throttled plot
+        self._pending_spectrum = None  # (wl, counts, sigma) queued for throttled plot
+        self._curve_sigma = None       # per-pixel σ of the plotted spectrum, or None
 
         # latest‑fit bookkeeping
         self._last_voigt_popt = None
@@ -290,6 +392,13 @@ class MainWindowController(QMainWindow):
         self._sl_coef = np.zeros(1)
         self._irrad_coef = np.ones(1)
 
+        # correction chain built from the above, rebuilt when any of them changes;
+        # the evaluated stray-light / irradiance vectors are cached per device
+        self._corr_cache = CorrectionCache()
+        self._pipeline: SpectrumPipeline | None = None
+        self._pipeline_key: tuple | None = None
+        self._pipeline_sources: tuple = ()
+
         # device‑related placeholders
         self._spec_ctrl: SpectrometerController | None = None
         self._pixel_count: int = 0
@@ -303,18 +412,26 @@ class MainWindowController(QMainWindow):
         self._pressure_cal: PressureCalibration | None = None
         self._temperature_cal: TemperatureCalibration | None = None
 
-        # auto-fit concurrency guards
-        self._auto_fit_running = False  # a fit thread is alive
-        self._auto_fit_pending = False  # a new spectrum arrived while fitting
+        self._auto_fit_seed = None      # last good popt → warm start next fit
 
         def _warm_up():
             # tiny dummy arrays – enough for Numba’s type‑specialisation
             x = np.linspace(0.0, 1.0, 5, dtype=np.float64)
             y = np.zeros_like(x)
-            residual_nb(np.zeros(9), x, y)
-            jac_nb(np.zeros(9), x, y)
-            res1(np.zeros(4), x, y)
-            jac1(np.zeros(4), x, y)
+            # the kernels a live fit runs: fused residual + Jacobian (plain and
+            # weighted), the seed check, the pre-estimate and the LM solver
+            p = np.array([0.5, 1.0, 0.2, 0.5, 0.6, 1.0, 0.2, 0.5, 0.0])
+            r, J = np.empty(x.size), np.empty((x.size, 9))
+            residual_nb(p, x, y)
+            residual_jac_nb(p, x, y, r, J)
+            weighted_residual_jac_nb(p, x, np.vstack((y, np.ones_like(y))), r, J)
+            lower, upper = bounds_nb(0.0, 1.0)
+            estimate_two_peak_nb(x, y, lower[4], upper[4])
+            lm_fit_nb(p, lower, upper, x, y, 2, 1e-12, 1e-12)
+            voigt_residual_jac_nb(p[:4], x, y, r, np.empty((x.size, 4)))
+            SpectrumPipeline(x.size, stray_light_coef=(0.0,), boxcar_width=3).process(y)
+            SpectrumPipeline(x.size, boxcar_width=3, smoother="savgol").process(y)
+            despike(np.zeros(8))
 
         threading.Thread(target=_warm_up, daemon=True).start()
 
@@ -455,7 +572,7 @@ class MainWindowController(QMainWindow):
         self._plot_item.addItem(self._manual_voigt_line)
 
         # helper Voigt fitter and original wheel handler cache
-        self._manual_voigt_fitter = VoigtFitter()
+        self._manual_voigt_fitter = VoigtFitter(cache=self._fit_cache)
         self._orig_vb_wheel = self._plot_item.vb.wheelEvent
 
         # live cursor tracking
@@ -609,10 +726,14 @@ class MainWindowController(QMainWindow):
             For the current `AcquisitionController` (self._acq_mgr):
             - Connect changes in integration time, scan average, and correction checkboxes
               to `m.set_parameters(...)`.
+            - Apply the continuous averaging mode and the auto-exposure setting, keep its window on the fitting range and
+              connect `integration_time_changed` to `_on_auto_exposure_changed`.
             - Connect Single/Continuous toggles to `_on_single_toggled` / `_on_continuous_toggled`.
             - Connect Background toggle to `_on_background_toggled`.
+            - Apply the fast acquisition threshold stored in `QSettings`.
             - Connect progress signals (`integration_tick`, `scan_tick`, `remaining_time`)
-              to update `progressBar`, `progressBar_scans_progress`, and `label_time_left_seconds`.
+              to update `progressBar`, `progressBar_scans_progress`, and `label_time_left_seconds`;
+              the achieved `frame_rate` goes to the scans bar tooltip.
             - Connect `spectrum_ready` to `_on_spectrum_ready`, `finished` to `_on_acquisition_finished`,
               and `background_finished` to `_on_background_finished`.
         """
@@ -637,6 +758,27 @@ class MainWindowController(QMainWindow):
             )
         )
 
+        # Continuous averaging mode and auto-exposure (Settings menu)
+        mgr.set_averaging_mode(next(
+            (m for m, a in self._averaging_actions.items() if a.isChecked()), "block"
+        ))
+        # Auto-exposure regulates the peak inside the fitting range
+        mgr.set_auto_exposure(self._act_auto_exposure.isChecked())
+        lo_sp = self.ui.doubleSpinBox_min_fitting_range_nm
+        hi_sp = self.ui.doubleSpinBox_max_fitting_range_nm
+        mgr.set_auto_exposure_window(lo_sp.value(), hi_sp.value())
+        for sp in (lo_sp, hi_sp):
+            sp.valueChanged.connect(
+                lambda _v, m=mgr: m.set_auto_exposure_window(lo_sp.value(), hi_sp.value())
+            )
+        mgr.integration_time_changed.connect(self._on_auto_exposure_changed)
+        mgr.set_fast_path_threshold_us(
+            int(self._qt.value("fast_path_ms", DEFAULT_FAST_PATH_MS)) * 1_000
+        )
+        mgr.set_rejection(next(
+            (m for m, a in self._rejection_actions.items() if a.isChecked()), "none"
+        ))
+
         # Single-shot / continuous toggles
         self.ui.pushButton_single.toggled.connect(self._on_single_toggled)
         self.ui.pushButton_continuous.toggled.connect(self._on_continuous_toggled)
@@ -654,11 +796,15 @@ class MainWindowController(QMainWindow):
         mgr.remaining_time.connect(
             lambda sec: self.ui.label_time_left_seconds.setText(f"{sec:.1f}")
         )
+        mgr.frame_rate.connect(
+            lambda fps: self.ui.progressBar_scans_progress.setToolTip(f"{fps:.1f} scans/s")
+        )
 
         # Spectrum data handlers
         mgr.spectrum_ready.connect(self._on_spectrum_ready)
         mgr.finished.connect(self._on_acquisition_finished)
         mgr.background_finished.connect(self._on_background_finished)
+        mgr.failed.connect(self._on_acquisition_failed)
 
     @staticmethod
     def _sanitize_name(name: str) -> str:
@@ -720,6 +866,15 @@ class MainWindowController(QMainWindow):
         else:
             self._measurement_manager.disable_auto_save()
 
+    @Slot(str)
+    def _on_acquisition_failed(self, message: str) -> None:
+        """
+            Report a failed spectrometer read; the acquisition has stopped
+            and `_on_acquisition_finished` restores the buttons.
+        """
+        QMessageBox.warning(self, "Acquisition Error",
+                            f"Reading the spectrometer failed:\n{message}")
+
     @Slot()
     def _on_acquisition_finished(self) -> None:
         """
@@ -1605,7 +1760,8 @@ class MainWindowController(QMainWindow):
             Flush a pending spectrum to the plot at most ~60 Hz.
 
             If `self._painting_paused` is False and `self._pending_spectrum` is set,
-            unpack (wl, proc), call `_curve.setData(wl, proc)`. Then, if `checkBox_auto_intensity_scale`
+            unpack (wl, proc, sigma), call `_curve.setData(wl, proc)` and keep `sigma`
+            in `_curve_sigma` for the auto-fit. Then, if `checkBox_auto_intensity_scale`
             is checked, call `self._plot_item.vb.scale_intensity()`. Enable/disable
             live-data controls (`pushButton_manual_fit`, etc.) based on data presence.
             If Auto-fit is on, call `_update_autofit_highlight()` and `_attempt_autofit()`.
@@ -1617,7 +1773,7 @@ class MainWindowController(QMainWindow):
         if self._painting_paused or self._pending_spectrum is None:
             return
 
-        wl, proc = self._pending_spectrum
+        wl, proc, self._curve_sigma = self._pending_spectrum
         # update ONLY the live‐data curve
         self._curve.setData(wl, proc)
         self._pending_spectrum = None
@@ -1799,23 +1955,20 @@ class MainWindowController(QMainWindow):
     @Slot()
     def _attempt_autofit(self) -> None:
         """
-            If Auto-fit is checked, start or queue a background two-peak Voigt fit.
+            If Auto-fit is checked, queue a background two-peak Voigt fit.
 
-            - If `_auto_fit_running` is True, set `_auto_fit_pending = True` and return.
-            - Otherwise, get the full-spectrum data (`wl`, `cnt`). If insufficient, return.
-            - Read min/max fitting range from spinboxes, mark `_auto_fit_running = True`,
-              create an `AutoFitWorker(wl, cnt, lo, hi)` on a new QThread, and connect
-              its signals to `_on_auto_fit_finished` and `_on_auto_fit_failed`. Start the thread.
+            - Get the full-spectrum data (`wl`, `cnt`). If insufficient, return.
+            - Read min/max fitting range from spinboxes and submit the frame to the
+              persistent `_auto_fit_service`, seeded with the previous frame's
+              solution (`_auto_fit_seed`) and weighted by `_curve_sigma` when the
+              scan-to-scan variance is known. If a fit is still running, this frame
+              replaces any frame already waiting (latest frame wins); results arrive
+              via `_on_auto_fit_finished` / `_on_auto_fit_failed`.
         """
         # 1) only when Auto-fit is on
         if not self.ui.checkBox_autofit.isChecked():
             return
 
-        # 1) already running?  just remember that we need one more pass
-        if self._auto_fit_running:
-            self._auto_fit_pending = True
-            return
-
         # 2) grab full-spectrum data
         wl = self._curve.xData
         cnt = self._curve.yData
@@ -1826,53 +1979,50 @@ class MainWindowController(QMainWindow):
         lo = self.ui.doubleSpinBox_min_fitting_range_nm.value()
         hi = self.ui.doubleSpinBox_max_fitting_range_nm.value()
 
-        # 3) mark that we’re busy *before* starting the thread
-        self._auto_fit_running = True
-
-        # spawn a new background fit
-        self._auto_worker = AutoFitWorker(wl, cnt, lo, hi)
-        self._auto_thread = QThread(self)
-        self._auto_worker.moveToThread(self._auto_thread)
-        self._auto_thread.started.connect(self._auto_worker.run)
-        self._auto_worker.fit_finished.connect(self._on_auto_fit_finished)
-        # optionally handle failures:
-        self._auto_worker.fit_failed.connect(lambda: None)
-        self._auto_thread.start()
+        # 4) hand it to the fit thread; a newer frame overwrites a waiting one
+        sigma = self._curve_sigma
+        if sigma is not None and sigma.shape != cnt.shape:
+            sigma = None
+        self._auto_fit_service.submit(wl, cnt, lo, hi, seed=self._auto_fit_seed, sigma=sigma)
 
     @Slot()
     def _on_auto_fit_failed(self):
         """
             Handle a failed background auto-fit.
 
-            - Set `_auto_fit_running = False`.
-            - Stop and clean up `_auto_thread`.
-            - If `_auto_fit_pending` is True, reset the flag and schedule `_attempt_autofit()`
-              on the next event loop iteration.
+            - Drop the warm-start seed; it evidently no longer fits.
         """
-        # same clean‑up as success
-        self._auto_fit_running = False
-        if self._auto_thread:
-            self._auto_thread.quit()
-            self._auto_thread.wait()
+        self._auto_fit_seed = None
 
-        # schedule one more pass if something arrived meanwhile
-        if self._auto_fit_pending:
-            self._auto_fit_pending = False
-            QTimer.singleShot(0, self._attempt_autofit)
+    @Slot(object, object)
+    def _on_auto_fit_partial(self, popt, pcov) -> None:
+        """
+            Handle an auto-fit that hit its time budget before converging.
+
+            Show the best solution found so far exactly like a finished fit,
+            but with the pressure read-out in orange to flag it as partial.
+        """
+        self._on_auto_fit_finished(popt, pcov, partial=True)
 
     @Slot(object, object)
-    def _on_auto_fit_finished(self, popt, pcov) -> None:
+    def _on_auto_fit_finished(self, popt, pcov, partial: bool = False) -> None:
         """
             Handle completion of a background auto-fit.
 
             - Extract R1/R2 parameters (centers, amplitudes, fwhm, fractions) from `popt` and `pcov`.
             - Draw the two-peak model overlay (`_auto_model_curve`) in the fitting window.
             - Position `_auto_voigt_line` at R1 center and `_r2_voigt_line` at R2 center.
-            - Update `lineEdit_measured_wavelength_nm` and call `_apply_fit(center, sigma, "green")`.
-            - Store last-fit metadata (`_last_voigt_popt`, `_last_voigt_pcov`, `_last_r2_wavelength` etc.).
-            - Call `_apply_auto_intensity_after_interaction()`, mark `_auto_fit_running = False`,
-              stop/clean up the thread, and if `_auto_fit_pending` is True, schedule one more pass.
+            - Update `lineEdit_measured_wavelength_nm` and call `_apply_fit(center, sigma, "green")`
+              (orange when `partial`, i.e. the fit ran out of time budget).
+            - Store last-fit metadata (`_last_voigt_popt`, `_last_voigt_pcov`, `_last_r2_wavelength` etc.)
+              and keep the full `popt` as `_auto_fit_seed` for the next frame's warm start.
+            - Call `_apply_auto_intensity_after_interaction()`.
+
+            Results that land after Auto-fit was switched off are ignored.
         """
+        if not self.ui.checkBox_autofit.isChecked():
+            return
+
         # R1 parameters
         c1 = popt[0]
         amp1 = popt[1]
@@ -1906,7 +2056,7 @@ class MainWindowController(QMainWindow):
         # 3) update measured‐wavelength & live‐pressure
         self.ui.lineEdit_measured_wavelength_nm.setText(f"{c1:.3f}")
         sigma1 = sqrt(pcov[0, 0])
-        self._apply_fit(c1, sigma1, "green")
+        self._apply_fit(c1, sigma1, "orange" if partial else "green")
 
         self._r2_voigt_line.setPos(r2_center)
         self._r2_voigt_line.setVisible(True)
@@ -1923,19 +2073,138 @@ class MainWindowController(QMainWindow):
 
         self._last_baseline = popt[8]
 
+        # keep the full solution to warm-start the next frame
+        self._auto_fit_seed = np.asarray(popt, dtype=float).copy()
+
         # 5) re‐scale if needed
         self._apply_auto_intensity_after_interaction()
 
-        self._auto_fit_running = False
-        if self._auto_thread:
-            self._auto_thread.quit()
-            self._auto_thread.wait()
+    def set_auto_fit_budget_ms(self, ms: int) -> None:
+        """
+            Set the per-frame auto-fit time budget in milliseconds (0 = unlimited).
+
+            The value is stored in `QSettings` and applied from the next fit on.
+            A fit that exceeds it returns its best solution so far (shown in orange).
+        """
+        self._auto_fit_budget_ms = max(0, int(ms))
+        self._qt.setValue("auto_fit_budget_ms", self._auto_fit_budget_ms)
+        self._auto_fit_service.set_time_budget(self._auto_fit_budget_ms / 1000 or None)
+
+    @Slot()
+    def _on_auto_fit_budget_action(self) -> None:
+        """
+            Ask for a new auto-fit time budget (Settings menu) and apply it.
+        """
+        ms, ok = QInputDialog.getInt(
+            self,
+            "Auto-fit Time Budget",
+            "Maximum time per auto-fit in ms (0 = unlimited):",
+            self._auto_fit_budget_ms, 0, 60_000, 50,
+        )
+        if ok:
+            self.set_auto_fit_budget_ms(ms)
+
+    @Slot()
+    def _on_fast_path_action(self) -> None:
+        """
+            Ask for the fast acquisition threshold (Settings menu) and apply it.
+
+            Exposures below it are read back to back without progress polling;
+            stored in `QSettings`, takes effect on the next start.
+        """
+        ms, ok = QInputDialog.getInt(
+            self,
+            "Fast Acquisition Threshold",
+            "Exposures shorter than this many ms skip progress polling (0 = never):",
+            int(self._qt.value("fast_path_ms", DEFAULT_FAST_PATH_MS)), 0, 1_000, 5,
+        )
+        if ok:
+            self._qt.setValue("fast_path_ms", ms)
+            if self._acq_mgr:
+                self._acq_mgr.set_fast_path_threshold_us(ms * 1_000)
+
+    def _on_averaging_mode_selected(self, mode: str) -> None:
+        """
+            Choose block / rolling / EMA averaging for continuous mode (Settings menu).
+
+            Stored in `QSettings`; takes effect the next time Continuous is started.
+        """
+        self._qt.setValue("averaging_mode", mode)
+        if self._acq_mgr:
+            self._acq_mgr.set_averaging_mode(mode)
+
+    def _on_rejection_selected(self, mode: str) -> None:
+        """
+            Choose cosmic-ray rejection (Settings menu): off, sigma-clipped
+            mean or median of the averaged scans; single scans are despiked.
+
+            Stored in `QSettings`; takes effect on the next start.
+        """
+        self._qt.setValue("rejection", mode)
+        if self._acq_mgr:
+            self._acq_mgr.set_rejection(mode)
+
+    def _on_nonlinearity_mode_selected(self, mode: str) -> None:
+        """
+            Choose where the nonlinearity correction runs (Settings menu): the
+            spectrometer driver, the software lookup table, or whichever is faster.
+
+            Stored in `QSettings`; applies to the current device right away.
+        """
+        self._qt.setValue("nonlinearity_mode", mode)
+        if self._spec_ctrl:
+            self._spec_ctrl.set_nonlinearity_mode(mode)
+            self._update_nonlinearity_tooltip()
+
+    def _nonlinearity_mode_setting(self) -> str:
+        """The nonlinearity mode checked in the Settings menu."""
+        return next((m for m, a in self._nonlinearity_actions.items() if a.isChecked()), "auto")
+
+    def _update_nonlinearity_tooltip(self) -> None:
+        """Say on `checkBox_non_linearity` which path applies the correction."""
+        if not self.ui.checkBox_non_linearity.isEnabled():
+            return
+        mode = self._nonlinearity_mode_setting()
+        if mode == "auto":
+            tip = "Corrected in software or by the spectrometer driver, whichever is faster"
+        elif mode == "software" and self._spec_ctrl.nonlinearity_mode == "software":
+            tip = "Corrected in software (lookup table from the EEPROM coefficients)"
+        else:
+            tip = "Corrected by the spectrometer driver"
+        self.ui.checkBox_non_linearity.setToolTip(tip)
+
+    def _on_smoother_selected(self, name: str) -> None:
+        """
+            Choose the smoother behind the Boxcar/Smooth checkbox (Settings menu):
+            moving average or Savitzky–Golay over the same width.
+
+            Stored in `QSettings`; applies from the next spectrum.
+        """
+        self._qt.setValue("smoother", name)
+        self._smoother = name
+
+    @Slot(bool)
+    def _on_auto_exposure_toggled(self, checked: bool) -> None:
+        """
+            Enable/disable closed-loop auto-exposure (Settings menu).
 
-        # If a newer spectrum appeared while we were fitting,
-        # run once more (immediately) on that latest data.
-        if self._auto_fit_pending:
-            self._auto_fit_pending = False
-            QTimer.singleShot(0, self._attempt_autofit)
+            Stored in `QSettings`; takes effect on the next continuous frame.
+        """
+        self._qt.setValue("auto_exposure", checked)
+        if self._acq_mgr:
+            self._acq_mgr.set_auto_exposure(checked)
+
+    @Slot(int)
+    def _on_auto_exposure_changed(self, int_us: int) -> None:
+        """
+            Show an integration time chosen by auto-exposure in the spinbox
+            (in its current ms/s unit) without feeding it back as a user edit.
+        """
+        sp = self.ui.doubleSpinBox_integration_time_ms
+        factor = 1_000 if "(ms)" in self.ui.label_integrationtime.text() else 1_000_000
+        sp.blockSignals(True)
+        sp.setValue(int_us / factor)
+        sp.blockSignals(False)
 
     @Slot(bool)
     def _on_autofit_toggled(self, checked: bool):
@@ -1949,8 +2218,8 @@ class MainWindowController(QMainWindow):
                 attempt `_attempt_autofit()` if data exists, and enable “Clear All Fits.”
             If unchecked:
               - Restore single white curve (`_curve.show()`), hide split curves and fit overlays,
-                reset result labels, disable “Add,” and stop any running background fit thread.
-              - Reset `_auto_fit_running` and `_auto_fit_pending` to False, and call `_reset_last_fit_metadata()`.
+                reset result labels, disable “Add,” and cancel any queued or running background fit.
+              - Call `_reset_last_fit_metadata()`.
         """
         if checked:
             if self.ui.pushButton_manual_voigt_fit.isChecked() or self._manual_voigt_locked:
@@ -2002,12 +2271,7 @@ class MainWindowController(QMainWindow):
             self.ui.label_result_pressure_gpa.setStyleSheet("color: red;")
             self.ui.lineEdit_measured_wavelength_nm.clear()
             self._update_clear_fits_button()
-            if self._auto_thread and self._auto_thread.isRunning():
-                self._auto_worker.stop()
-                self._auto_thread.quit()
-                self._auto_thread.wait()
-            self._auto_fit_running = False
-            self._auto_fit_pending = False
+            self._auto_fit_service.cancel()
             self._reset_last_fit_metadata()
 
     def _update_autofit_highlight(self):
@@ -2132,7 +2396,8 @@ class MainWindowController(QMainWindow):
             Clear all attributes that describe the most-recent fit.
 
             Set `_last_fit_type`, `_last_voigt_popt`, `_last_voigt_pcov`, `_last_r2_wavelength`,
-            `_last_r2_voigt_popt`, `_last_r2_voigt_pcov`, and `_last_baseline` to None.
+            `_last_r2_voigt_popt`, `_last_r2_voigt_pcov`, `_last_baseline` and the
+            auto-fit warm-start seed to None.
         """
         self._last_fit_type = None
         self._last_voigt_popt = None
@@ -2141,6 +2406,7 @@ class MainWindowController(QMainWindow):
         self._last_r2_voigt_popt = None
         self._last_r2_voigt_pcov = None
         self._last_baseline = None
+        self._auto_fit_seed = None
 
     def _refresh_locked_fit(self) -> None:
         """
@@ -2186,8 +2452,8 @@ class MainWindowController(QMainWindow):
 
             - Collect the current correction flags (electric_dark, optical_dark,
               stray_light, non_linearity, irradiance, boxcar, pixel_binning).
-            - Call `self._acq_mgr.run_optimize(...)` with these flags and current
-              boxcar/binning settings.
+            - Call `self._acq_mgr.run_optimize(...)` with these flags and the display's
+              `SpectrumPipeline` (if a spectrum was already acquired).
             - If the optimizer returns a recommended T95 integration time (in µs),
               convert it to ms or s depending on the label, and set `doubleSpinBox_integration_time_ms`.
         """
@@ -2202,14 +2468,15 @@ class MainWindowController(QMainWindow):
             "pixel_binning": self.ui.checkBox_pixel_binning.isChecked(),
         }
 
+        # same correction chain as the live display
+        pipeline = None
+        if self._last_raw_counts is not None:
+            pipeline = self._spectrum_pipeline(self._last_raw_counts.size)
+
         # Ask the AcquisitionManager to run the optimiser dialog
         t95 = self._acq_mgr.run_optimize(
             flags=flags,
-            boxcar_width=self._boxcar_width,
-            bin_size=self._bin_size,
-            odark_ranges=self._odark,
-            sl_coef=self._sl_coef,
-            irrad_coef=self._irrad_coef,
+            pipeline=pipeline,
             parent=self,
         )
 
@@ -2397,7 +2664,8 @@ class MainWindowController(QMainWindow):
             - Get `raw_dev` and `did = comboBox_devices.currentText()`.
             - Save `did` to `QSettings` and `SettingsManager`.
             - Stop the temperature timer, clear `_temp_data`, clear the plot.
-            - Instantiate `SpectrometerController(raw_dev)` as `self._spec_ctrl`.
+            - Instantiate `SpectrometerController(raw_dev)` as `self._spec_ctrl` and
+              invalidate the cached correction vectors (`_invalidate_corrections`).
             - If `_acq_mgr` is None, create `AcquisitionController(self._spec_ctrl, parent=self)`
               and call `_setup_acquisition_connections()`. Otherwise, call
               `self._acq_mgr.set_spectrometer(self._spec_ctrl)`.
@@ -2422,10 +2690,12 @@ class MainWindowController(QMainWindow):
         self.ui.widget_temperatureplot.clear()
 
         self._spec_ctrl = SpectrometerController(raw_dev)
+        self._invalidate_corrections()
 
         if self._acq_mgr is None:
             self._acq_mgr = AcquisitionController(self._spec_ctrl, parent=self)
             self._setup_acquisition_connections()
+            QApplication.instance().aboutToQuit.connect(self._acq_mgr.shutdown)
         else:
             # swap in new controller on device change
             self._acq_mgr.set_spectrometer(self._spec_ctrl)
@@ -2520,17 +2790,21 @@ class MainWindowController(QMainWindow):
         """
             Query the spectrometer for dark-pixel ranges, nonlinearity, stray-light, and irradiance coefficients.
 
+            - Invalidate the cached correction vectors and pipeline (`_invalidate_corrections`).
             - Look for a feature implementing `get_electric_dark_pixel_ranges()`.
               If found, read and split electric and optical dark pixel ranges
               into `self._edark` and `self._odark`, plus store active pixel ranges.
             - If “nonlinearity_coefficients” feature exists, read it into `self._nl_coef`.
-              Otherwise, set `self._nl_coef = np.ones(1)`.
+              Otherwise, set `self._nl_coef = np.ones(1)`.  Hand it to the controller's
+              software nonlinearity correction (`set_nonlinearity_coefficients`), with
+              the mode chosen in the Settings menu (`set_nonlinearity_mode`).
             - If “stray_light_coefficients” feature exists, read it into `self._sl_coef`.
               Otherwise, set `self._sl_coef = np.zeros(1)`.
             - If “irrad_cal” feature exists, read it into `self._irrad_coef`.
               Otherwise, set `self._irrad_coef = np.ones(1)`.
         """
         f = self._spec_ctrl.features
+        self._invalidate_corrections()
 
         # electric & optical dark pixel ranges
         self._edark = []
@@ -2567,6 +2841,9 @@ class MainWindowController(QMainWindow):
             self._nl_coef = np.array(fl.get_nonlinearity_coefficients(), float)
         else:
             self._nl_coef = np.ones(1)
+        # software lookup table; the controller picks it or the driver's correction
+        self._spec_ctrl.set_nonlinearity_mode(self._nonlinearity_mode_setting())
+        self._spec_ctrl.set_nonlinearity_coefficients(self._nl_coef)
 
         # stray‑light
         if f.get("stray_light_coefficients"):
@@ -2593,6 +2870,8 @@ class MainWindowController(QMainWindow):
             - Enable `checkBox_irradiance` if “irrad_cal” exists.
             - Enable `checkBox_boxcar_smooth` and its spinbox if “spectrum_processing” exists.
             - Enable `checkBox_pixel_binning` and its combobox if “pixel_binning” exists.
+            - Tooltip on `spinBox_scansaverage` says whether scans are averaged on-device or in software;
+              the one on `checkBox_non_linearity` which path applies the nonlinearity correction.
             - Enable `checkBox_thermoelectric_enable` if “thermo_electric” exists,
               then call `_update_tec_ui` to toggle spinbox/label accordingly.
             - Always enable the temperature group (`groupBox_4`).
@@ -2632,6 +2911,15 @@ class MainWindowController(QMainWindow):
 
         self.ui.comboBox_pixel_binning.setEnabled(pb.isEnabled())
 
+        # which averaging path set_scans_to_average() drives on this device
+        self.ui.spinBox_scansaverage.setToolTip(
+            "Scans are averaged on the spectrometer (one transfer per spectrum)"
+            if self._spec_ctrl.hardware_averaging
+            else "Scans are averaged in software (one transfer per scan)"
+        )
+        # and which path applies the nonlinearity correction
+        self._update_nonlinearity_tooltip()
+
         self.ui.checkBox_thermoelectric_enable.setEnabled(bool(f.get("thermo_electric")))
         self._update_tec_ui(self.ui.checkBox_thermoelectric_enable.isChecked())
 
@@ -2646,18 +2934,21 @@ class MainWindowController(QMainWindow):
         """
             Handle a newly acquired spectrum (wl, raw_counts) from the spectrometer.
 
-            - Cache `self._last_raw_counts` and if shape changed, store `self._last_wl`,
-              initialize fitting-range spinboxes to [wl.min(), wl.max()].
-            - Build a processed array `proc = raw_counts.astype(float)` by applying
-              the sequence of enabled corrections:
+            - Cache `self._last_raw_counts` and if the shared axis object changed, store
+              `self._last_wl`, initialize fitting-range spinboxes to [wl.min(), wl.max()].
+            - Build the processed array `proc` with the cached `SpectrumPipeline`
+              (see `_spectrum_pipeline`), which applies the enabled corrections
               optical-dark → stray-light → irradiance → boxcar smoothing → background subtraction.
-            - Set `self._pending_spectrum = (self._last_wl, proc)`. If not paused and
+            - Propagate the acquisition's per-pixel variance (`last_variance`, None for
+              a single read) through the pipeline into `sigma` for weighted auto-fits.
+            - Set `self._pending_spectrum = (self._last_wl, proc, sigma)`. If not paused and
               not already scheduled, compute a 16 ms delay and schedule `QTimer.singleShot`
               to call `_flush_plot()`.
         """
         self._last_raw_counts = raw_counts
 
-        if self._last_wl is None or self._last_wl.shape != wl.shape:
+        # the controller hands out one shared axis per device/binning
+        if wl is not self._last_wl:
             self._last_wl = wl
             if not self._fitting_range_initialized:
                 self.ui.doubleSpinBox_min_fitting_range_nm.setRange(wl.min(), wl.max())
@@ -2670,36 +2961,19 @@ class MainWindowController(QMainWindow):
         # ────────────────────────────────────────────────
         # 3.  Build the processed counts array
         # ────────────────────────────────────────────────
-        proc = raw_counts.astype(float)
-
-        # Optical‑dark correction
-        if self._flags["optical_dark"]:
-            for lo, hi in self._odark:
-                proc -= proc[lo:hi].mean()
-
-        # Stray‑light polynomial
-        if self._flags["stray_light"]:
-            x = np.arange(proc.size)
-            proc -= np.polyval(self._sl_coef[::-1], x)
-
-        # Irradiance calibration
-        if self._flags["irradiance"]:
-            proc *= self._irrad_coef
-
-        # Boxcar smoothing
-        if self._flags["boxcar"] and self._boxcar_width > 1:
-            window = np.ones(self._boxcar_width) / self._boxcar_width
-            proc = np.convolve(proc, window, mode="same")
-
-        # Background subtraction — fetch from the manager
+        # a fresh buffer per frame: the plot and the fit thread keep the array
         bg = self._acq_mgr.last_background  # (wl_bg, counts_bg) or None
-        if bg is not None and bg[1].shape == proc.shape:
-            proc -= bg[1]
+        pipeline = self._spectrum_pipeline(raw_counts.size)
+        proc = pipeline.process(raw_counts, background=None if bg is None else bg[1])
+
+        # scan-to-scan variance of this frame (emitted just before it) → fit weights
+        var = self._acq_mgr.last_variance
+        sigma = pipeline.noise(var) if var is not None and var.shape == proc.shape else None
 
         # ────────────────────────────────────────────────
         # 4.  Queue a redraw (max ~60 Hz) with flushing logic
         # ────────────────────────────────────────────────
-        self._pending_spectrum = (wl_ref, proc)
+        self._pending_spectrum = (wl_ref, proc, sigma)
         if not self._painting_paused and not self._flush_scheduled:
             now = time.perf_counter()
             elapsed = now - self._last_flush_time
@@ -2707,6 +2981,40 @@ class MainWindowController(QMainWindow):
             self._flush_scheduled = True
             QTimer.singleShot(delay_ms, self._flush_plot)
 
+    def _spectrum_pipeline(self, n_pixels: int) -> SpectrumPipeline:
+        """
+            Return the `SpectrumPipeline` for the current correction flags.
+
+            The pipeline precomputes its constant terms, so it is kept and only rebuilt
+            when the pixel count, binning factor, a flag, the boxcar width, the smoother or
+            one of the coefficient arrays (`_odark`, `_sl_coef`, `_irrad_coef`, compared by identity)
+            changes.  The evaluated stray-light baseline and irradiance gain come from
+            `_corr_cache`, keyed by `device_id`, pixel count and binning factor.
+        """
+        f = self._flags
+        sources = (self._odark, self._sl_coef, self._irrad_coef)
+        key = (n_pixels, self._bin_size, f["optical_dark"], f["stray_light"], f["irradiance"],
+               f["boxcar"], self._boxcar_width, self._smoother, *map(id, sources))
+        if self._pipeline is None or key != self._pipeline_key:
+            device = self._spec_ctrl.device_id if self._spec_ctrl else None
+            self._pipeline = SpectrumPipeline.from_flags(
+                n_pixels, f, self._odark, self._sl_coef, self._irrad_coef, self._boxcar_width,
+                bin_size=self._bin_size, cache=self._corr_cache, device=device,
+                smoother=self._smoother,
+            )
+            # keep the sources alive so their ids in the key cannot be reused
+            self._pipeline_key, self._pipeline_sources = key, sources
+        return self._pipeline
+
+    def _invalidate_corrections(self) -> None:
+        """
+            Drop the cached correction vectors and pipeline (device or its coefficients changed).
+        """
+        self._corr_cache.clear()
+        self._pipeline = None
+        self._pipeline_key = None
+        self._pipeline_sources = ()
+
     # ——————————————————— temperature ———————————————————
     @Slot(bool)
     def _on_temp_group_toggled(self, chk: bool):
@@ -3083,14 +3391,13 @@ class MainWindowController(QMainWindow):
             Send the new TEC temperature setpoint to the spectrometer.
 
             - If no “thermo_electric” feature: return.
-            - Attempt `feat.set_temperature_setpoint_degrees_celsius(value)`.
-              On exception, show a warning dialog.
+            - Attempt `self._spec_ctrl.set_tec_setpoint_c(value)` (skipped by the
+              controller if unchanged). On exception, show a warning dialog.
         """
-        feat_list = self._spec_ctrl.features.get("thermo_electric", [])
-        if not feat_list:
+        if not self._spec_ctrl.features.get("thermo_electric"):
             return
         try:
-            feat_list[0].set_temperature_setpoint_degrees_celsius(value)
+            self._spec_ctrl.set_tec_setpoint_c(value)
         except Exception as e:
             QMessageBox.warning(self, "TEC Setpoint", f"Could not set temperature setpoint:\n{e}")
 
@@ -3170,7 +3477,7 @@ class MainWindowController(QMainWindow):
               Display as “Model / Serial” or fallback to a single field if one is missing.
             - If “revision” feature exists, read `firmware_revision` and `hardware_revision`;
               otherwise show “Not supported” and set related tooltips.
-            - Query `spec.spectrum_raw()` to get wavelength array, display pixel count
+            - Query `spec.wavelengths` to get wavelength array, display pixel count
               and factory wavelength range (“{wl[0]:.1f}–{wl[-1]:.1f} nm”); on failure show “—”.
             - Read integration limits in µs and format as “X ms—Y ms” or “X ms—Z s” depending on size.
             - Attempt `spec._spec.f.spectrometer.get_maximum_intensity()`, display saturation limit.
@@ -3217,7 +3524,7 @@ class MainWindowController(QMainWindow):
 
         # Pixel count & λ‑range (unchanged)
         try:
-            wl, _ = spec.spectrum_raw()
+            wl = spec.wavelengths
             self._pixel_count = wl.size
             ui.label_pixelcount_changeable.setText(str(len(wl)))
             ui.label_wavelengthrangefactory_changeable.setText(f"{wl[0]:.1f}–{wl[-1]:.1f} nm")
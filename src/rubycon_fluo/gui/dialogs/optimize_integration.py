@@ -1,107 +1,180 @@
+import time
+
 import numpy as np
 from PySide6.QtWidgets import (
     QDialog, QTextEdit, QVBoxLayout, QPushButton,
-    QHBoxLayout, QProgressBar
+    QHBoxLayout, QProgressBar, QLabel
 )
 from PySide6.QtCore import QObject, Signal, QThread, Slot, Qt
-import numpy as _np
-
 
-def _is_plateau(prev: float, curr: float, rel_tol: float = 0.1, min_counts: float = 1000.0) -> bool:
-    """
-    Plateau if the fractional increase (curr/prev − 1) is <= rel_tol,
-    but only *after* we’re above some minimum count level.
-
-    rel_tol=0.1 means “10%”;
-    min_counts prevents false‐positives at very low signals.
-    """
-    if prev <= 0.0:
-        return False
-    # don’t start plateauing until we have enough signal to trust
-    if prev < min_counts:
-        return False
-    # fractional gain
-    frac_gain = (curr - prev) / prev
-    return frac_gain <= rel_tol
+from rubycon_fluo.processing.pipeline import SpectrumPipeline
+from rubycon_fluo.processing.spikes import peak_counts, peak_slice
 
 
 class OptimizeWorker(QObject):
     """
-    Worker to sweep integration times in a background thread.
+    Model-based integration-time search in a background thread.
+
+    Raw peak counts are modelled as peak(t) = dark + rate·t below the
+    detector full scale.  Two short probes fix dark and rate (stepping up
+    ×8 while the signal is still lost in the noise, or down ×10 while even
+    the probe saturates), the model predicts the time that puts the peak
+    at `target` × full scale, and a check exposure there is refined by a
+    bounded secant/bisection step if it misses the ±`tolerance` band
+    (nonlinearity, saturation).  Typically 3–4 exposures in total.
+    With a SpectrumPipeline the peak is located on the corrected
+    spectrum (so e.g. a subtracted lamp line is not chased), but its
+    height is always taken from the raw counts the detector clips.
     Emits:
-      - progress(ms, counts)
-      - finished_scan(data: list of (ms, count))
+      - progress(ms, counts)       after every exposure (raw peak counts)
+      - estimate(seconds)          predicted time still needed
+      - finished_scan(points, result)
+          points: list of (ms, counts); result: dict with optimal_ms,
+          rate, dark, full_scale, exposures, elapsed_s, overhead_s, and
+          reached (False when the band was out of reach within the
+          integration limits; optimal_ms is then the limit closest to it)
     """
-    progress = Signal(int, float)
-    finished_scan = Signal(list)
-
-    def __init__(self, spec_ctrl, backend_kwargs, pipeline, parent=None):
+    progress = Signal(float, float)
+    estimate = Signal(float)
+    finished_scan = Signal(list, object)
+
+    PROBE_US = 10_000       # first probe exposure
+    TARGET = 0.85           # aim for this fraction of full scale
+    TOLERANCE = 0.05        # accept ± this fraction of full scale
+    SATURATED = 0.98        # at or above this fraction a point is clipped
+    MIN_RISE = 0.01         # probes must differ by this fraction to fit a slope
+    MAX_REFINE = 4
+
+    def __init__(self, spec_ctrl, backend_kwargs,
+                 pipeline: SpectrumPipeline | None = None,
+                 background: np.ndarray | None = None, parent=None):
         super().__init__(parent)
         self.spec_ctrl = spec_ctrl
         self.backend_kwargs = backend_kwargs
         self.pipeline = pipeline
+        self.background = background
+        self._buf: np.ndarray | None = None     # pipeline output, reused
         self._stop = False
+        self._points: list[tuple[float, float]] = []
+        self._overhead_s = 0.0
+
+    def _expose(self, t_us: int) -> float:
+        """One exposure at t_us; returns the raw peak counts."""
+        self.spec_ctrl.set_integration_time_us(t_us)
+        t0 = time.perf_counter()
+        cnt = self.spec_ctrl.intensities(**self.backend_kwargs)
+        self._overhead_s = max(0.0, time.perf_counter() - t0 - t_us / 1_000_000)
+        raw = np.asarray(cnt, dtype=float)
+        if self.pipeline is not None and raw.size == self.pipeline.n_pixels:
+            if self._buf is None or self._buf.shape != raw.shape:
+                self._buf = np.empty(raw.size)
+            proc = self.pipeline.process(raw, out=self._buf, background=self.background)
+            peak = float(raw[peak_slice(proc)].min())
+        else:
+            peak = peak_counts(raw)
+        ms = t_us / 1_000
+        self._points.append((ms, peak))
+        self.progress.emit(ms, peak)
+        return peak
+
+    def _eta(self, *t_us: int) -> None:
+        self.estimate.emit(sum(t / 1_000_000 + self._overhead_s for t in t_us))
 
     @Slot()
     def run(self):
+        t_start = time.perf_counter()
         mn_us, mx_us = self.spec_ctrl.integration_limits_us
-        t_us = mn_us
-        results = []
-        prev_max = None
-
-        while t_us <= mx_us and not self._stop:
-            # 1) set & read
-            self.spec_ctrl.set_integration_time_us(t_us)
-            wl, cnt = self.spec_ctrl.spectrum_raw(**self.backend_kwargs)
-
-            # 2) apply *your* processing pipeline
-            proc = cnt.astype(float)
-
-            bg = self.pipeline.get("background_counts")
-            if bg is not None and bg.shape == proc.shape:
-                proc = proc - bg
-
-            # optical‐dark
-            if self.pipeline["optical_dark"]:
-                for lo, hi in self.pipeline["odark_ranges"]:
-                    proc -= proc[lo:hi].mean()
-            # stray‐light
-            if self.pipeline["stray_light"]:
-                x = np.arange(proc.size)
-                proc -= np.polyval(self.pipeline["sl_coef"][::-1], x)
-            # irradiance
-            if self.pipeline["irradiance"]:
-                proc *= self.pipeline["irrad_coef"]
-            # boxcar
-            if self.pipeline["boxcar"] and self.pipeline["boxcar_width"] > 1:
-                w = np.ones(self.pipeline["boxcar_width"]) / self.pipeline["boxcar_width"]
-                proc = np.convolve(proc, w, mode="same")
-            # pixel‐binning (simple re‐bin by averaging)
-            if self.pipeline["pixel_binning"] and self.pipeline["bin_size"] > 1:
-                n = self.pipeline["bin_size"]
-                # trim to multiple of n
-                L = (proc.size // n) * n
-                proc = proc[:L].reshape(-1, n).mean(axis=1)
-
-            max_cnt = float(proc.max())
-            ms = int(t_us // 1_000)
-            results.append((ms, max_cnt))
-            self.progress.emit(ms, max_cnt)
-
-            # plateau check unchanged
-            if prev_max is not None and _is_plateau(prev_max, max_cnt):
+        full = self.spec_ctrl.saturation_counts
+        target, tol, sat = self.TARGET * full, self.TOLERANCE * full, self.SATURATED * full
+        clamp = lambda t: int(min(max(t, mn_us), mx_us))
+        tested: dict[int, float] = {}
+
+        def expose(t_us: int) -> float:
+            if t_us not in tested:
+                tested[t_us] = self._expose(t_us)
+            return tested[t_us]
+
+        # 1) first probe; step down while even that saturates
+        t1 = clamp(self.PROBE_US)
+        self._eta(t1, clamp(2 * t1))
+        c1 = expose(t1)
+        while c1 >= sat and t1 > mn_us and not self._stop:
+            t1 = clamp(t1 // 10)
+            c1 = expose(t1)
+
+        # 2) second probe; step up ×8 while the rise is lost in the noise
+        t2 = clamp(2 * t1)
+        while not self._stop and t2 > t1:
+            self._eta(t2)
+            c2 = expose(t2)
+            if c2 >= sat or c2 - c1 >= self.MIN_RISE * full or t2 == mx_us:
+                break
+            t1, c1 = t2, c2
+            t2 = clamp(8 * t2)
+
+        # 3) predict from the linear model, then refine inside the bracket
+        rate = dark = float("nan")
+        best = t1
+        for _ in range(self.MAX_REFINE + 1):
+            if self._stop:
+                break
+            ok = sorted((t, c) for t, c in tested.items() if c < sat)
+            lo = max((p for p in ok if p[1] < target), default=None)
+            hi = min(((t, c) for t, c in tested.items() if c > target), default=None)
+            if ok:
+                best = min(ok, key=lambda p: abs(p[1] - target))[0]
+            if ok and abs(tested[best] - target) <= tol:
+                break
+            if lo is None:                      # everything already too bright
+                best = mn_us
+                break
+            if hi is None and lo[0] == mx_us:   # too weak even at the maximum
+                best = mx_us
                 break
-            prev_max = max_cnt
-            t_us *= 2
 
-        self.finished_scan.emit(results)
+            # slope from the two unsaturated points nearest the target
+            near = sorted(ok, key=lambda p: abs(p[1] - target))[:2]
+            if len(near) == 2 and near[0][0] != near[1][0]:
+                (ta, ca), (tb, cb) = near
+                rate = (cb - ca) / (tb - ta)
+                dark = ca - rate * ta
+            t_next = (target - dark) / rate if rate > 0 else float("nan")
+            lo_t = lo[0]
+            hi_t = hi[0] if hi is not None else mx_us + 1
+            if not (lo_t < t_next < hi_t):
+                # model unusable or outside the bracket: bisect (geometric if open)
+                t_next = 0.5 * (lo_t + hi_t) if hi is not None else 8 * lo_t
+            t_next = clamp(round(t_next))
+            if t_next in tested:
+                break
+            self._eta(t_next)
+            expose(t_next)
+
+        ok = [(t, c) for t, c in tested.items() if c < sat]
+        if ok:
+            best = min(ok, key=lambda p: abs(p[1] - target))[0]
+        reached = bool(ok) and abs(tested[best] - target) <= tol
+        result = {
+            "optimal_ms": max(1, round(best / 1_000)),
+            "optimal_us": best,
+            "rate": rate * 1_000,               # counts per ms
+            "dark": dark,
+            "full_scale": full,
+            "target": target,
+            "exposures": len(self._points),
+            "elapsed_s": time.perf_counter() - t_start,
+            "overhead_s": self._overhead_s,
+            "reached": reached,
+        }
+        self.estimate.emit(0.0)
+        self.finished_scan.emit(list(self._points), result)
 
     def stop(self):
         self._stop = True
 
 
 class OptimizeDialog(QDialog):
-    def __init__(self, spec_ctrl, backend_kwargs, pipeline, parent=None):
+    def __init__(self, spec_ctrl, backend_kwargs, pipeline=None, background=None, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Optimize Integration Time")
         self.setModal(True)
@@ -119,6 +192,9 @@ class OptimizeDialog(QDialog):
         self.progress.setRange(0, 0)  # busy
         layout.addWidget(self.progress)
 
+        self.eta_label = QLabel("Estimating…", self)
+        layout.addWidget(self.eta_label)
+
         btn_layout = QHBoxLayout()
         self.apply_btn = QPushButton("Apply integration time", self)
         self.apply_btn.setEnabled(False)
@@ -134,79 +210,59 @@ class OptimizeDialog(QDialog):
 
         # worker thread
         self._thread = QThread(self)
-        self._worker = OptimizeWorker(spec_ctrl, backend_kwargs, pipeline)
+        self._worker = OptimizeWorker(spec_ctrl, backend_kwargs, pipeline, background)
         self._worker.moveToThread(self._thread)
         self._thread.started.connect(self._worker.run)
         self._worker.progress.connect(self._on_progress)
+        self._worker.estimate.connect(self._on_estimate)
         self._worker.finished_scan.connect(self._on_finished)
         # ensure thread quits when done
         self._worker.finished_scan.connect(self._thread.quit)
 
         self.setAttribute(Qt.WA_DeleteOnClose)
 
-    @Slot(int, float)
-    def _on_progress(self, ms: int, count: float) -> None:
-        self.log.append(f"Tested {ms} ms → max count {count:.2f}")
-
-    @Slot(list)
-    def _on_finished(self, data: list) -> None:
-        # 1) split into used vs saturated (last two)
-        if len(data) > 2:
-            used = data[:-2]
-            saturated = data[-2:]
-        else:
-            used = data
-            saturated = []
-
-        # 2) prepare arrays for fit
-        x = _np.array([pt[0] for pt in used], float)
-        y = _np.array([pt[1] for pt in used], float)
-
-        # 3) get true saturation level from the last two points
-        if saturated:
-            sat = max(count for _, count in saturated)
-        else:
-            sat = used[-1][1] if used else 0.0
-
-        # 3) fit
-        if x.size >= 2:
-            m, b = _np.polyfit(x, y, 1)
-            y_pred = m * x + b
-            ss_res = ((y - y_pred) ** 2).sum()
-            ss_tot = ((y - y.mean()) ** 2).sum()
-            r2 = 1 - ss_res / ss_tot if ss_tot else 1.0
-            t95 = int((0.95 * sat - b) / m)
-        elif x.size == 1:
-            m, b, r2 = 0.0, y[0], 1.0
-            t95 = int(x[0])
-        else:
-            m, b, r2, t95 = 0.0, 0.0, 0.0, 0
+    @Slot(float, float)
+    def _on_progress(self, ms: float, count: float) -> None:
+        self.log.append(f"Tested {ms:g} ms → max count {count:.2f}")
 
-        # (correct) clamp to the full tested range, including the two saturated points
-        if data:
-            min_ms = data[0][0]
-            max_ms = data[-1][0]
-            t95 = max(min(t95, max_ms), min_ms)
+    @Slot(float)
+    def _on_estimate(self, seconds: float) -> None:
+        self.eta_label.setText(f"Estimated time left: ~{seconds:.1f} s")
 
-        self._optimal_ms = t95
+    @Slot(list, object)
+    def _on_finished(self, data: list, result: dict) -> None:
+        self._optimal_ms = result["optimal_ms"]
+        sat = OptimizeWorker.SATURATED * result["full_scale"]
 
-        # 4) rebuild dialog log with colored text
+        # 1) rebuild dialog log: clipped exposures in red
         self.log.clear()
-        for ms, cnt in used:
-            self.log.append(
-                f'<span style="color: lightgreen">Tested {ms} ms → max count {cnt:.2f}</span>'
-            )
-        for ms, cnt in saturated:
+        for ms, cnt in data:
+            colour = "lightcoral" if cnt >= sat else "lightgreen"
             self.log.append(
-                f'<span style="color: lightcoral">Tested {ms} ms → max count {cnt:.2f}</span>'
+                f'<span style="color: {colour}">Tested {ms:g} ms → max count {cnt:.2f}</span>'
             )
 
-        # 5) summary & stats
+        # 2) summary & model
+        opt_s = result["optimal_us"] / 1_000_000
         self.log.append("<hr>")
-        self.log.append(f"Optimal ~ <b>{t95} ms</b> (95% sat ~ {0.95 * sat:.1f})")
-        self.log.append(f"Fit: y = {m:.2f}·x + {b:.1f}   R² = {r2:.4f}")
-
-        # 6) re-enable
+        self.log.append(
+            f"Optimal ~ <b>{self._optimal_ms} ms</b> "
+            f"({result['target'] / result['full_scale']:.0%} of full scale {result['full_scale']:.0f})"
+        )
+        if not result["reached"]:
+            self.log.append(
+                '<span style="color: lightcoral">Target not reached within the '
+                'integration limits; this is the closest setting</span>'
+            )
+        if np.isfinite(result["rate"]):
+            self.log.append(f"Model: y = {result['rate']:.2f}·t[ms] + {result['dark']:.1f}")
+        self.log.append(
+            f"{result['exposures']} exposures in {result['elapsed_s']:.2f} s; "
+            f"latency per frame at this setting ~ {opt_s + result['overhead_s']:.3f} s"
+        )
+        self.eta_label.setText(f"Done in {result['elapsed_s']:.1f} s")
+
+        # 3) re-enable
         self.apply_btn.setEnabled(True)
         self.progress.setRange(0, 1)
         self.progress.setValue(1)
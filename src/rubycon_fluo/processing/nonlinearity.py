@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import time
+from typing import Sequence
+
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True, nogil=True)
+def _apply_gain_nb(src, gain, out):
+    """out = src · gain(src), gain linearly interpolated between whole counts."""
+    top = gain.size - 1
+    for i in range(src.size):
+        x = src[i]
+        if x <= 0.0:
+            g = gain[0]
+        elif x >= top:
+            g = gain[top]
+        else:
+            k = int(x)
+            g = gain[k] + (gain[k + 1] - gain[k]) * (x - k)
+        out[i] = x * g
+
+
+class NonlinearityLUT:
+    """
+    Software detector-nonlinearity correction from the EEPROM polynomial
+    (coefficients lowest order first), corrected = counts / P(counts) as
+    in seabreeze, but with 1/P tabulated once for every ADC count up to
+    `full_scale`: correcting a frame is one table lookup per pixel instead
+    of evaluating the polynomial.  Counts outside the table use its end
+    values.  Expects dark-corrected counts, like the backend correction.
+    """
+
+    def __init__(self, coefficients: Sequence[float], full_scale: float = 65535.0) -> None:
+        self.coefficients = np.asarray(coefficients, dtype=float).ravel()
+        x = np.arange(int(np.ceil(full_scale)) + 1, dtype=float)
+        p = np.polyval(self.coefficients[::-1], x)
+        # a zero or negative P is a bad calibration point – leave it uncorrected
+        with np.errstate(divide="ignore"):
+            gain = np.where(p > 0.0, 1.0 / p, 1.0)
+        gain.setflags(write=False)
+        self.gain = gain
+
+    @staticmethod
+    def is_identity(coefficients: Sequence[float]) -> bool:
+        """True for P ≡ 1 (no calibration stored, e.g. the np.ones(1) placeholder)."""
+        c = np.asarray(coefficients, dtype=float).ravel()
+        return c.size == 0 or (c[0] == 1.0 and not np.any(c[1:]))
+
+    def apply(self, counts: np.ndarray, out: np.ndarray | None = None) -> np.ndarray:
+        """Corrected 1-D counts in `out` (float64, allocated if None; may be `counts`)."""
+        src = np.asarray(counts, dtype=float)
+        if out is None:
+            out = np.empty(src.shape)
+        _apply_gain_nb(src, self.gain, out)
+        return out
+
+    def polynomial(self, counts: np.ndarray) -> np.ndarray:
+        """Reference path: evaluate the polynomial per pixel (what the backend does)."""
+        counts = np.asarray(counts, dtype=float)
+        return counts / np.polyval(self.coefficients[::-1], counts)
+
+    def compare(self, n_pixels: int, repeats: int = 20) -> dict:
+        """
+        Best-of-`repeats` seconds per frame of `n_pixels` for the table
+        ("software") and the polynomial ("polynomial").
+        """
+        frame = np.linspace(0.0, self.gain.size - 1, n_pixels)
+        out = np.empty(n_pixels)
+        self.apply(frame, out)          # compile outside the timing
+
+        def best(fn) -> float:
+            t_min = float("inf")
+            for _ in range(repeats):
+                t0 = time.perf_counter()
+                fn()
+                t_min = min(t_min, time.perf_counter() - t0)
+            return t_min
+
+        return dict(software=best(lambda: self.apply(frame, out)),
+                    polynomial=best(lambda: self.polynomial(frame)))
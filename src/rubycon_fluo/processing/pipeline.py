@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import threading
+from typing import Callable, Hashable, Iterable, Mapping, Sequence, Tuple
+
+import numpy as np
+from numba import njit
+
+from rubycon_fluo.processing.smoothing import SMOOTHERS, SavitzkyGolay, boxcar
+
+
+@njit(cache=True, nogil=True)
+def _affine_nb(src, dark, gain, offset, out):
+    """out = (src − dark)·gain − offset in a single pass (src may be out)."""
+    for i in range(out.size):
+        out[i] = (src[i] - dark) * gain[i] - offset[i]
+
+
+def _binned(vec: np.ndarray, n_pixels: int, bin_size: int) -> np.ndarray:
+    """Per-pixel vector for the unbinned detector → one value per binned pixel (mean)."""
+    if vec.size == n_pixels:
+        return vec
+    if bin_size > 1 and vec.size >= n_pixels * bin_size:
+        return vec[:n_pixels * bin_size].reshape(n_pixels, bin_size).mean(axis=1)
+    raise ValueError(f"calibration has {vec.size} values, expected {n_pixels}"
+                     + (f" (× binning {bin_size})" if bin_size > 1 else ""))
+
+
+class CorrectionCache:
+    """
+    Evaluated correction vectors (stray-light baseline, irradiance gain)
+    per (kind, device, pixel count, binning factor).  An entry is also
+    recomputed when the coefficient object it was built from is replaced.
+    clear() when the device or its stored coefficients change.
+    """
+
+    def __init__(self) -> None:
+        self._data: dict = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, source, compute: Callable[[], np.ndarray]) -> np.ndarray:
+        """Cached vector for `key`, computed from `source` on a miss."""
+        with self._lock:
+            hit = self._data.get(key)
+        if hit is not None and hit[0] is source:
+            return hit[1]
+        vec = compute()
+        vec.setflags(write=False)       # shared between pipelines
+        with self._lock:
+            self._data[key] = (source, vec)
+        return vec
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+class SpectrumPipeline:
+    """
+    Software correction chain applied to every acquired spectrum:
+    optical dark → stray light → irradiance → smoothing → background.
+
+    Built once per device and flag set; every constant term (stray-light
+    baseline, irradiance vector, smoothing coefficients) is evaluated up front, so
+    process() only runs in-place arithmetic on one float buffer.  Dark,
+    stray light and irradiance are fused into one pass,
+    (counts − dark)·gain − baseline·gain.  Smoothing over `boxcar_width`
+    pixels is a running-sum boxcar or, with smoother="savgol", a
+    Savitzky–Golay filter of `savgol_order`.  A step is disabled by
+    leaving its argument None (smoothing: width ≤ 1).
+
+    The stray-light polynomial is evaluated on the index of the delivered
+    pixels, as before binning was taken into account.  An irradiance
+    vector for the unbinned detector is averaged over each bin when
+    `bin_size` > 1.  A CorrectionCache shares the
+    evaluated vectors between pipelines of the same `device`.
+    """
+
+    def __init__(self,
+                 n_pixels: int,
+                 optical_dark_ranges: Iterable[Tuple[int, int]] | None = None,
+                 stray_light_coef: Sequence[float] | None = None,
+                 irradiance: np.ndarray | None = None,
+                 boxcar_width: int = 1,
+                 bin_size: int = 1,
+                 cache: CorrectionCache | None = None,
+                 device: Hashable = None,
+                 smoother: str = "boxcar",
+                 savgol_order: int = 2) -> None:
+        self.n_pixels = int(n_pixels)
+        n = self.n_pixels
+        bin_size = max(1, int(bin_size))
+        self.optical_dark = [slice(lo, hi) for lo, hi in optical_dark_ranges or ()]
+
+        def cached(kind: str, source, compute: Callable[[], np.ndarray]) -> np.ndarray:
+            if cache is None:
+                return compute()
+            return cache.get((kind, device, n, bin_size), source, compute)
+
+        self.stray_light: np.ndarray | None = None
+        if stray_light_coef is not None:
+            def baseline() -> np.ndarray:
+                # coefficients are stored lowest order first, in the pixel
+                # index of the delivered spectrum (binned or not)
+                x = np.arange(n, dtype=float)
+                return np.polyval(np.asarray(stray_light_coef, float)[::-1], x)
+            self.stray_light = cached("stray_light", stray_light_coef, baseline)
+
+        self.irradiance: np.ndarray | None = None
+        if irradiance is not None:
+            def gain() -> np.ndarray:
+                irr = np.asarray(irradiance, dtype=float).ravel()
+                if irr.size == 1:           # uniform factor (placeholder calibration)
+                    return np.full(n, irr[0])
+                return np.array(_binned(irr, n, bin_size))
+            self.irradiance = cached("irradiance", irradiance, gain)
+
+        # fused form of stray light + irradiance
+        self._gain: np.ndarray | None = None
+        self._offset: np.ndarray | None = None
+        if self.stray_light is not None or self.irradiance is not None:
+            self._gain = self.irradiance if self.irradiance is not None else np.ones(n)
+            self._offset = (self.stray_light * self._gain if self.stray_light is not None
+                            else np.zeros(n))
+            for vec in (self._gain, self._offset):
+                vec.setflags(write=False)   # one numba signature for cached and fresh
+
+        if smoother not in SMOOTHERS:
+            raise ValueError(f"smoother must be one of {SMOOTHERS}")
+        self.boxcar_width = int(boxcar_width)
+        self.smoother = smoother
+        self._savgol: SavitzkyGolay | None = None
+        if smoother == "savgol" and self.boxcar_width > 1:
+            self._savgol = SavitzkyGolay(self.boxcar_width, savgol_order)
+
+    @classmethod
+    def from_flags(cls,
+                   n_pixels: int,
+                   flags: Mapping[str, bool],
+                   odark_ranges: Iterable[Tuple[int, int]] = (),
+                   sl_coef: Sequence[float] | None = None,
+                   irrad_coef: np.ndarray | None = None,
+                   boxcar_width: int = 1,
+                   **kwargs) -> "SpectrumPipeline":
+        """
+        Pipeline for the GUI correction flags (optical_dark, stray_light,
+        irradiance, boxcar); `kwargs` go to the constructor.
+        """
+        return cls(
+            n_pixels,
+            optical_dark_ranges=odark_ranges if flags.get("optical_dark") else None,
+            stray_light_coef=sl_coef if flags.get("stray_light") else None,
+            irradiance=irrad_coef if flags.get("irradiance") else None,
+            boxcar_width=boxcar_width if flags.get("boxcar") else 1,
+            **kwargs,
+        )
+
+    def process(self,
+                counts: np.ndarray,
+                out: np.ndarray | None = None,
+                background: np.ndarray | None = None) -> np.ndarray:
+        """
+        Corrected copy of `counts` in `out` (a float64 buffer of the same
+        size, allocated if None), with `background` subtracted last when
+        its shape matches.  `out` may be `counts` itself.
+        """
+        if counts.shape != (self.n_pixels,):
+            raise ValueError(f"spectrum has {counts.size} pixels, pipeline expects "
+                             f"{self.n_pixels}")
+        if out is None:
+            out = np.empty(self.n_pixels)
+
+        # subtracting each range's mean in turn leaves the last one's removed
+        dark = float(counts[self.optical_dark[-1]].mean()) if self.optical_dark else 0.0
+        if self._gain is not None:
+            _affine_nb(counts, dark, self._gain, self._offset, out)
+        else:
+            np.subtract(counts, dark, out=out, casting="unsafe")
+        if self._savgol is not None:
+            self._savgol.apply(out)
+        elif self.boxcar_width > 1:
+            boxcar(out, self.boxcar_width)
+        if background is not None and background.shape == out.shape:
+            out -= background
+        return out
+
+    def noise(self, variance: np.ndarray) -> np.ndarray:
+        """
+        Per-pixel standard deviation of process() output for raw counts of
+        the given `variance`, up to a factor shared by all pixels: the
+        irradiance gain is applied, while smoothing (which narrows it
+        nearly uniformly) and the background's own noise are not.  Good
+        enough for relative fit weights (AutoFit.fit(sigma=...)).
+        """
+        sigma = np.sqrt(np.maximum(variance, 0.0))
+        if self._gain is not None:
+            sigma *= np.abs(self._gain)
+        return sigma
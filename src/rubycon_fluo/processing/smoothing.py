@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import numpy as np
+from numba import njit
+
+SMOOTHERS = ("boxcar", "savgol")
+
+
+@njit(cache=True, nogil=True)
+def _boxcar_nb(x, left, right):
+    """
+    In-place moving average of x over [i − left, i + right] with a running
+    sum (constant cost per pixel for any width).  At the edges only the
+    pixels inside the array are averaged.
+    """
+    n = x.size
+    w = left + right + 1
+    ring = np.empty(w)          # original values still inside the window
+    s = 0.0
+    cnt = 0
+    for k in range(min(right, n)):
+        ring[k % w] = x[k]
+        s += x[k]
+        cnt += 1
+    for i in range(n):
+        k = i - left - 1
+        if k >= 0:
+            s -= ring[k % w]
+            cnt -= 1
+        k = i + right
+        if k < n:
+            ring[k % w] = x[k]
+            s += x[k]
+            cnt += 1
+        x[i] = s / cnt
+
+
+@njit(cache=True, nogil=True)
+def _fir_nb(x, coef, head, tail):
+    """
+    In place: x[i] = Σ coef[j]·x[i − m + j] for the interior (m = half
+    width), the first / last m pixels from the edge matrices head / tail
+    applied to the first / last window.
+    """
+    n = x.size
+    w = coef.size
+    m = w // 2
+    edge_lo = np.empty(m)
+    edge_hi = np.empty(m)
+    for r in range(m):
+        a = 0.0
+        b = 0.0
+        for j in range(w):
+            a += head[r, j] * x[j]
+            b += tail[r, j] * x[n - w + j]
+        edge_lo[r] = a
+        edge_hi[r] = b
+    ring = np.empty(m + 1)      # originals of the pixels already overwritten
+    for i in range(m, n - m):
+        a = 0.0
+        for j in range(w):
+            k = i - m + j
+            a += coef[j] * (ring[k % (m + 1)] if m <= k < i else x[k])
+        ring[i % (m + 1)] = x[i]
+        x[i] = a
+    for r in range(m):
+        x[r] = edge_lo[r]
+        x[n - m + r] = edge_hi[r]
+
+
+def boxcar(x: np.ndarray, width: int) -> np.ndarray:
+    """
+    Moving average of `width` pixels applied to the float64 array `x` in
+    place, aligned like np.convolve(x, ones(width)/width, mode="same").
+    """
+    if width > 1 and x.size:
+        _boxcar_nb(x, width // 2, (width - 1) // 2)
+    return x
+
+
+class SavitzkyGolay:
+    """
+    Savitzky–Golay smoothing with precomputed coefficients: a least-squares
+    polynomial of `order` over an odd `window` (an even one is widened by
+    one).  The first and last half-window pixels are taken from the fit to
+    the first / last full window, so the edges are not biased.
+    """
+
+    def __init__(self, window: int, order: int = 2) -> None:
+        window = int(window) | 1
+        self.window = max(window, 3)
+        self.order = max(0, min(int(order), self.window - 2))
+        m = self.window // 2
+        t = np.arange(-m, m + 1, dtype=float)
+        # rows: polynomial coefficients as linear maps of the window values
+        fit = np.linalg.pinv(np.vander(t, self.order + 1, increasing=True))
+        at = lambda pos: np.vander(pos, self.order + 1, increasing=True) @ fit
+        self.coef = np.ascontiguousarray(at(np.zeros(1))[0])
+        self.head = np.ascontiguousarray(at(t[:m]))
+        self.tail = np.ascontiguousarray(at(t[m + 1:]))
+
+    def apply(self, x: np.ndarray) -> np.ndarray:
+        """Smooth the float64 array `x` in place (shorter than a window: unchanged)."""
+        if x.size >= self.window:
+            _fir_nb(x, self.coef, self.head, self.tail)
+        return x
@@ -0,0 +1,29 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# the package is run from the source tree (no installed distribution)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+# c1, A1, w1, f1, delta, A2, w2, f2, baseline
+RUBY_TRUE = np.array([694.30, 30_000.0, 0.55, 0.4, 1.45, 15_000.0, 0.50, 0.4, 800.0])
+
+
+@pytest.fixture
+def ruby_spectrum():
+    """Noisy synthetic R1/R2 doublet: (wl, counts, true parameters)."""
+    from rubycon_fluo.fitting.auto_fit import AutoFit
+
+    rng = np.random.default_rng(7)
+    wl = np.linspace(688.0, 700.0, 600)
+    clean = AutoFit.two_peak_model(wl, *RUBY_TRUE)
+    return wl, clean + rng.normal(0.0, 30.0, wl.size), RUBY_TRUE.copy()
+
+
+@pytest.fixture(scope="session")
+def qapp():
+    """Qt core application for the QObject workers (no display needed)."""
+    QtCore = pytest.importorskip("PySide6.QtCore")
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
@@ -0,0 +1,91 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("PySide6")
+
+from rubycon_fluo.gui.controllers.acquisition import (EmaAccumulator, RollingAccumulator,
+                                                      ScanAccumulator)
+
+
+def _scans(n, pixels=64, seed=0):
+    rng = np.random.default_rng(seed)
+    return 1000.0 + 50.0 * rng.standard_normal((n, pixels))
+
+
+def test_scan_accumulator_matches_numpy():
+    frames = _scans(25)
+    acc = ScanAccumulator()
+    for k, frame in enumerate(frames, start=1):
+        acc.add(frame)
+        np.testing.assert_allclose(acc.mean, frames[:k].mean(axis=0), rtol=1e-12)
+        if k == 1:
+            assert acc.variance_of_mean() is None
+        else:
+            np.testing.assert_allclose(acc.variance_of_mean(),
+                                       frames[:k].var(axis=0, ddof=1) / k, rtol=1e-9)
+
+
+def test_scan_accumulator_reset_and_resize():
+    acc = ScanAccumulator()
+    for frame in _scans(5):
+        acc.add(frame)
+    acc.reset()
+    frames = _scans(4, seed=1)
+    for frame in frames:
+        acc.add(frame)
+    np.testing.assert_allclose(acc.mean, frames.mean(axis=0), rtol=1e-12)
+    # a different pixel count (binning changed) starts over
+    acc.add(np.arange(8.0))
+    assert acc.n == 1
+    np.testing.assert_array_equal(acc.mean, np.arange(8.0))
+
+
+def test_rolling_accumulator_matches_numpy():
+    frames = _scans(30)
+    acc = RollingAccumulator(8)
+    for k, frame in enumerate(frames, start=1):
+        acc.add(frame)
+        window = frames[max(0, k - 8):k]
+        assert acc.n == len(window)
+        np.testing.assert_allclose(acc.mean, window.mean(axis=0), rtol=1e-12)
+        if k > 1:
+            np.testing.assert_allclose(acc.variance_of_mean(),
+                                       window.var(axis=0, ddof=1) / len(window), rtol=1e-6)
+
+
+def _ema_reference(frames, window):
+    # plain-loop EMA: running mean until the weight 2/(window+1) takes over
+    alpha = 2.0 / (window + 1)
+    mean, var = frames[0].copy(), np.zeros_like(frames[0])
+    for n, x in enumerate(frames[1:], start=2):
+        a = max(alpha, 1.0 / n)
+        d = x - mean
+        mean = mean + a * d
+        var = (1.0 - a) * (var + a * d * d)
+    n_eff = min(len(frames), (2.0 - alpha) / alpha)
+    return mean, var / n_eff
+
+
+def test_ema_accumulator_matches_reference():
+    frames = _scans(40)
+    acc = EmaAccumulator(5)
+    for k, frame in enumerate(frames, start=1):
+        acc.add(frame)
+        if k in (2, 5, 40):
+            mean, var = _ema_reference(frames[:k], 5)
+            np.testing.assert_allclose(acc.mean, mean, rtol=1e-12)
+            np.testing.assert_allclose(acc.variance_of_mean(), var, rtol=1e-9)
+    # while the running-mean phase lasts it is the plain mean and variance
+    acc.reset()
+    for frame in frames[:3]:
+        acc.add(frame)
+    np.testing.assert_allclose(acc.mean, frames[:3].mean(axis=0), rtol=1e-12)
+
+
+def test_ema_noise_matches_block_average():
+    # stationary noise: the EMA's variance of the mean ≈ σ² / window
+    frames = _scans(4000, pixels=200, seed=2)
+    acc = EmaAccumulator(10)
+    for frame in frames:
+        acc.add(frame)
+    assert np.median(acc.variance_of_mean()) == pytest.approx(50.0 ** 2 / 10, rel=0.15)
@@ -0,0 +1,82 @@
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("PySide6")
+
+from rubycon_fluo.gui.controllers.acquisition import AcquisitionWorker
+
+
+class _FailingSpectrometer:
+    """Reads one frame, then the device stops answering."""
+
+    def __init__(self) -> None:
+        self.reads = 0
+
+    def set_integration_time_us(self, us: int) -> None:
+        pass
+
+    def set_scans_to_average(self, n: int) -> None:
+        pass
+
+    @property
+    def wavelengths(self) -> np.ndarray:
+        return np.linspace(690.0, 700.0, 64)
+
+    def intensities(self, **kwargs) -> np.ndarray:
+        self.reads += 1
+        if self.reads > 1:
+            raise OSError("USB transfer timed out")
+        return np.ones(64)
+
+
+def test_read_error_is_reported(qapp, caplog):
+    worker = AcquisitionWorker(_FailingSpectrometer(), 1_000, 3, continuous=False,
+                               dark_counts=False, correct_nonlinearity=False)
+    failed, spectra, finished = [], [], []
+    worker.failed.connect(failed.append)
+    worker.spectrum_ready.connect(lambda wl, x: spectra.append(x))
+    worker.finished.connect(lambda: finished.append(True))
+    worker.start()
+    assert failed == ["USB transfer timed out"]
+    assert spectra == [] and finished == [True]
+    assert "USB transfer timed out" in caplog.text
+
+
+
+def test_fast_continuous_stream(qapp):
+    pytest.importorskip("seabreeze")
+    from rubycon_fluo.device.simulator import SimulatedRubySpectrometer
+    from rubycon_fluo.device.spectrometer import SpectrometerController
+    from rubycon_fluo.gui.controllers import acquisition
+
+    ctrl = SpectrometerController(SimulatedRubySpectrometer(realtime=False, seed=1))
+    # 2 ms exposures, 100 per emitted average: per-frame progress would flood the GUI
+    worker = AcquisitionWorker(ctrl, 2_000, 100, continuous=True,
+                               dark_counts=False, correct_nonlinearity=False)
+    blocks, ticks, rates, sent = [], [], [], []
+    t0 = time.perf_counter()
+
+    def on_block(wl, x):
+        blocks.append(x)
+        sent.append(ctrl.command_stats()["sent"])
+        if time.perf_counter() - t0 >= 0.5:
+            worker.stop()
+
+    worker.spectrum_ready.connect(on_block)
+    worker.integration_tick.connect(ticks.append)
+    worker.frame_rate.connect(rates.append)
+    worker.start()
+    elapsed = time.perf_counter() - t0
+    frames = 100 * len(blocks)
+
+    assert len(blocks) >= 2
+    assert set(sent) == {1}                 # integration time sent once, repeats suppressed
+    assert ctrl.command_stats()["suppressed"] >= frames - 1
+    assert rates and rates[-1] > 0
+    # progress at most every _UI_PERIOD_S, not once per frame
+    per_frame = ticks[1:-1]
+    assert per_frame and set(per_frame) == {100}
+    assert len(per_frame) <= elapsed / acquisition._UI_PERIOD_S + 1
+    assert len(per_frame) < frames / 2
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("PySide6")
+pytest.importorskip("seabreeze")
+
+from rubycon_fluo.device.simulator import SimulatedRubySpectrometer
+from rubycon_fluo.device.spectrometer import SpectrometerController
+from rubycon_fluo.gui.controllers.acquisition_controller import (
+    AcquisitionController,
+    AutoExposure,
+)
+
+
+class _RunningWorker:
+    """Records retunes like a running continuous AcquisitionWorker."""
+
+    def __init__(self) -> None:
+        self.int_us = []
+
+    def set_integration_time_us(self, us: int) -> None:
+        self.int_us.append(us)
+
+
+def _dim_frame(n: int = 512):
+    wl = np.linspace(690.0, 700.0, n)
+    counts = 1000.0 + 3000.0 * np.exp(-0.5 * ((wl - 694.3) / 0.2) ** 2)
+    return wl, counts
+
+
+def test_auto_exposure_steps_towards_target():
+    ae = AutoExposure()
+    wl, counts = _dim_frame()
+    t = ae.next_time_us(10_000, counts, 65535.0, (1_000, 10_000_000))
+    assert t == 20_000                              # limited to max_step
+    bright = counts * 12.0
+    assert ae.next_time_us(10_000, bright, 65535.0, (1_000, 10_000_000)) == 10_000
+    clipped = np.minimum(counts * 40.0, 65535.0)
+    assert ae.next_time_us(10_000, clipped, 65535.0, (1_000, 10_000_000)) == 5_000
+
+
+def _continuous_controller(qapp):
+    sim = SimulatedRubySpectrometer(realtime=False, seed=1)
+    ctrl = AcquisitionController(SpectrometerController(sim))
+    ctrl.set_auto_exposure(True)
+    worker = _RunningWorker()
+    ctrl._continuous, ctrl._worker, ctrl._frame_int_us = True, worker, 10_000
+    changed = []
+    ctrl.integration_time_changed.connect(changed.append)
+    return ctrl, worker, changed
+
+
+def test_auto_exposure_retunes_without_background(qapp):
+    ctrl, worker, changed = _continuous_controller(qapp)
+    ctrl._handle_spectrum(*_dim_frame())
+    assert worker.int_us == [20_000] and changed == [20_000]
+
+
+def test_auto_exposure_holds_while_background_is_stored(qapp):
+    ctrl, worker, changed = _continuous_controller(qapp)
+    wl, counts = _dim_frame()
+    ctrl._handle_background(wl, np.full_like(counts, 1000.0))
+    ctrl._handle_spectrum(wl, counts)
+    assert worker.int_us == [] and changed == []
+
+    ctrl.clear_background()
+    ctrl._handle_spectrum(wl, counts)
+    assert worker.int_us == [20_000]
@@ -0,0 +1,136 @@
+import numpy as np
+import pytest
+
+from rubycon_fluo.fitting.auto_fit import AutoFit, _fit_many_nb
+from rubycon_fluo.fitting.fit_cache import FitCache
+
+
+def test_fit_many_matches_truth(ruby_spectrum):
+    wl, counts, p_true = ruby_spectrum
+    stack = np.vstack([counts, counts * 0.5])
+    popt, pcov, status, nfev = AutoFit(solver="lm").fit_many(wl, stack, 690.0, 698.0)
+    assert popt.shape == (2, 9) and pcov.shape == (2, 9, 9)
+    assert set(status) <= {1, 2, 3}
+    assert np.all(nfev > 0)
+    np.testing.assert_allclose(popt[:, 0], p_true[0], atol=2e-3)
+    np.testing.assert_allclose(popt[1, 1], 0.5 * p_true[1], rtol=0.02)
+
+
+def test_fit_many_status_codes(ruby_spectrum):
+    wl, counts, _ = ruby_spectrum
+    stack = np.vstack([counts, counts])
+    # second window holds fewer than 10 pixels
+    popt, pcov, status, nfev = AutoFit(solver="lm").fit_many(
+        wl, stack, [690.0, 694.30], [698.0, 694.35])
+    assert status[0] in (1, 2, 3)
+    assert status[1] == -1 and nfev[1] == 0
+    assert np.all(np.isnan(popt[1])) and np.all(np.isnan(pcov[1]))
+
+    # one evaluation allowed: max_nfev reached
+    lo = np.array([690.0])
+    hi = np.array([698.0])
+    _, _, status, nfev = _fit_many_nb(wl[None, :], counts[None, :], lo, hi, 1, 1e-12, 1e-12)
+    assert status[0] == 0 and nfev[0] == 1
+
+
+def test_fit_many_per_row_axes(ruby_spectrum):
+    wl, counts, p_true = ruby_spectrum
+    shifted = wl + 0.2          # same spectrum on a shifted axis: R1 moves with it
+    popt, _, status, _ = AutoFit(solver="lm").fit_many(np.vstack([wl, shifted]),
+                                                       np.vstack([counts, counts]),
+                                                       690.0, 698.0)
+    assert set(status) <= {1, 2, 3}
+    assert popt[1, 0] - popt[0, 0] == pytest.approx(0.2, abs=2e-3)
+
+
+def test_fit_many_rejects_mismatched_axis(ruby_spectrum):
+    wl, counts, _ = ruby_spectrum
+    with pytest.raises(ValueError):
+        AutoFit(solver="lm").fit_many(wl[:-1], counts, 690.0, 698.0)
+
+
+@pytest.mark.parametrize("kwargs", [dict(), dict(solver="lm", mode="varpro"),
+                                    dict(solver="lm", guess="argmax"),
+                                    dict(solver="lm", cache=FitCache())])
+def test_fit_many_rejects_options_it_cannot_honour(ruby_spectrum, kwargs):
+    wl, counts, _ = ruby_spectrum
+    with pytest.raises(ValueError):
+        AutoFit(**kwargs).fit_many(wl, counts, 690.0, 698.0)
+
+
+def test_fit_many_matches_single_lm_fit(ruby_spectrum):
+    wl, counts, _ = ruby_spectrum
+    af = AutoFit(solver="lm")
+    p_one, _ = af.fit(wl, counts, 690.0, 698.0)
+    popt, _, _, nfev = af.fit_many(wl, counts, 690.0, 698.0)
+    np.testing.assert_allclose(popt[0], p_one, rtol=1e-9, atol=1e-9)
+    assert nfev[0] == af.last_nfev
+
+
+def test_lm_agrees_with_trf(ruby_spectrum):
+    wl, counts, p_true = ruby_spectrum
+    p_trf, cov_trf = AutoFit(solver="trf").fit(wl, counts, 690.0, 698.0)
+    p_lm, cov_lm = AutoFit(solver="lm").fit(wl, counts, 690.0, 698.0)
+    np.testing.assert_allclose(p_lm, p_trf, rtol=1e-4, atol=1e-6)
+    np.testing.assert_allclose(np.sqrt(np.diag(cov_lm)), np.sqrt(np.diag(cov_trf)), rtol=1e-2)
+    assert p_lm[0] == pytest.approx(p_true[0], abs=2e-3)
+
+
+def test_unknown_options_rejected():
+    for kwargs in (dict(solver="x"), dict(mode="x"), dict(guess="x")):
+        with pytest.raises(ValueError):
+            AutoFit(**kwargs)
+
+
+@pytest.mark.parametrize("solver", AutoFit.SOLVERS)
+def test_varpro_agrees_with_full(ruby_spectrum, solver):
+    wl, counts, _ = ruby_spectrum
+    p_full, cov_full = AutoFit(solver=solver).fit(wl, counts, 690.0, 698.0)
+    p_vp, cov_vp = AutoFit(solver=solver, mode="varpro").fit(wl, counts, 690.0, 698.0)
+    assert p_vp.shape == (9,) and cov_vp.shape == (9, 9)
+    np.testing.assert_allclose(p_vp, p_full, rtol=1e-4, atol=1e-6)
+    np.testing.assert_allclose(np.diag(cov_vp), np.diag(cov_full), rtol=2e-2)
+
+
+def test_fused_kernel_matches_separate(ruby_spectrum):
+    from rubycon_fluo.fitting.auto_fit import jac_nb, residual_jac_nb, residual_nb
+
+    wl, counts, p_true = ruby_spectrum
+    p = p_true * 1.01
+    r = np.empty(wl.size)
+    J = np.empty((wl.size, 9))
+    residual_jac_nb(p, wl, counts, r, J)
+    np.testing.assert_allclose(r, residual_nb(p, wl, counts), rtol=1e-9, atol=1e-6)
+    np.testing.assert_allclose(J, jac_nb(p, wl, counts), rtol=1e-7, atol=1e-6)
+
+
+@pytest.mark.parametrize("solver", AutoFit.SOLVERS)
+def test_uniform_sigma_matches_unweighted(ruby_spectrum, solver):
+    wl, counts, _ = ruby_spectrum
+    p_plain, cov_plain = AutoFit(solver=solver).fit(wl, counts, 690.0, 698.0)
+    p_w, cov_w = AutoFit(solver=solver).fit(wl, counts, 690.0, 698.0,
+                                            sigma=np.full(wl.size, 30.0))
+    np.testing.assert_allclose(p_w, p_plain, rtol=1e-6, atol=1e-8)
+    # pcov is scaled by the reduced χ², so a common factor in σ drops out
+    np.testing.assert_allclose(np.diag(cov_w), np.diag(cov_plain), rtol=1e-4)
+
+
+def test_weighted_fit_follows_sigma(ruby_spectrum):
+    wl, _, p_true = ruby_spectrum
+    rng = np.random.default_rng(3)
+    clean = AutoFit.two_peak_model(wl, *p_true)
+    sigma = np.where(wl < 694.0, 5.0, 500.0)          # blue half 100× quieter
+    counts = clean + rng.normal(0.0, 1.0, wl.size) * sigma
+    sigma[10] = 0.0                                   # no weight → pixel dropped
+    counts[10] = 1e9
+    p_lm, _ = AutoFit(solver="lm").fit(wl, counts, 690.0, 698.0, sigma=sigma)
+    p_trf, _ = AutoFit(solver="trf").fit(wl, counts, 690.0, 698.0, sigma=sigma)
+    np.testing.assert_allclose(p_lm, p_trf, rtol=1e-4, atol=1e-6)
+    # R2 sits in the quiet half and is pinned down by it
+    assert p_lm[0] - p_lm[4] == pytest.approx(p_true[0] - p_true[4], abs=2e-3)
+
+
+def test_sigma_shape_checked(ruby_spectrum):
+    wl, counts, _ = ruby_spectrum
+    with pytest.raises(ValueError):
+        AutoFit().fit(wl, counts, 690.0, 698.0, sigma=np.ones(wl.size - 1))
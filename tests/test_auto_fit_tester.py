@@ -0,0 +1,31 @@
+import sys
+
+import pytest
+
+pytest.importorskip("matplotlib")
+pytest.importorskip("tqdm")
+
+from rubycon_fluo.fitting.auto_fit_tester import SyntheticSpectrumTester
+
+
+def _tester():
+    return SyntheticSpectrumTester(center=694.2, amplitude1=100.0, fwhm1=0.8, frac1=0.3,
+                                   delta=1.4, baseline=10.0, read_noise_std=5.0,
+                                   lo=685, hi=700)
+
+
+def test_benchmark_kernels_reports_allocations(capsys):
+    _tester().benchmark_kernels(n_calls=10)
+    out = capsys.readouterr().out
+    assert "allocations/eval" in out
+
+
+def test_benchmark_kernels_without_nrt_stats(monkeypatch, capsys):
+    # a numba release without the private NRT module: timing only
+    import numba.core.runtime as runtime
+
+    monkeypatch.delattr(runtime, "_nrt_python", raising=False)
+    monkeypatch.setitem(sys.modules, "numba.core.runtime._nrt_python", None)
+    _tester().benchmark_kernels(n_calls=10)
+    out = capsys.readouterr().out
+    assert "µs/eval" in out and "allocations/eval" not in out
@@ -0,0 +1,117 @@
+import time
+
+import numpy as np
+import pytest
+
+pytest.importorskip("PySide6")
+
+from rubycon_fluo.fitting.auto_fit import AutoFit
+from rubycon_fluo.fitting.auto_fit_worker import AutoFitService, AutoFitWorker
+from conftest import RUBY_TRUE
+
+LO, HI = 690.0, 698.0
+
+
+def _frames(n):
+    # clean doublets whose baseline tells the frames apart
+    wl = np.linspace(688.0, 700.0, 600)
+    clean = AutoFit.two_peak_model(wl, *RUBY_TRUE)
+    return wl, [clean + 100.0 * i for i in range(n)]
+
+
+def _record(worker):
+    out = {"finished": [], "partial": [], "failed": 0}
+    worker.fit_finished.connect(lambda p, c: out["finished"].append(p))
+    worker.fit_partial.connect(lambda p, c: out["partial"].append(p))
+    worker.fit_failed.connect(lambda: out.__setitem__("failed", out["failed"] + 1))
+    return out
+
+
+def test_latest_frame_wins(qapp):
+    wl, frames = _frames(20)
+    worker = AutoFitWorker()
+    out = _record(worker)
+    # hold the wake-ups, as a busy worker thread would, while frames pour in
+    worker.blockSignals(True)
+    for cnt in frames:
+        worker.submit(wl, cnt, LO, HI)
+    worker.blockSignals(False)
+    worker.run()
+    worker.run()                                    # later wake-ups find no job
+    assert len(out["finished"]) == 1 and not out["partial"] and not out["failed"]
+    assert out["finished"][0][8] == pytest.approx(800.0 + 100.0 * 19, abs=1.0)
+
+
+def test_stop_silences_running_fit(qapp):
+    wl, frames = _frames(1)
+    worker = AutoFitWorker()
+    out = _record(worker)
+    budgets = []
+    fit = worker._fitter.fit
+
+    def fit_then_stop(*args, **kwargs):
+        worker.stop()                               # the GUI cancels mid-fit
+        budgets.append(kwargs["budget"])
+        return fit(*args, **kwargs)
+
+    worker._fitter.fit = fit_then_stop
+    worker.blockSignals(True)
+    worker.submit(wl, frames[0], LO, HI)
+    worker.blockSignals(False)
+    worker.run()
+    assert budgets[0].expired()                     # the solver was told to stop
+    assert out == {"finished": [], "partial": [], "failed": 0}
+
+
+def test_stop_drops_queued_frame(qapp):
+    wl, frames = _frames(1)
+    worker = AutoFitWorker()
+    out = _record(worker)
+    worker.blockSignals(True)
+    worker.submit(wl, frames[0], LO, HI)
+    worker.stop()
+    worker.blockSignals(False)
+    worker.run()
+    assert out == {"finished": [], "partial": [], "failed": 0}
+
+
+def test_tiny_budget_reports_partial(qapp):
+    wl, frames = _frames(1)
+    worker = AutoFitWorker(time_budget_s=1e-9)
+    out = _record(worker)
+    worker.submit(wl, frames[0], LO, HI)            # same thread: runs right away
+    assert len(out["partial"]) == 1 and not out["finished"]
+    assert np.all(np.isfinite(out["partial"][0]))
+
+
+def test_failed_fit_is_reported(qapp):
+    wl, frames = _frames(1)
+    worker = AutoFitWorker()
+    out = _record(worker)
+    worker.submit(wl, frames[0], 1.0, 2.0)          # no data in the window
+    assert out["failed"] == 1 and not out["finished"]
+
+
+def test_service_fits_latest_frame_and_shuts_down(qapp):
+    wl, frames = _frames(20)
+    service = AutoFitService()
+    results = []
+    service.fit_finished.connect(lambda p, c: results.append(p))
+    for cnt in frames:
+        service.submit(wl, cnt, LO, HI)
+    deadline = time.monotonic() + 60.0
+    while time.monotonic() < deadline:
+        qapp.processEvents()
+        if results and results[-1][8] > 800.0 + 100.0 * 18.5:
+            break
+        time.sleep(0.01)
+    # the frame being fitted when the burst arrived, if any, plus the last one
+    assert 1 <= len(results) <= 2
+    assert results[-1][8] == pytest.approx(800.0 + 100.0 * 19, abs=1.0)
+
+    thread = service._thread
+    service.shutdown()
+    assert thread.isFinished()
+    service.shutdown()                              # idempotent
+    service.submit(wl, frames[0], LO, HI)           # ignored after shutdown
+    service.cancel()
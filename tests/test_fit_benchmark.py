@@ -0,0 +1,43 @@
+import copy
+
+import pytest
+
+from rubycon_fluo.fitting.fit_benchmark import compare_results, run_benchmark
+
+
+@pytest.fixture(scope="module")
+def baseline(tmp_path_factory):
+    out = tmp_path_factory.mktemp("bench") / "base.json"
+    return run_benchmark(out, workers=1, n_points=5, repeats=2, seed=3)
+
+
+def test_good_fits_score_reduced_chi2_near_one(baseline):
+    s = baseline["summary"]
+    assert s["failures"] == 0 and s["n"] == 50
+    assert s["rchi2_median"] == pytest.approx(1.0, abs=0.2)
+    assert baseline["meta"]["rchi2_sigma"] == "shot+read"
+
+
+def test_compare_passes_identical_runs(baseline):
+    assert compare_results(baseline, copy.deepcopy(baseline)) == []
+
+
+def test_compare_flags_regressions(baseline, capsys):
+    new = copy.deepcopy(baseline)
+    for rec in new["results"]:
+        rec["nfev"] = rec["nfev"] * 2
+        rec["rchi2"] = rec["rchi2"] * 1.5
+    new["results"][0].update(ok=False, error="diverged")
+    problems = compare_results(baseline, new)
+    text = " ".join(problems)
+    assert "failures 0 → 1" in text
+    assert "mean nfev" in text
+    assert "reduced χ²" in text
+    assert "REGRESSION" in capsys.readouterr().out
+
+
+def test_compare_warns_about_other_chi2_definition(baseline, capsys):
+    old = copy.deepcopy(baseline)
+    del old["meta"]["rchi2_sigma"]
+    compare_results(old, baseline)
+    assert "'rchi2_sigma' differs" in capsys.readouterr().out
@@ -0,0 +1,49 @@
+import numpy as np
+from rubycon_fluo.fitting.auto_fit import AutoFit, bounds_nb, lm_solve_nb, residual_nb
+from rubycon_fluo.fitting.fit_budget import FitBudget
+from rubycon_fluo.fitting.fit_cache import FitCache
+from rubycon_fluo.fitting.lm_solver import lm_fit_budgeted
+from rubycon_fluo.fitting.peak_estimate import estimate_two_peak_nb
+
+
+def test_budget_expiry():
+    assert not FitBudget().expired()
+    assert FitBudget(0.0).expired()
+    budget = FitBudget(60.0)
+    budget.cancel()
+    assert budget.cancelled and budget.expired()
+
+
+def test_cancelled_trf_fit_returns_partial(ruby_spectrum):
+    wl, counts, _ = ruby_spectrum
+    budget = FitBudget()
+    budget.cancel()
+    cache = FitCache()
+    af = AutoFit(solver="trf", guess="argmax", cache=cache)
+    popt, pcov = af.fit(wl, counts, 690.0, 698.0, budget=budget)
+    assert af.last_partial
+    assert popt.shape == (9,) and pcov.shape == (9, 9)
+    assert np.all(np.isfinite(popt))
+    assert cache.stats()["size"] == 0           # partial results are not cached
+
+    full = AutoFit(solver="trf", guess="argmax")
+    full.fit(wl, counts, 690.0, 698.0)
+    assert not full.last_partial
+    assert af.last_nfev < full.last_nfev
+
+
+def test_budgeted_lm_stops_between_slices(ruby_spectrum):
+    # AutoFit(solver="lm") tends to converge within its first slice, so
+    # drive the slices directly with a tiny chunk
+    wl, counts, _ = ruby_spectrum
+    mask = (wl >= 690.0) & (wl <= 698.0)
+    x, y = wl[mask], counts[mask]
+    lower, upper = bounds_nb(690.0, 698.0)
+    p0 = estimate_two_peak_nb(x, y, lower[4], upper[4]) * 1.002
+    budget = FitBudget()
+    budget.cancel()
+    p, pcov, nfev, status, partial = lm_fit_budgeted(
+        lm_solve_nb, p0, lower, upper, x, y, 5000, 1e-12, 1e-12, budget, chunk_nfev=2)
+    assert partial and status == 0 and nfev == 2
+    # LM only accepts downhill steps: never worse than the start
+    assert np.sum(residual_nb(p, x, y) ** 2) <= np.sum(residual_nb(p0, x, y) ** 2)
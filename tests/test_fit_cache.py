@@ -0,0 +1,106 @@
+import numpy as np
+
+from rubycon_fluo.fitting.auto_fit import AutoFit
+from rubycon_fluo.fitting.fit_cache import FitCache
+
+
+def _entry(cache, counts, wl=np.arange(4.0)):
+    return cache.key(wl, np.asarray(counts, dtype=float), 0.0, 3.0, ("opt",))
+
+
+def test_hit_miss_and_copies():
+    cache = FitCache()
+    key = _entry(cache, [1, 2, 3, 4])
+    assert cache.get(key) is None
+    cache.put(key, np.ones(9), np.eye(9))
+    popt, pcov = cache.get(key)
+    popt[:] = 0.0                       # callers get copies
+    again, _ = cache.get(key)
+    assert np.all(again == 1.0)
+    assert cache.stats() == dict(hits=2, misses=1, hit_rate=2 / 3, size=1, maxsize=32)
+
+
+def test_key_depends_on_every_input():
+    cache = FitCache()
+    wl = np.arange(4.0)
+    counts = np.array([1.0, 2.0, 3.0, 4.0])
+    base = cache.key(wl, counts, 0.0, 3.0, ("a",))
+    assert cache.key(wl.copy(), counts.copy(), 0.0, 3.0, ("a",)) == base
+    assert cache.key(wl + 1.0, counts, 0.0, 3.0, ("a",)) != base
+    assert cache.key(wl, counts + 1.0, 0.0, 3.0, ("a",)) != base
+    assert cache.key(wl, counts, 0.5, 3.0, ("a",)) != base
+    assert cache.key(wl, counts, 0.0, 3.0, ("b",)) != base
+    assert cache.key(wl, counts.astype(np.float32), 0.0, 3.0, ("a",)) != base
+
+
+def test_lru_eviction():
+    cache = FitCache(maxsize=2)
+    keys = [_entry(cache, [k, 0, 0, 0]) for k in range(3)]
+    cache.put(keys[0], np.zeros(9), np.zeros((9, 9)))
+    cache.put(keys[1], np.ones(9), np.zeros((9, 9)))
+    assert cache.get(keys[0]) is not None       # 0 is now the most recent
+    cache.put(keys[2], np.full(9, 2.0), np.zeros((9, 9)))
+    assert cache.get(keys[1]) is None           # least recently used went
+    assert cache.get(keys[0]) is not None and cache.get(keys[2]) is not None
+    assert cache.stats()["size"] == 2
+    cache.clear()
+    assert cache.stats()["size"] == 0 and cache.get(keys[0]) is None
+
+
+def test_autofit_uses_cache(ruby_spectrum):
+    wl, counts, _ = ruby_spectrum
+    af = AutoFit(cache=FitCache())
+    p1, _ = af.fit(wl, counts, 690.0, 698.0)
+    assert not af.last_cache_hit and af.last_nfev > 0
+    p2, _ = af.fit(wl, counts.copy(), 690.0, 698.0)
+    assert af.last_cache_hit and af.last_nfev == 0
+    np.testing.assert_array_equal(p1, p2)
+    af.fit(wl, counts, 690.0, 697.0)            # another window is a miss
+    assert not af.last_cache_hit
+
+
+def test_key_depends_on_sigma(ruby_spectrum):
+    wl, counts, _ = ruby_spectrum
+    cache = FitCache()
+    plain = cache.key(wl, counts, 690.0, 698.0, ("auto",))
+    ones = cache.key(wl, counts, 690.0, 698.0, ("auto",), sigma=np.ones(wl.size))
+    assert plain != ones
+    assert ones == cache.key(wl, counts, 690.0, 698.0, ("auto",), sigma=np.ones(wl.size))
+    assert ones != cache.key(wl, counts, 690.0, 698.0, ("auto",), sigma=np.full(wl.size, 2.0))
+
+
+def _count_digests(cache, monkeypatch):
+    calls = []
+    digest = FitCache._digest
+
+    def counting(a):
+        calls.append(a)
+        return digest(a)
+
+    monkeypatch.setattr(cache, "_digest", counting)
+    return calls
+
+
+def test_same_axis_object_reuses_its_digest(monkeypatch):
+    cache = FitCache()
+    calls = _count_digests(cache, monkeypatch)
+    wl = np.linspace(690.0, 700.0, 50)
+    counts = np.ones(50)
+    k1 = cache.key(wl, counts, 690.0, 700.0, ("opt",))
+    assert len(calls) == 2                          # counts and the axis
+    k2 = cache.key(wl, counts, 690.0, 700.0, ("opt",))
+    assert len(calls) == 3                          # counts only
+    assert k1 == k2
+
+
+def test_equal_axis_gives_equal_key_other_axis_differs(monkeypatch):
+    cache = FitCache()
+    calls = _count_digests(cache, monkeypatch)
+    wl = np.linspace(690.0, 700.0, 50)
+    counts = np.ones(50)
+    k1 = cache.key(wl, counts, 690.0, 700.0, ("opt",))
+    k2 = cache.key(wl.copy(), counts, 690.0, 700.0, ("opt",))
+    assert len(calls) == 4                          # a new object is digested again
+    assert k1 == k2
+    k3 = cache.key(wl + 0.01, counts, 690.0, 700.0, ("opt",))
+    assert k3 != k1
@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from rubycon_fluo.processing.nonlinearity import NonlinearityLUT
+
+# a typical EEPROM polynomial: a few per cent low at the top of the range
+COEF = [0.98, 2.0e-6, -5.0e-11, 1.0e-16]
+
+
+def test_lut_matches_polyval():
+    lut = NonlinearityLUT(COEF, 65535.0)
+    rng = np.random.default_rng(0)
+    counts = np.concatenate([np.arange(0.0, 65536.0, 97.0), rng.uniform(0.0, 65535.0, 5000)])
+    expected = counts / np.polyval(COEF[::-1], counts)
+    np.testing.assert_allclose(lut.apply(counts), expected, rtol=1e-10)
+    np.testing.assert_allclose(lut.polynomial(counts), expected, rtol=1e-14)
+
+
+def test_lut_in_place_and_integer_input():
+    lut = NonlinearityLUT(COEF, 65535.0)
+    raw = np.array([0, 100, 30000, 65535], dtype=np.uint16)
+    expected = raw / np.polyval(COEF[::-1], raw.astype(float))
+    np.testing.assert_allclose(lut.apply(raw), expected, rtol=1e-12)
+    buf = raw.astype(float)
+    assert lut.apply(buf, out=buf) is buf
+    np.testing.assert_allclose(buf, expected, rtol=1e-12)
+
+
+def test_lut_edges():
+    lut = NonlinearityLUT(COEF, 1000.0)
+    # beyond the table the end values are used
+    assert lut.apply(np.array([2000.0]))[0] == pytest.approx(2000.0 * lut.gain[-1])
+    assert lut.apply(np.array([-5.0]))[0] == pytest.approx(-5.0 * lut.gain[0])
+    # a non-positive polynomial value is left uncorrected
+    bad = NonlinearityLUT([1.0, -0.01], 200.0)
+    np.testing.assert_array_equal(bad.apply(np.array([150.0])), [150.0])
+
+
+def test_is_identity():
+    assert NonlinearityLUT.is_identity(np.ones(1))
+    assert NonlinearityLUT.is_identity([1.0, 0.0, 0.0])
+    assert NonlinearityLUT.is_identity([])
+    assert not NonlinearityLUT.is_identity(COEF)
+
+
+def test_compare_reports_both_paths():
+    cost = NonlinearityLUT(COEF, 65535.0).compare(2048, repeats=3)
+    assert set(cost) == {"software", "polynomial"}
+    assert all(t > 0.0 for t in cost.values())
+
+
+class TestControllerModes:
+    @pytest.fixture
+    def ctrl(self):
+        pytest.importorskip("seabreeze")
+        from rubycon_fluo.device.simulator import SimulatedRubySpectrometer
+        from rubycon_fluo.device.spectrometer import SpectrometerController
+
+        sim = SimulatedRubySpectrometer(realtime=False, seed=1)
+        frame = np.linspace(0.0, 60000.0, sim.wavelengths().size)
+        reads = []
+
+        def intensities(**kwargs):
+            reads.append(kwargs)
+            return frame.copy()
+
+        sim.intensities = intensities
+        ctrl = SpectrometerController(sim)
+        ctrl.reads, ctrl.frame = reads, frame
+        return ctrl
+
+    def test_modes(self, ctrl):
+        from rubycon_fluo.device.spectrometer import NONLINEARITY_MODES
+
+        assert NONLINEARITY_MODES == ("device", "software", "auto")
+        with pytest.raises(ValueError):
+            ctrl.set_nonlinearity_mode("gpu")
+
+        ctrl.set_nonlinearity_coefficients(COEF)
+        ctrl.set_nonlinearity_mode("software")
+        assert ctrl.nonlinearity_mode == "software"
+        got = ctrl.intensities(correct_nonlinearity=True)
+        assert ctrl.reads[-1] == {"correct_nonlinearity": False}     # backend bypassed
+        np.testing.assert_allclose(got, ctrl.frame / np.polyval(COEF[::-1], ctrl.frame),
+                                   rtol=1e-10)
+        # without correct_nonlinearity the table is not applied
+        np.testing.assert_array_equal(ctrl.intensities(), ctrl.frame)
+
+        ctrl.set_nonlinearity_mode("device")
+        assert ctrl.nonlinearity_mode == "device"
+        np.testing.assert_array_equal(ctrl.intensities(correct_nonlinearity=True), ctrl.frame)
+        assert ctrl.reads[-1] == {"correct_nonlinearity": True}
+
+        # no calibration: always the backend
+        ctrl.set_nonlinearity_mode("software")
+        ctrl.set_nonlinearity_coefficients(np.ones(1))
+        assert ctrl.nonlinearity_mode == "device"
+
+    def test_auto_times_in_background(self, ctrl):
+        ctrl.set_nonlinearity_mode("auto")
+        ctrl.set_nonlinearity_coefficients(COEF)
+        thread = ctrl._nl_thread
+        assert thread is not None
+        thread.join(timeout=60)
+        assert not thread.is_alive()
+        assert ctrl.nonlinearity_mode in ("software", "device")
+
+        # a stale timing does not override a later choice
+        ctrl.set_nonlinearity_mode("auto")
+        ctrl.set_nonlinearity_mode("device")
+        ctrl._nl_thread.join(timeout=60)
+        assert ctrl.nonlinearity_mode == "device"
@@ -0,0 +1,78 @@
+import pytest
+
+pytest.importorskip("PySide6")
+pytest.importorskip("seabreeze")
+
+from rubycon_fluo.device.simulator import SimulatedRubySpectrometer
+from rubycon_fluo.device.spectrometer import SpectrometerController
+from rubycon_fluo.gui.dialogs.optimize_integration import OptimizeWorker
+
+FULL = 65535.0
+MAX_US = SimulatedRubySpectrometer._MAX_US
+
+
+def _optimize(peak_rate):
+    """Run the search on the test thread; (points, result, exposures sent)."""
+    sim = SimulatedRubySpectrometer(realtime=False, seed=1, cosmic_rate=0.0, peak_rate=peak_rate)
+    worker = OptimizeWorker(SpectrometerController(sim), {})
+    progress, finished = [], []
+    worker.progress.connect(lambda ms, c: progress.append((ms, c)))
+    worker.finished_scan.connect(lambda points, result: finished.append((points, result)))
+    worker.run()
+    assert len(finished) == 1
+    points, result = finished[0]
+    assert points == progress
+    assert result["exposures"] == len(points)
+    assert result["full_scale"] == FULL
+    return points, result
+
+
+def _final_peak(points, result):
+    return dict(points)[result["optimal_us"] / 1_000]
+
+
+def _in_band(counts):
+    band = OptimizeWorker.TOLERANCE * FULL
+    return abs(counts - OptimizeWorker.TARGET * FULL) <= band
+
+
+def test_bright_source_converges_in_few_exposures(qapp):
+    points, result = _optimize(2.0e5)
+    assert 3 <= result["exposures"] <= 4
+    assert result["reached"]
+    assert _in_band(_final_peak(points, result))
+    assert result["optimal_ms"] == round(result["optimal_us"] / 1_000)
+    assert result["rate"] > 0
+
+
+def test_dim_source_steps_up_to_the_target(qapp):
+    points, result = _optimize(2.0e4)
+    assert result["exposures"] == 4
+    assert [ms for ms, _ in points[:3]] == [10.0, 20.0, 160.0]     # ×8 step-up
+    assert result["reached"]
+    assert _in_band(_final_peak(points, result))
+
+
+def test_saturated_first_probe_steps_down(qapp):
+    points, result = _optimize(1.0e7)
+    assert points[0] == (10.0, FULL)
+    assert points[1][0] == 1.0                                      # ÷10 step-down
+    assert result["exposures"] == 4
+    assert result["reached"]
+    assert _in_band(_final_peak(points, result))
+
+
+@pytest.mark.parametrize("peak_rate", [2.0e3, 5.0e2])
+def test_too_weak_source_stops_at_the_limit(qapp, peak_rate):
+    points, result = _optimize(peak_rate)
+    assert result["exposures"] == 5
+    assert result["optimal_us"] == MAX_US and points[-1][0] == MAX_US / 1_000
+    assert not result["reached"]
+    assert _final_peak(points, result) < OptimizeWorker.TARGET * FULL
+
+
+def test_too_bright_source_reports_the_minimum(qapp):
+    points, result = _optimize(1.0e8)
+    assert all(c == FULL for _, c in points)
+    assert result["optimal_us"] == SimulatedRubySpectrometer._MIN_US
+    assert not result["reached"]
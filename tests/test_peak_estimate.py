@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from rubycon_fluo.fitting.auto_fit import AutoFit
+from rubycon_fluo.fitting.peak_estimate import estimate_peak_nb, estimate_two_peak_nb
+from rubycon_fluo.fitting.voigt_fitter import VoigtFitter
+
+
+def _window(wl, counts, lo=690.0, hi=698.0):
+    mask = (wl >= lo) & (wl <= hi)
+    return wl[mask], counts[mask].copy()
+
+
+def test_two_peak_estimate_close_to_truth(ruby_spectrum):
+    x, y = _window(*ruby_spectrum[:2])
+    p_true = ruby_spectrum[2]
+    p0 = estimate_two_peak_nb(x, y, 0.5, 2.5)
+    assert p0[0] == pytest.approx(p_true[0], abs=0.02)
+    assert p0[4] == pytest.approx(p_true[4], abs=0.05)
+    assert p0[1] == pytest.approx(p_true[1], rel=0.1)
+    assert p0[8] == pytest.approx(p_true[8], rel=0.2)
+
+
+def test_estimates_skip_nan_pixels(ruby_spectrum):
+    x, y = _window(*ruby_spectrum[:2])
+    ref_peak = estimate_peak_nb(x, y, 0.0)
+    ref_two = estimate_two_peak_nb(x, y, 0.5, 2.5)
+    y[[5, 40, np.argmax(y) + 3]] = np.nan
+    peak = estimate_peak_nb(x, y, 0.0)
+    two = estimate_two_peak_nb(x, y, 0.5, 2.5)
+    assert np.all(np.isfinite(peak)) and np.all(np.isfinite(two))
+    assert peak[0] == pytest.approx(ref_peak[0], abs=0.01)
+    assert peak[2] == pytest.approx(ref_peak[2], rel=0.1)
+    assert two[0] == pytest.approx(ref_two[0], abs=0.01)
+
+    nothing = np.full_like(y, np.nan)
+    assert np.isnan(estimate_peak_nb(x, nothing, 0.0)[0])
+    assert np.all(np.isnan(estimate_two_peak_nb(x, nothing, 0.5, 2.5)))
+
+
+@pytest.mark.parametrize("solver", VoigtFitter.SOLVERS)
+def test_fits_tolerate_nan_pixels(ruby_spectrum, solver):
+    wl, counts, p_true = ruby_spectrum
+    bad = counts.copy()
+    bad[np.argmax(counts) + 3] = np.nan
+
+    popt, _ = AutoFit(solver=solver).fit(wl, bad, 690.0, 698.0)
+    assert popt[0] == pytest.approx(p_true[0], abs=2e-3)
+    popt, _, status, _ = AutoFit(solver="lm").fit_many(wl, bad, 690.0, 698.0)
+    assert status[0] in (1, 2, 3)
+    assert popt[0, 0] == pytest.approx(p_true[0], abs=2e-3)
+
+    x, y = _window(wl, bad, 693.6, 695.0)
+    popt, _ = VoigtFitter(solver=solver).fit(x, y)
+    assert np.all(np.isfinite(popt))
+    assert popt[0] == pytest.approx(p_true[0], abs=0.02)
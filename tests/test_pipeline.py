@@ -0,0 +1,118 @@
+import itertools
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from rubycon_fluo.processing.pipeline import SpectrumPipeline
+
+
+def test_noise_follows_irradiance_gain():
+    n = 50
+    var = np.linspace(1.0, 100.0, n)
+    gain = np.linspace(0.5, 2.0, n)
+    np.testing.assert_allclose(SpectrumPipeline(n).noise(var), np.sqrt(var))
+    np.testing.assert_allclose(SpectrumPipeline(n, irradiance=gain).noise(var),
+                               np.sqrt(var) * gain)
+    # round-off can leave tiny negative variances
+    assert SpectrumPipeline(n).noise(np.full(n, -1e-12)).min() == 0.0
+
+
+def _main_window_reference(raw, flags, odark, sl_coef, irrad, width, background):
+    # the correction steps as the main window applied them before SpectrumPipeline
+    proc = raw.astype(float)
+    if flags["optical_dark"]:
+        for lo, hi in odark:
+            proc -= proc[lo:hi].mean()
+    if flags["stray_light"]:
+        x = np.arange(proc.size)
+        proc -= np.polyval(sl_coef[::-1], x)
+    if flags["irradiance"]:
+        proc *= irrad
+    if flags["boxcar"] and width > 1:
+        window = np.ones(width) / width
+        proc = np.convolve(proc, window, mode="same")
+    if background is not None and background.shape == proc.shape:
+        proc -= background
+    return proc
+
+
+@pytest.mark.parametrize("flags", [
+    dict(zip(("optical_dark", "stray_light", "irradiance", "boxcar"), bits))
+    for bits in itertools.product((False, True), repeat=4)
+])
+def test_process_matches_main_window_order(flags):
+    n, width = 300, 7
+    rng = np.random.default_rng(5)
+    raw = rng.integers(900, 4000, n).astype(np.uint16)
+    odark = [(0, 10), (n - 10, n)]
+    sl_coef = [12.0, 0.05, -1e-4]
+    irrad = np.linspace(0.8, 1.3, n)
+    background = rng.normal(50.0, 5.0, n)
+
+    pipe = SpectrumPipeline.from_flags(n, flags, odark, sl_coef, irrad, width)
+    expected = _main_window_reference(raw, flags, odark, sl_coef, irrad, width, background)
+    got = pipe.process(raw, background=background)
+    # np.convolve zero-pads; the pipeline averages only pixels inside the array
+    inner = slice(width // 2, n - width // 2) if flags["boxcar"] else slice(None)
+    np.testing.assert_allclose(got[inner], expected[inner], rtol=1e-12, atol=1e-9)
+
+    # in place into a reused float buffer gives the same result
+    buf = raw.astype(float)
+    pipe.process(buf, out=buf, background=background)
+    np.testing.assert_allclose(buf, got, rtol=1e-12, atol=1e-9)
+
+
+def test_boxcar_edges_average_inside_pixels():
+    pipe = SpectrumPipeline(20, boxcar_width=5)
+    out = pipe.process(np.full(20, 10.0))
+    np.testing.assert_allclose(out, 10.0)       # np.convolve would droop at both ends
+
+
+def test_background_of_other_size_is_ignored():
+    pipe = SpectrumPipeline(10)
+    np.testing.assert_array_equal(pipe.process(np.arange(10.0), background=np.ones(9)),
+                                  np.arange(10.0))
+
+
+def test_binned_stray_light_keeps_pixel_index():
+    # the polynomial is in the index of the delivered pixels, binned or not
+    n, coef = 100, [12.0, 0.05, -1e-4]
+    raw = np.full(n, 1000.0)
+    expected = raw - np.polyval(coef[::-1], np.arange(n))
+    for bin_size in (1, 4):
+        got = SpectrumPipeline(n, stray_light_coef=coef, bin_size=bin_size).process(raw)
+        np.testing.assert_allclose(got, expected, rtol=1e-12)
+
+
+def test_binned_irradiance_is_averaged_per_bin():
+    irr = np.linspace(1.0, 2.0, 400)
+    pipe = SpectrumPipeline(100, irradiance=irr, bin_size=4)
+    np.testing.assert_allclose(pipe.process(np.ones(100)), irr.reshape(100, 4).mean(axis=1))
+    with pytest.raises(ValueError):
+        SpectrumPipeline(100, irradiance=irr[:300], bin_size=4)     # too short
+
+
+def test_main_window_pipeline_with_controller(qapp):
+    pytest.importorskip("PySide6.QtWebEngineWidgets")
+    from rubycon_fluo.device.simulator import SimulatedRubySpectrometer
+    from rubycon_fluo.device.spectrometer import SpectrometerController
+    from rubycon_fluo.gui.controllers.main_window_controller import MainWindowController
+    from rubycon_fluo.processing.pipeline import CorrectionCache
+
+    ctrl = SpectrometerController(SimulatedRubySpectrometer(realtime=False, seed=1))
+    n = ctrl.wavelengths.size
+    window = SimpleNamespace(
+        _flags={"optical_dark": False, "stray_light": True, "irradiance": True,
+                "boxcar": False},
+        _odark=[], _sl_coef=np.array([5.0, 0.01]), _irrad_coef=np.full(n, 2.0),
+        _bin_size=1, _boxcar_width=1, _smoother="boxcar", _corr_cache=CorrectionCache(),
+        _pipeline=None, _pipeline_key=None, _pipeline_sources=(), _spec_ctrl=ctrl,
+    )
+    pipe = MainWindowController._spectrum_pipeline(window, n)
+    assert MainWindowController._spectrum_pipeline(window, n) is pipe
+    raw = ctrl.intensities()
+    expected = (raw - np.polyval([0.01, 5.0], np.arange(n))) * 2.0
+    np.testing.assert_allclose(pipe.process(raw), expected, rtol=1e-12)
+    # the evaluated vectors are cached under the controller's device id
+    assert {key[1] for key in window._corr_cache._data} == {ctrl.device_id}
@@ -0,0 +1,101 @@
+import time
+
+import numpy as np
+import pytest
+
+from rubycon_fluo.device.simulator import (R1_AMBIENT_NM, RubyTrajectory,
+                                           SimulatedRubySpectrometer, r1_wavelength_nm)
+
+
+def _sim(**kwargs):
+    kwargs.setdefault("realtime", False)
+    kwargs.setdefault("cosmic_rate", 0.0)
+    return SimulatedRubySpectrometer(**kwargs)
+
+
+def _peak(sim, int_us):
+    sim.set_integration_time_us(int_us)
+    return float(sim.intensities(correct_dark_counts=True).max())
+
+
+def test_seeded_runs_are_reproducible():
+    traj = RubyTrajectory.ramp(0.0, 10.0, duration_s=5.0)
+    a = _sim(trajectory=traj, seed=42, cosmic_rate=2.0)
+    b = _sim(trajectory=traj, seed=42, cosmic_rate=2.0)
+    for _ in range(5):
+        np.testing.assert_array_equal(a.intensities(), b.intensities())
+    assert a.clock_s == b.clock_s == pytest.approx(0.5)
+    assert not np.array_equal(_sim(seed=43).intensities(), _sim(seed=42).intensities())
+
+
+def test_trajectory_interpolates_holds_and_loops():
+    traj = RubyTrajectory([(0.0, 0.0, 300.0), (10.0, 20.0, 400.0)])
+    assert traj.at(5.0) == pytest.approx((10.0, 350.0))
+    assert traj.at(-1.0) == (0.0, 300.0)
+    assert traj.at(99.0) == (20.0, 400.0)
+    looped = RubyTrajectory([(0.0, 0.0, 300.0), (10.0, 20.0, 300.0)], loop=True)
+    assert looped.at(15.0) == pytest.approx(looped.at(5.0))
+    with pytest.raises(ValueError):
+        RubyTrajectory([])
+
+
+def test_line_follows_pressure():
+    sim = _sim(trajectory=RubyTrajectory([(0.0, 10.0, 300.0)]), seed=1)
+    wl = sim.wavelengths()
+    sim.set_integration_time_us(50_000)
+    counts = sim.intensities(correct_dark_counts=True)
+    expected = r1_wavelength_nm(10.0)
+    assert expected > R1_AMBIENT_NM + 3.0
+    assert wl[np.argmax(counts)] == pytest.approx(expected, abs=0.1)
+    assert sim.true_state()["r1_nm"] == pytest.approx(expected)
+
+
+def test_peak_scales_with_integration_time_and_saturates():
+    sim = _sim(seed=2)                              # 2e5 counts/s at the R1 peak
+    short, double = _peak(sim, 20_000), _peak(sim, 40_000)
+    assert short == pytest.approx(4_000.0, rel=0.05)
+    assert double / short == pytest.approx(2.0, rel=0.05)
+    # far past full scale: clipped at the ADC limit (dark-subtracted here)
+    sim.set_integration_time_us(2_000_000)
+    raw = sim.intensities()
+    assert raw.max() == sim.max_intensity == 65535.0
+    assert _peak(sim, 2_000_000) == pytest.approx(65535.0 - sim.dark_offset)
+
+
+def test_integration_time_is_clamped():
+    sim = _sim()
+    lo, hi = sim.get_integration_time_limits_us()
+    sim.set_integration_time_us(1)
+    sim.intensities()
+    assert sim.clock_s == pytest.approx(lo / 1e6)
+    sim.set_integration_time_us(10 * hi)
+    sim.intensities()
+    assert sim.clock_s == pytest.approx((lo + hi) / 1e6)
+
+
+def test_virtual_clock_does_not_sleep():
+    sim = _sim()
+    sim.set_integration_time_us(1_000_000)
+    t0 = time.perf_counter()
+    for _ in range(5):
+        sim.intensities()
+    assert time.perf_counter() - t0 < 1.0
+    assert sim.clock_s == pytest.approx(5.0)
+
+
+def test_realtime_blocks_for_the_exposure():
+    sim = _sim(realtime=True)
+    sim.set_integration_time_us(50_000)
+    t0 = time.perf_counter()
+    sim.intensities()
+    assert time.perf_counter() - t0 >= 0.045
+
+
+def test_hardware_averaging_exposes_several_scans():
+    sim = _sim(hardware_averaging=True)
+    proc = sim.features["spectrum_processing"][0]
+    proc.set_scans_to_average(4)
+    sim.set_integration_time_us(10_000)
+    sim.intensities()
+    assert sim.clock_s == pytest.approx(0.04)
+    assert _sim().features == {}
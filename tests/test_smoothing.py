@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from scipy.signal import savgol_filter
+
+from rubycon_fluo.processing.smoothing import SavitzkyGolay, _boxcar_nb, boxcar
+
+
+def _noisy(n=257, seed=4):
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0.0, 6.0, n)
+    return 1000.0 * np.exp(-((x - 3.0) / 0.4) ** 2) + rng.normal(0.0, 20.0, n)
+
+
+@pytest.mark.parametrize("width", range(2, 10))
+def test_boxcar_matches_convolve(width):
+    y = _noisy()
+    ref = np.convolve(y, np.ones(width) / width, mode="same")
+    got = boxcar(y.copy(), width)
+    # same alignment as np.convolve; inside the array at the edges only
+    inner = slice(width // 2, y.size - (width - 1) // 2)
+    np.testing.assert_allclose(got[inner], ref[inner], rtol=1e-10, atol=1e-9)
+    left, right = width // 2, (width - 1) // 2
+    for i in (0, 1, y.size - 2, y.size - 1):
+        window = y[max(0, i - left):i + right + 1]
+        assert got[i] == pytest.approx(window.mean(), rel=1e-12)
+
+
+def test_boxcar_edge_cases():
+    y = _noisy(5)
+    np.testing.assert_array_equal(boxcar(y.copy(), 1), y)
+    # window wider than the array: every pixel sees the whole (clipped) window
+    got = y.copy()
+    _boxcar_nb(got, 10, 10)
+    np.testing.assert_allclose(got, y.mean(), rtol=1e-12)
+    assert boxcar(np.empty(0), 5).size == 0
+
+
+@pytest.mark.parametrize("window, order", [(5, 2), (7, 2), (9, 3), (11, 4), (5, 0)])
+def test_savgol_matches_scipy(window, order):
+    y = _noisy()
+    ref = savgol_filter(y, window, order, mode="interp")
+    got = SavitzkyGolay(window, order).apply(y.copy())
+    np.testing.assert_allclose(got, ref, rtol=1e-9, atol=1e-7)
+
+
+def test_savgol_window_rules():
+    sg = SavitzkyGolay(6, 2)            # even → widened
+    assert sg.window == 7
+    y = _noisy()
+    np.testing.assert_allclose(sg.apply(y.copy()), savgol_filter(y, 7, 2, mode="interp"),
+                               rtol=1e-9, atol=1e-7)
+    short = _noisy(5)
+    np.testing.assert_array_equal(SavitzkyGolay(7, 2).apply(short.copy()), short)
+    # a polynomial of the filter's order passes through unchanged
+    t = np.arange(50.0)
+    quad = 3.0 + 0.5 * t - 0.01 * t * t
+    np.testing.assert_allclose(SavitzkyGolay(9, 2).apply(quad.copy()), quad, rtol=1e-10)
@@ -0,0 +1,77 @@
+import pytest
+
+pytest.importorskip("seabreeze")
+
+from rubycon_fluo.device.simulator import SimulatedRubySpectrometer
+from rubycon_fluo.device.spectrometer import SpectrometerController
+
+
+def _sim(**kwargs):
+    return SimulatedRubySpectrometer(realtime=False, seed=1, **kwargs)
+
+
+def _count_calls(obj, name):
+    calls = []
+    original = getattr(obj, name)
+
+    def wrapper(*args):
+        calls.append(args)
+        return original(*args)
+
+    setattr(obj, name, wrapper)
+    return calls
+
+
+def test_averaging_probe_is_lazy():
+    sim = _sim(hardware_averaging=True)
+    proc = sim.features["spectrum_processing"][0]
+    calls = _count_calls(proc, "set_scans_to_average")
+    ctrl = SpectrometerController(sim)
+    ctrl.device_id                                  # what the device list reads
+    assert calls == []
+
+    ctrl.set_scans_to_average(4)
+    assert calls == [(1,), (4,)]                    # probe, then the setting
+    assert ctrl.hardware_averaging and ctrl.averaging_mode == "hardware"
+    ctrl.set_scans_to_average(4)
+    assert len(calls) == 2                          # probed once, repeat suppressed
+
+
+def test_software_averaging_without_feature():
+    ctrl = SpectrometerController(_sim())
+    assert not ctrl.hardware_averaging and ctrl.averaging_mode == "software"
+    ctrl.set_scans_to_average(3)
+    assert ctrl.command_stats() == dict(sent=0, suppressed=0)
+
+
+def test_repeated_settings_are_suppressed():
+    sim = _sim()
+    calls = _count_calls(sim, "set_integration_time_us")
+    ctrl = SpectrometerController(sim)
+    for us in (10_000, 10_000, 20_000, 20_000, 20_000, 10_000):
+        ctrl.set_integration_time_us(us)
+    assert calls == [(10_000,), (20_000,), (10_000,)]
+    assert ctrl.command_stats() == dict(sent=3, suppressed=3)
+
+    ctrl.invalidate_state()                         # something else talked to the device
+    ctrl.set_integration_time_us(10_000)
+    assert len(calls) == 4
+    assert ctrl.command_stats() == dict(sent=4, suppressed=3)
+
+
+def test_failed_setting_is_resent():
+    sim = _sim()
+    ctrl = SpectrometerController(sim)
+    original = sim.set_integration_time_us
+    failures = [OSError("busy")]
+
+    def flaky(us):
+        if failures:
+            raise failures.pop()
+        original(us)
+
+    sim.set_integration_time_us = flaky
+    with pytest.raises(OSError):
+        ctrl.set_integration_time_us(5_000)
+    ctrl.set_integration_time_us(5_000)             # not recorded as sent: goes out again
+    assert ctrl.command_stats() == dict(sent=1, suppressed=0)
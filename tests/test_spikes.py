@@ -0,0 +1,130 @@
+import numpy as np
+import pytest
+
+from rubycon_fluo.processing.spikes import despike, peak_counts, peak_slice
+
+
+def test_peak_ignores_narrow_spikes():
+    x = np.exp(-0.5 * ((np.arange(200) - 80) / 4.0) ** 2) * 1000.0
+    spiked = x.copy()
+    spiked[150] += 30_000.0                         # one-pixel hit
+    spiked[20:22] += 30_000.0                       # two-pixel hit
+    assert peak_counts(spiked) == peak_counts(x)
+    assert peak_counts(x) == x[79:82].min()
+    assert peak_slice(spiked) == slice(79, 82)
+
+
+def test_peak_of_tiny_arrays():
+    assert peak_counts(np.array([1.0, 5.0])) == 5.0
+    assert peak_slice(np.array([1.0, 5.0])) == slice(None)
+
+
+def _lines(n=1024, fwhm=5.0, seed=11):
+    """Two emission lines (`fwhm` pixels) on a sloped baseline, with shot-like noise."""
+    rng = np.random.default_rng(seed)
+    i = np.arange(n, dtype=float)
+    s = fwhm / 2.3548
+    clean = (500.0 + 0.1 * i
+             + 20_000.0 * np.exp(-0.5 * ((i - 400) / s) ** 2)
+             + 9_000.0 * np.exp(-0.5 * ((i - 440) / s) ** 2))
+    return clean + rng.normal(0.0, np.sqrt(clean))
+
+
+@pytest.mark.parametrize("fwhm", [4.0, 6.0, 12.0])
+def test_despike_leaves_clean_lines_alone(fwhm):
+    x = _lines(fwhm=fwhm)
+    y = x.copy()
+    assert despike(y) == 0
+    np.testing.assert_array_equal(y, x)
+
+
+def test_despike_removes_injected_spikes():
+    x = _lines()
+    y = x.copy()
+    singles = [50, 180, 700, 1000]
+    pairs = [120, 610, 860]
+    for k in singles:
+        y[k] += 5_000.0
+    for k in pairs:
+        y[k:k + 2] += (8_000.0, 3_000.0)           # unequal two-pixel hit
+    hit = np.zeros(x.size, bool)
+    hit[singles] = True
+    for k in pairs:
+        hit[k:k + 2] = True
+
+    replaced = despike(y)
+    assert replaced >= hit.sum()
+    # spikes gone: back within the noise of the clean spectrum ...
+    noise = np.sqrt(x)
+    assert np.all(np.abs(y[hit] - x[hit]) < 6.0 * noise[hit])
+    # ... and the lines untouched
+    np.testing.assert_array_equal(y[380:460], x[380:460])
+
+
+def test_despike_short_input():
+    y = np.array([1.0, 1.0, 500.0, 1.0, 1.0, 1.0])
+    assert despike(y) == 0
+
+
+class TestRobustAccumulator:
+    @pytest.fixture(autouse=True)
+    def _qt(self):
+        pytest.importorskip("PySide6")
+
+    @staticmethod
+    def _stack(n, pixels=512, seed=3):
+        rng = np.random.default_rng(seed)
+        base = _lines(pixels, seed=seed)
+        return base + rng.normal(0.0, 30.0, (n, pixels))
+
+    @staticmethod
+    def _acc(frames, method):
+        from rubycon_fluo.gui.controllers.acquisition import RobustAccumulator
+
+        acc = RobustAccumulator(len(frames), method)
+        for frame in frames:
+            acc.add(frame)
+        return acc
+
+    @pytest.mark.parametrize("n", [3, 4, 7, 8])
+    def test_median_matches_numpy(self, n):
+        frames = self._stack(n)
+        np.testing.assert_allclose(self._acc(frames, "median").mean,
+                                   np.median(frames, axis=0), rtol=1e-12)
+
+    @pytest.mark.parametrize("n", [2, 5, 8])
+    def test_sigma_clip_without_spikes_is_the_mean(self, n):
+        frames = self._stack(n)
+        acc = self._acc(frames, "sigma_clip")
+        np.testing.assert_allclose(acc.mean, frames.mean(axis=0), rtol=1e-12)
+        assert acc.rejected == 0                    # counted when the result is read
+        var = frames.var(axis=0, ddof=1) / n
+        # sums of squares: round-off relative to the counts², not to var
+        np.testing.assert_allclose(acc.variance_of_mean(), var, rtol=1e-8,
+                                   atol=1e-6 * np.median(var))
+
+    @pytest.mark.parametrize("n", [2, 5])
+    def test_sigma_clip_drops_spikes(self, n):
+        frames = self._stack(n)
+        spiked = frames.copy()
+        hits = {(0, 30), (n - 1, 200), (n // 2, 420), (0, 421)}
+        for scan, pixel in hits:
+            spiked[scan, pixel] += 10_000.0
+        acc = self._acc(spiked, "sigma_clip")
+        mean = acc.mean
+        assert acc.rejected == len(hits)
+        expected = frames.mean(axis=0)
+        for scan, pixel in hits:
+            others = np.delete(frames[:, pixel], scan)
+            expected[pixel] = others.mean()
+        np.testing.assert_allclose(mean, expected, rtol=1e-12)
+
+    def test_capacity_keeps_latest_scans(self):
+        frames = self._stack(6)
+        from rubycon_fluo.gui.controllers.acquisition import RobustAccumulator
+
+        acc = RobustAccumulator(4, "median")
+        for frame in frames:
+            acc.add(frame)
+        assert acc.n == 4
+        np.testing.assert_allclose(acc.mean, np.median(frames[2:], axis=0), rtol=1e-12)
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from rubycon_fluo.fitting.auto_fit import AutoFit, bounds_nb, estimate_two_peak_nb
+
+LO, HI = 690.0, 698.0
+
+
+def _window(wl, counts):
+    mask = (wl >= LO) & (wl <= HI)
+    x, y = wl[mask], counts[mask]
+    lower, upper = bounds_nb(LO, HI)
+    return x, y, lower, upper, estimate_two_peak_nb(x, y, lower[4], upper[4])
+
+
+@pytest.mark.parametrize("solver", AutoFit.SOLVERS)
+def test_good_seed_is_used_and_saves_evaluations(ruby_spectrum, solver):
+    wl, counts, _ = ruby_spectrum
+    cold = AutoFit(solver=solver)
+    p_cold, _ = cold.fit(wl, counts, LO, HI)
+    assert not cold.last_seeded
+
+    # the next frame of a steady source, seeded with this one's solution
+    rng = np.random.default_rng(8)
+    nxt = counts + rng.normal(0.0, 30.0, counts.size)
+    ref = AutoFit(solver=solver)
+    p_ref, _ = ref.fit(wl, nxt, LO, HI)
+    warm = AutoFit(solver=solver)
+    p_warm, _ = warm.fit(wl, nxt, LO, HI, seed=p_cold)
+    assert warm.last_seeded
+    assert warm.last_nfev < ref.last_nfev
+    np.testing.assert_allclose(p_warm, p_ref, rtol=1e-4, atol=1e-6)
+
+
+def _seed_variants(p_good):
+    nan = p_good.copy()
+    nan[2] = np.nan
+    outside = p_good.copy()
+    outside[0] = HI + 1.0                       # R1 left the fit window
+    vanished = p_good.copy()
+    vanished[5] = 0.0                           # R2 amplitude gone
+    too_wide = p_good.copy()
+    too_wide[2] = 50.0                          # wider than the window
+    return dict(non_finite=nan, outside_window=outside, vanished_peak=vanished,
+                too_wide=too_wide, wrong_length=p_good[:5], not_numeric="seed")
+
+
+@pytest.mark.parametrize("case", ["non_finite", "outside_window", "vanished_peak",
+                                  "too_wide", "wrong_length", "not_numeric"])
+def test_invalid_seed_falls_back_to_cold_guess(ruby_spectrum, case):
+    wl, counts, p_true = ruby_spectrum
+    seed = _seed_variants(p_true)[case]
+    x, y, lower, upper, p_cold = _window(wl, counts)
+    assert AutoFit._seeded_guess(seed, x, y, lower, upper, p_cold) is None
+
+    af = AutoFit(solver="lm")
+    p, _ = af.fit(wl, counts, LO, HI, seed=seed)
+    assert not af.last_seeded
+    np.testing.assert_array_equal(p, AutoFit(solver="lm").fit(wl, counts, LO, HI)[0])
+
+
+def test_seed_worse_than_cold_guess_is_dropped(ruby_spectrum):
+    wl, counts, p_true = ruby_spectrum
+    x, y, lower, upper, p_cold = _window(wl, counts)
+    # in bounds and sane, but R1 half a nanometre off: explains the data worse
+    seed = p_true.copy()
+    seed[0] -= 0.5
+    assert AutoFit._seeded_guess(seed, x, y, lower, upper, p_cold) is None
+    af = AutoFit(solver="lm")
+    af.fit(wl, counts, LO, HI, seed=seed)
+    assert not af.last_seeded
+